@@ -0,0 +1,115 @@
+"""
+User Context
+============
+The per-user rows the dashboard, profile and scoring views read on
+every request (chosen activities, primary activity, saved locations),
+cached in the shared cache as one small snapshot. Fields of the user
+row itself (units, home location) are read from ``request.user``,
+which is loaded anyway.
+
+Saving or deleting a UserActivity or SavedLocation invalidates the
+owner's context (see signals.py). Contexts are stored under a per-user
+version that is bumped once the write has committed, so a request that
+read the old rows before then can only store them under a version no
+one reads any more.
+"""
+
+from dataclasses import dataclass
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db import transaction
+
+from weather.metrics import CACHE_LOOKUPS
+
+CONTEXT_KEY = 'accounts:user-context:{}:{}'
+VERSION_KEY = 'accounts:context-version:{}'
+
+# Explicitly invalidated on change; the TTL only bounds dead entries.
+CONTEXT_TTL = 24 * 3600
+
+# Must outlive CONTEXT_TTL: once a version key expires the count restarts
+# at 0, and no context stored under a reused version may still be alive.
+VERSION_TTL = 30 * 24 * 3600
+
+
+@dataclass(frozen=True, slots=True)
+class UserContext:
+    """Snapshot of one user's activity and saved-location rows."""
+    activity_ids: tuple      # chosen ActivityType ids
+    primary_id: int          # primary ActivityType id, or None
+    saved_locations: tuple   # ((name, latitude, longitude), ...)
+
+    def saved_locations_dicts(self) -> list:
+        return [
+            {'name': name, 'latitude': lat, 'longitude': lon}
+            for name, lat, lon in self.saved_locations
+        ]
+
+
+def _build(user) -> UserContext:
+    from accounts.models import SavedLocation
+    from activities.models import UserActivity
+
+    activities = list(
+        UserActivity.objects.filter(user=user)
+        .values_list('activity_type_id', 'is_primary')
+    )
+    saved = SavedLocation.objects.filter(user=user).values_list(
+        'name', 'latitude', 'longitude',
+    )
+    return UserContext(
+        activity_ids=tuple(sorted(act_id for act_id, _ in activities)),
+        primary_id=next(
+            (act_id for act_id, is_primary in activities if is_primary), None,
+        ),
+        saved_locations=tuple(saved),
+    )
+
+
+def get_context(user) -> UserContext:
+    """Cached context for an authenticated user (sync callers)."""
+    # The version is read before the rows _build() reads.
+    version = cache.get(VERSION_KEY.format(user.pk), 0)
+    key = CONTEXT_KEY.format(user.pk, version)
+    context = cache.get(key)
+    CACHE_LOOKUPS.inc(
+        cache='user_context', result='miss' if context is None else 'hit',
+    )
+    if context is None:
+        context = _build(user)
+        cache.set(key, context, CONTEXT_TTL)
+    return context
+
+
+async def aget_context(user) -> UserContext:
+    """Async counterpart of get_context()."""
+    version = await cache.aget(VERSION_KEY.format(user.pk), 0)
+    key = CONTEXT_KEY.format(user.pk, version)
+    context = await cache.aget(key)
+    CACHE_LOOKUPS.inc(
+        cache='user_context', result='miss' if context is None else 'hit',
+    )
+    if context is None:
+        context = await sync_to_async(_build)(user)
+        await cache.aset(key, context, CONTEXT_TTL)
+    return context
+
+
+def _bump(pk):
+    key = VERSION_KEY.format(pk)
+    if not cache.add(key, 1, VERSION_TTL):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, VERSION_TTL)
+        else:
+            cache.touch(key, VERSION_TTL)
+
+
+def invalidate(user_id):
+    """
+    Retire the cached context of user ``user_id`` once the current
+    transaction commits.
+    """
+    transaction.on_commit(lambda: _bump(user_id))
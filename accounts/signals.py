@@ -0,0 +1,16 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from accounts import context
+from accounts.models import SavedLocation
+from activities.models import UserActivity
+
+
+@receiver(post_save, sender=UserActivity)
+@receiver(post_delete, sender=UserActivity)
+@receiver(post_save, sender=SavedLocation)
+@receiver(post_delete, sender=SavedLocation)
+def invalidate_user_context(sender, instance, **kwargs):
+    # After commit (inside invalidate()): a rebuild before then would
+    # read the old rows and store them under the new version.
+    context.invalidate(instance.user_id)
@@ -1,3 +1,109 @@
-from django.test import TestCase
+import json
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from accounts import context
+from accounts.models import SavedLocation
+from activities.models import ActivityType, UserActivity
+
+LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCMEM)
+class UserContextTests(TestCase):
+    """Cached activity and saved-location rows, retired on change."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            'ada', email='ada@example.com',
+        )
+        cls.hiking = ActivityType.objects.create(
+            name='Hiking', slug='hiking', emoji='🥾',
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def post(self, name, data):
+        return self.client.post(
+            reverse(f'accounts:{name}'), json.dumps(data),
+            content_type='application/json',
+        )
+
+    def test_cached_context_needs_no_queries(self):
+        first = context.get_context(self.user)
+        with self.assertNumQueries(0):
+            self.assertEqual(context.get_context(self.user), first)
+
+    def test_saved_location_is_seen_after_commit(self):
+        self.assertEqual(context.get_context(self.user).saved_locations, ())
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.post('save_location', {
+                'name': 'Home', 'latitude': 51.5, 'longitude': -0.12,
+            })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(context.get_context(self.user).saved_locations,
+                         (('Home', 51.5, -0.12),))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post('remove_location', {'name': 'Home'})
+        self.assertEqual(context.get_context(self.user).saved_locations, ())
+
+    def test_activity_changes_are_seen_after_commit(self):
+        context.get_context(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post('toggle_activity', {'slug': 'hiking'})
+            self.post('set_primary', {'slug': 'hiking'})
+        user_ctx = context.get_context(self.user)
+        self.assertEqual(user_ctx.activity_ids, (self.hiking.id,))
+        self.assertEqual(user_ctx.primary_id, self.hiking.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post('set_primary', {'slug': ''})
+        self.assertIsNone(context.get_context(self.user).primary_id)
+
+    def test_nothing_is_retired_before_commit(self):
+        before = context.get_context(self.user)
+        with self.captureOnCommitCallbacks() as callbacks:
+            SavedLocation.objects.create(
+                user=self.user, name='Work', latitude=51.52, longitude=-0.08,
+            )
+            self.assertEqual(context.get_context(self.user), before)
+        self.assertEqual(len(callbacks), 1)
+
+    def test_user_fields_are_not_cached(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post('update_units', {'use_metric': False})
+            self.post('update_home_location', {
+                'name': 'Home', 'latitude': 51.5, 'longitude': -0.12,
+            })
+        self.assertIsNone(cache.get(context.VERSION_KEY.format(self.user.pk)))
+
+    def test_stale_write_back_lands_under_a_retired_version(self):
+        build = context._build
+
+        def slow_build(user):
+            # The rows are read, then a change commits before the
+            # request stores what it read.
+            rows = build(user)
+            with self.captureOnCommitCallbacks(execute=True):
+                UserActivity.objects.create(
+                    user=self.user, activity_type=self.hiking,
+                )
+            return rows
+
+        with mock.patch.object(context, '_build', slow_build):
+            stale = context.get_context(self.user)
+        self.assertEqual(stale.activity_ids, ())
+        self.assertEqual(
+            cache.get(context.CONTEXT_KEY.format(self.user.pk, 0)), stale,
+        )
+        self.assertEqual(cache.get(context.VERSION_KEY.format(self.user.pk)), 1)
+        self.assertEqual(context.get_context(self.user).activity_ids,
+                         (self.hiking.id,))
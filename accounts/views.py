@@ -5,8 +5,12 @@ from django.http import JsonResponse
 from django.shortcuts import render
 from django.views.decorators.http import require_POST
 
+from accounts import context
 from accounts.models import SavedLocation
 from activities.models import ActivityType, UserActivity
+from activities.profiles import active_profiles
+from weather.geo import parse_coordinates
+from weather.metrics import phase
 
 
 def profile(request):
@@ -14,37 +18,31 @@ def profile(request):
     if not request.user.is_authenticated:
         return render(request, 'accounts/profile.html', {'active_tab': 'profile'})
 
-    activities = ActivityType.objects.filter(is_active=True)
-    user_activity_slugs = set(
-        UserActivity.objects.filter(user=request.user)
-        .values_list('activity_type__slug', flat=True)
-    )
-    primary_slug = (
-        UserActivity.objects.filter(user=request.user, is_primary=True)
-        .values_list('activity_type__slug', flat=True)
-        .first()
-    )
-
-    activity_list = []
-    for act in activities:
-        activity_list.append({
-            'id': act.id,
-            'name': act.name,
-            'slug': act.slug,
-            'icon': act.icon_name,
-            'selected': act.slug in user_activity_slugs,
-            'is_primary': act.slug == primary_slug,
+    with phase('context'):
+        user_ctx = context.get_context(request.user)
+        selected = set(user_ctx.activity_ids)
+
+        activity_list = []
+        for act in active_profiles():
+            activity_list.append({
+                'id': act.id,
+                'name': act.name,
+                'slug': act.slug,
+                'icon': act.icon_name,
+                'selected': act.id in selected,
+                'is_primary': act.id == user_ctx.primary_id,
+            })
+
+    with phase('render'):
+        return render(request, 'accounts/profile.html', {
+            'active_tab': 'profile',
+            'activities': activity_list,
+            'use_metric': request.user.use_metric,
+            'home_location_name': request.user.home_location_name,
+            'home_latitude': request.user.home_latitude,
+            'home_longitude': request.user.home_longitude,
         })
 
-    return render(request, 'accounts/profile.html', {
-        'active_tab': 'profile',
-        'activities': activity_list,
-        'use_metric': request.user.use_metric,
-        'home_location_name': request.user.home_location_name,
-        'home_latitude': request.user.home_latitude,
-        'home_longitude': request.user.home_longitude,
-    })
-
 
 @require_POST
 @login_required
@@ -83,8 +81,11 @@ def set_primary(request):
     except (json.JSONDecodeError, AttributeError):
         return JsonResponse({'error': 'Invalid request'}, status=400)
 
-    # Clear existing primary
-    UserActivity.objects.filter(user=request.user, is_primary=True).update(is_primary=False)
+    # Clear existing primary (saved row by row: the save signal
+    # invalidates the cached user context, see accounts/signals.py)
+    for ua in UserActivity.objects.filter(user=request.user, is_primary=True):
+        ua.is_primary = False
+        ua.save(update_fields=['is_primary'])
 
     if slug:
         try:
@@ -131,9 +132,8 @@ def update_home_location(request):
         return JsonResponse({'error': 'Name, latitude, and longitude required'}, status=400)
 
     try:
-        lat = float(lat)
-        lon = float(lon)
-    except (TypeError, ValueError):
+        lat, lon = parse_coordinates(lat, lon)
+    except ValueError:
         return JsonResponse({'error': 'Invalid coordinates'}, status=400)
 
     request.user.home_location_name = name
@@ -175,6 +175,11 @@ def save_location(request):
     if not name or lat is None or lon is None:
         return JsonResponse({'error': 'Missing fields'}, status=400)
 
+    try:
+        lat, lon = parse_coordinates(lat, lon)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid coordinates'}, status=400)
+
     # Cap at 5 saved locations
     count = SavedLocation.objects.filter(user=request.user).count()
     if count >= 5:
@@ -182,7 +187,7 @@ def save_location(request):
 
     loc, created = SavedLocation.objects.get_or_create(
         user=request.user, name=name,
-        defaults={'latitude': float(lat), 'longitude': float(lon)},
+        defaults={'latitude': lat, 'longitude': lon},
     )
     if not created:
         return JsonResponse({'error': 'Already saved'}, status=409)
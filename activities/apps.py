@@ -5,3 +5,6 @@ class ActivitiesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'activities'
     verbose_name = 'Outdoor Activities'
+
+    def ready(self):
+        from activities import signals  # noqa: F401
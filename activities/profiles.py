@@ -0,0 +1,182 @@
+"""
+Compiled Scoring Profiles
+=========================
+Immutable, slotted snapshots of the active ActivityType rows, kept per
+process so the scoring hot path never touches the ORM.
+
+Activity definitions change a few times a year but are read on every
+request. Saves/deletes bump a version counter in the shared cache (see
+signals.py); each process rebuilds its registry when it notices a newer
+version, and immediately when the change happened in-process.
+"""
+
+import hashlib
+import time
+from dataclasses import dataclass
+
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+
+VERSION_KEY = 'activities:profiles:version'
+
+# How often (seconds) a process checks the shared version counter.
+VERSION_CHECK_INTERVAL = 10
+
+WEIGHT_FIELDS = (
+    'temp_weight', 'wind_weight', 'rain_weight', 'humidity_weight',
+    'uv_weight', 'visibility_weight', 'air_quality_weight',
+    'golden_hour_weight', 'swell_weight',
+)
+RANGE_FIELDS = (
+    'ideal_temp_min', 'ideal_temp_max',
+    'max_wind_speed', 'max_rain_probability',
+)
+
+
+@dataclass(frozen=True, slots=True)
+class ScoringProfile:
+    """The subset of an ActivityType the scoring engine reads."""
+    id: int
+    name: str
+    slug: str
+    icon_name: str
+    temp_weight: float
+    wind_weight: float
+    rain_weight: float
+    humidity_weight: float
+    uv_weight: float
+    visibility_weight: float
+    air_quality_weight: float
+    golden_hour_weight: float
+    swell_weight: float
+    ideal_temp_min: float
+    ideal_temp_max: float
+    max_wind_speed: float
+    max_rain_probability: float
+
+    @classmethod
+    def from_activity(cls, activity):
+        return cls(**{
+            name: getattr(activity, name)
+            for name in cls.__dataclass_fields__
+        })
+
+
+class ProfileSet:
+    """
+    Ordered, immutable collection of ScoringProfiles with the parameter
+    arrays the batch scorer needs pre-built (see engine._activity_params).
+    """
+
+    __slots__ = ('profiles', 'params', 'by_id', 'by_slug', '_fingerprint')
+
+    def __init__(self, profiles):
+        self.profiles = tuple(profiles)
+        self._fingerprint = None
+        self.by_id = {p.id: p for p in self.profiles}
+        self.by_slug = {p.slug: p for p in self.profiles}
+
+        weights = np.array(
+            [[getattr(p, f) for f in WEIGHT_FIELDS] for p in self.profiles],
+            dtype=float,
+        ).reshape(len(self.profiles), len(WEIGHT_FIELDS))
+        ranges = [
+            np.array([getattr(p, f) for p in self.profiles], dtype=float)
+            for f in RANGE_FIELDS
+        ]
+        for arr in [weights, *ranges]:
+            arr.flags.writeable = False
+        self.params = (weights, *ranges)
+
+    def __len__(self):
+        return len(self.profiles)
+
+    def __iter__(self):
+        return iter(self.profiles)
+
+    def __getitem__(self, index):
+        return self.profiles[index]
+
+    @property
+    def fingerprint(self) -> str:
+        """Digest of the profiles' contents, for HTTP validators."""
+        if self._fingerprint is None:
+            self._fingerprint = hashlib.sha1(
+                repr(self.profiles).encode(),
+            ).hexdigest()[:16]
+        return self._fingerprint
+
+    def subset(self, ids) -> 'ProfileSet':
+        """Profiles whose id is in ``ids``, keeping registry order."""
+        ids = set(ids)
+        return ProfileSet(p for p in self.profiles if p.id in ids)
+
+    def with_slugs(self, slugs) -> 'ProfileSet':
+        """Profiles whose slug is in ``slugs``, keeping registry order."""
+        slugs = set(slugs)
+        return ProfileSet(p for p in self.profiles if p.slug in slugs)
+
+
+class _Registry:
+    __slots__ = ('profiles', 'version', 'checked_at')
+
+    def __init__(self):
+        self.profiles = None
+        self.version = None
+        self.checked_at = 0.0
+
+
+_registry = _Registry()
+
+
+def _build() -> ProfileSet:
+    from activities.models import ActivityType
+
+    fields = ScoringProfile.__dataclass_fields__
+    return ProfileSet(
+        ScoringProfile.from_activity(act)
+        for act in ActivityType.objects.filter(is_active=True).only(*fields)
+    )
+
+
+def _is_fresh(version) -> bool:
+    return _registry.profiles is not None and _registry.version == version
+
+
+def active_profiles() -> ProfileSet:
+    """All active activities as a compiled ProfileSet (sync callers)."""
+    now = time.monotonic()
+    if _registry.profiles is not None and now - _registry.checked_at < VERSION_CHECK_INTERVAL:
+        return _registry.profiles
+
+    version = cache.get(VERSION_KEY, 0)
+    if not _is_fresh(version):
+        _registry.profiles = _build()
+        _registry.version = version
+    _registry.checked_at = now
+    return _registry.profiles
+
+
+async def aactive_profiles() -> ProfileSet:
+    """Async counterpart of active_profiles(); no thread hop when warm."""
+    now = time.monotonic()
+    if _registry.profiles is not None and now - _registry.checked_at < VERSION_CHECK_INTERVAL:
+        return _registry.profiles
+
+    version = await cache.aget(VERSION_KEY, 0)
+    if not _is_fresh(version):
+        _registry.profiles = await sync_to_async(_build)()
+        _registry.version = version
+    _registry.checked_at = now
+    return _registry.profiles
+
+
+def invalidate():
+    """Drop this process's registry and tell every other process to."""
+    _registry.profiles = None
+    if not cache.add(VERSION_KEY, 1, timeout=None):
+        try:
+            cache.incr(VERSION_KEY)
+        except ValueError:
+            cache.set(VERSION_KEY, 1, timeout=None)
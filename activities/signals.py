@@ -0,0 +1,14 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from activities import profiles
+from activities.models import ActivityType
+
+
+@receiver(post_save, sender=ActivityType)
+@receiver(post_delete, sender=ActivityType)
+def invalidate_scoring_profiles(sender, **kwargs):
+    # After commit: a rebuild before then would read the old rows and
+    # store them under the new version.
+    transaction.on_commit(profiles.invalidate)
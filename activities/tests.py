@@ -1,3 +1,62 @@
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase, override_settings
 
-# Create your tests here.
+from activities import profiles
+from activities.models import ActivityType
+
+LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def _reset_registry():
+    profiles._registry.profiles = None
+    profiles._registry.version = None
+    profiles._registry.checked_at = 0.0
+
+
+@override_settings(CACHES=LOCMEM)
+class ProfileRegistryTests(TestCase):
+    """active_profiles() follows ActivityType changes once they commit."""
+
+    def setUp(self):
+        cache.clear()
+        _reset_registry()
+        # The registry would otherwise outlive the rolled-back rows.
+        self.addCleanup(_reset_registry)
+        self.hiking = ActivityType.objects.create(
+            name='Hiking', slug='hiking', emoji='🥾', temp_weight=0.2,
+        )
+
+    def test_save_is_seen_after_commit(self):
+        self.assertEqual(
+            profiles.active_profiles().by_slug['hiking'].temp_weight, 0.2,
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.hiking.temp_weight = 0.5
+            self.hiking.save()
+        self.assertEqual(
+            profiles.active_profiles().by_slug['hiking'].temp_weight, 0.5,
+        )
+        self.assertEqual(cache.get(profiles.VERSION_KEY), 1)
+
+    def test_no_rebuild_before_commit(self):
+        before = profiles.active_profiles()
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.hiking.is_active = False
+            self.hiking.save()
+        self.assertIs(profiles.active_profiles(), before)
+        self.assertEqual(len(callbacks), 1)
+
+    def test_delete_is_seen_after_commit(self):
+        self.assertIn('hiking', profiles.active_profiles().by_slug)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.hiking.delete()
+        self.assertNotIn('hiking', profiles.active_profiles().by_slug)
+
+    def test_other_processes_rebuild_on_a_newer_version(self):
+        before = profiles.active_profiles()
+        ActivityType.objects.filter(pk=self.hiking.pk).update(temp_weight=0.9)
+        cache.set(profiles.VERSION_KEY, 7, timeout=None)
+        profiles._registry.checked_at = 0.0  # check interval elapsed
+        after = profiles.active_profiles()
+        self.assertIsNot(after, before)
+        self.assertEqual(after.by_slug['hiking'].temp_weight, 0.9)
@@ -0,0 +1,31 @@
+"""
+Gunicorn settings, read from the working directory:
+
+    gunicorn weatherapp.asgi:application -k uvicorn.workers.UvicornWorker
+
+Workers share one port, so /metrics must report every worker's numbers
+whichever worker answers: each writes its samples under
+PROMETHEUS_MULTIPROC_DIR (see weather/metrics.py), which starts empty
+and drops a worker's live gauges when it exits.
+"""
+
+import os
+import shutil
+import tempfile
+
+os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR',
+    os.path.join(tempfile.gettempdir(), 'weatherapp-metrics'),
+)
+
+
+def on_starting(server):
+    path = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
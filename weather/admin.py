@@ -1,3 +1,16 @@
 from django.contrib import admin
+from .models import Place, Spot
 
-# Register your models here.
+
+@admin.register(Place)
+class PlaceAdmin(admin.ModelAdmin):
+    list_display = ('name', 'admin1', 'country', 'population')
+    list_filter = ('country_code',)
+    search_fields = ('name', 'ascii_name')
+
+
+@admin.register(Spot)
+class SpotAdmin(admin.ModelAdmin):
+    list_display = ('name', 'category', 'latitude', 'longitude')
+    list_filter = ('category',)
+    search_fields = ('name',)
@@ -0,0 +1,64 @@
+"""
+Encoding
+========
+Fast (de)serialization for upstream payloads and API responses.
+
+JSON goes through orjson when it is installed (stdlib json otherwise),
+or through any ``dumps(obj) -> bytes`` named by ``API_JSON_ENCODER``.
+Clients that ask for MessagePack in ``Accept`` (the mobile app) get it
+when msgpack is installed.
+"""
+
+import functools
+import json
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+try:
+    import orjson
+except ImportError:  # optional: faster JSON
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # optional: MessagePack for the mobile client
+    msgpack = None
+
+JSON = 'application/json'
+MSGPACK = 'application/msgpack'
+
+
+def _stdlib_dumps(obj) -> bytes:
+    return json.dumps(obj, separators=(',', ':')).encode()
+
+
+def loads(data: bytes):
+    """Decode a JSON body (e.g. an upstream response's ``content``)."""
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+@functools.cache
+def json_encoder():
+    """The ``dumps(obj) -> bytes`` used for JSON responses."""
+    path = getattr(settings, 'API_JSON_ENCODER', None)
+    if path:
+        return import_string(path)
+    return orjson.dumps if orjson is not None else _stdlib_dumps
+
+
+def negotiate(request) -> str:
+    """
+    Response media type: MessagePack only when the client names it in
+    ``Accept`` (a bare ``*/*`` still gets JSON) and msgpack is installed.
+    """
+    if msgpack is not None and 'msgpack' in request.headers.get('Accept', ''):
+        return MSGPACK
+    return JSON
+
+
+def encode(payload, media_type: str = JSON) -> bytes:
+    """Serialize ``payload`` as ``media_type``."""
+    if media_type == MSGPACK:
+        return msgpack.packb(payload)
+    return json_encoder()(payload)
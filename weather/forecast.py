@@ -0,0 +1,379 @@
+"""
+Forecast Cache
+==============
+One canonical Open-Meteo forecast per model grid cell, shared by every
+endpoint. Coordinates are snapped to the upstream model grid so every
+request inside the same cell shares one cache entry, and entries expire
+shortly after the next model run is published.
+
+The canonical request is the union of all variables any view needs over
+the full 7-day horizon; the dashboard, scoring and weekly views derive
+their slices from it locally.
+
+Payloads outlive their model run: once a newer run is due, a cached
+entry is stale and the next request refetches it, but the stale copy
+is kept as a fallback. If the refetch fails (or the upstream circuit
+is open, see weather/upstream.py) or takes longer than STALE_WAIT, the
+stale copy is served and a background task retries upstream.
+"""
+
+import asyncio
+import logging
+import time
+from bisect import bisect_left
+
+import httpx
+from django.conf import settings
+from django.core.cache import cache
+
+from weather import metrics, singleflight, upstream
+from weather.encoding import loads
+
+# Open-Meteo's best-match models resolve to roughly 0.1° (~11 km);
+# points closer than that get the same forecast upstream anyway.
+GRID_STEP = 0.1
+
+# Models are re-run hourly; results land a few minutes after the hour.
+UPDATE_INTERVAL = 3600
+UPDATE_DELAY = 10 * 60
+
+# How long a payload is kept as a fallback after its run is superseded,
+# how long a request waits on a refetch when it has that fallback, and
+# how long clients may cache a response built from it.
+STALE_TTL = 2 * 24 * 3600
+STALE_WAIT = 2.0
+STALE_MAX_AGE = 60
+
+# Background refreshes of one cell are enqueued at most this often.
+REVALIDATE_INTERVAL = 60
+
+logger = logging.getLogger(__name__)
+
+
+def snap_to_grid(lat: float, lon: float) -> tuple:
+    """Snap a coordinate to the centre of its forecast grid cell."""
+    return (
+        round(round(lat / GRID_STEP) * GRID_STEP, 2),
+        round(round(lon / GRID_STEP) * GRID_STEP, 2),
+    )
+
+
+def seconds_until_update(now: float = None) -> int:
+    """Seconds until the next model run should be available upstream."""
+    if now is None:
+        now = time.time()
+    since = (now - UPDATE_DELAY) % UPDATE_INTERVAL
+    return max(60, int(UPDATE_INTERVAL - since))
+
+
+def is_stale(fetched_at: float, now: float = None) -> bool:
+    """Whether a newer model run has been due since ``fetched_at``."""
+    if now is None:
+        now = time.time()
+    last_update = now - (now - UPDATE_DELAY) % UPDATE_INTERVAL
+    return fetched_at < last_update
+
+
+CURRENT_VARS = (
+    'temperature_2m', 'relative_humidity_2m', 'apparent_temperature',
+    'weather_code', 'wind_speed_10m', 'wind_direction_10m', 'is_day',
+    'surface_pressure',
+)
+HOURLY_VARS = (
+    'temperature_2m', 'weather_code', 'precipitation_probability', 'is_day',
+    'relative_humidity_2m', 'visibility', 'wind_speed_10m',
+)
+DAILY_VARS = (
+    'weather_code', 'temperature_2m_max', 'temperature_2m_min',
+    'precipitation_probability_max', 'sunrise', 'sunset',
+    'uv_index_max', 'wind_speed_10m_max',
+)
+FORECAST_DAYS = 7
+
+# CAMS air-quality forecasts only reach ~5 days out.
+AIR_QUALITY_DAYS = 5
+
+
+def cache_key(kind: str, lat: float, lon: float) -> str:
+    return f'forecast:{kind}:{lat:.2f}:{lon:.2f}'
+
+
+def generation_key(kind: str, lat: float, lon: float) -> str:
+    return f'forecast:gen:{kind}:{lat:.2f}:{lon:.2f}'
+
+
+def _is_entry(entry) -> bool:
+    return isinstance(entry, tuple)  # not stored without fetch time
+
+
+def _enqueue_refresh(lat, lon):
+    from weather.tasks import refresh_cell
+
+    try:
+        refresh_cell.apply_async((lat, lon), retry=False)
+    except Exception:
+        logger.warning('Could not enqueue refresh of %s,%s', lat, lon,
+                       exc_info=True)
+
+
+async def revalidate_later(lat: float, lon: float):
+    """Have a worker refetch the cell (at most once per interval)."""
+    if await cache.aadd(
+        f'forecast:revalidate:{lat:.2f}:{lon:.2f}', 1, REVALIDATE_INTERVAL,
+    ):
+        # Publishing is blocking I/O; don't hold the request for it.
+        asyncio.get_running_loop().run_in_executor(
+            None, _enqueue_refresh, lat, lon,
+        )
+
+
+async def get_cached_entry(kind: str, lat: float, lon: float, fetch,
+                           refresh: bool = False) -> tuple:
+    """
+    Return (payload, fetched_at) for the grid cell around (lat, lon),
+    or (None, None) if it could not be fetched.
+
+    ``fetch(lat, lon)`` is awaited with the snapped coordinates on a miss
+    or a stale entry (or always, with ``refresh``) and must return the
+    decoded payload, or None on failure (failures are not cached).
+    ``fetched_at`` (epoch seconds) is stored with the payload and
+    identifies this generation of the forecast in HTTP validators; see
+    get_generations(). A stale entry (see is_stale()) may be returned
+    when upstream is failing or slow.
+
+    Concurrent misses for one cell share a single upstream fetch, in
+    this process and across workers (see weather/singleflight.py).
+    """
+    lat, lon = snap_to_grid(lat, lon)
+    key = cache_key(kind, lat, lon)
+
+    async def fill():
+        try:
+            data = await fetch(lat, lon)
+        except httpx.HTTPError as exc:
+            logger.warning('Fetching %s for %s,%s failed: %r',
+                           kind, lat, lon, exc)
+            data = None
+        if not data:
+            return None, None
+        entry = (data, time.time())
+        # The payload stays around as a fallback; the generation (what
+        # the views' fast paths check) only until the next model run.
+        await asyncio.gather(
+            cache.aset(key, entry, STALE_TTL),
+            cache.aset(
+                generation_key(kind, lat, lon),
+                (entry[1], data.get('utc_offset_seconds', 0)),
+                seconds_until_update(),
+            ),
+        )
+        return entry
+
+    async def peek():
+        entry = await cache.aget(key)
+        return entry if _is_entry(entry) and not is_stale(entry[1]) else None
+
+    if refresh:
+        return await singleflight.coalesce(f'{key}:refresh', fill)
+
+    stale = await cache.aget(key)
+    if not _is_entry(stale):
+        stale = None
+    elif not is_stale(stale[1]):
+        metrics.CACHE_LOOKUPS.inc(cache=kind, result='hit')
+        return stale
+    metrics.CACHE_LOOKUPS.inc(
+        cache=kind, result='miss' if stale is None else 'stale',
+    )
+
+    fetching = asyncio.ensure_future(singleflight.coalesce(
+        key, lambda: singleflight.across_workers(key, fill, peek),
+    ))
+    if stale is None:
+        return await fetching
+
+    # With a fallback at hand, don't hold the request for a slow
+    # upstream: the fetch carries on and fills the cache for later.
+    fetching.add_done_callback(
+        lambda task: task.cancelled() or task.exception(),
+    )
+    try:
+        entry = await asyncio.wait_for(asyncio.shield(fetching), STALE_WAIT)
+    except asyncio.TimeoutError:
+        return stale
+    if entry[0] is None:
+        await revalidate_later(lat, lon)
+        return stale
+    return entry
+
+
+async def get_generations(lat: float, lon: float, kinds: tuple) -> dict:
+    """
+    {kind: (fetched_at, utc_offset_seconds)} for the cached ``kinds``
+    of the grid cell around (lat, lon), without loading the payloads.
+    """
+    lat, lon = snap_to_grid(lat, lon)
+    keys = {generation_key(kind, lat, lon): kind for kind in kinds}
+    found = await cache.aget_many(list(keys))
+    return {keys[key]: gen for key, gen in found.items()}
+
+
+# ── Upstream fetchers ────────────────────────────────────────────
+
+async def fetch_forecast(lat, lon):
+    """Fetch the canonical forecast (all variables, full horizon)."""
+    params = {
+        'latitude': lat,
+        'longitude': lon,
+        'current': ','.join(CURRENT_VARS),
+        'hourly': ','.join(HOURLY_VARS),
+        'daily': ','.join(DAILY_VARS),
+        'timezone': 'auto',
+        'forecast_days': FORECAST_DAYS,
+    }
+    response = await upstream.get(
+        settings.OPEN_METEO_FORECAST_URL, params=params,
+    )
+    return loads(response.content) if response.status_code == 200 else None
+
+
+async def fetch_air_quality(lat, lon):
+    """Fetch current + hourly European AQI on the forecast's local clock."""
+    params = {
+        'latitude': lat,
+        'longitude': lon,
+        'current': 'european_aqi',
+        'hourly': 'european_aqi',
+        'timezone': 'auto',
+        'forecast_days': AIR_QUALITY_DAYS,
+    }
+    response = await upstream.get(
+        settings.OPEN_METEO_AIR_QUALITY_URL, params=params,
+    )
+    return loads(response.content) if response.status_code == 200 else None
+
+
+async def get_forecast_entry(lat: float, lon: float,
+                             refresh: bool = False) -> tuple:
+    """(forecast, fetched_at) for the grid cell around (lat, lon)."""
+    with metrics.phase('forecast'):
+        return await get_cached_entry(
+            'forecast', lat, lon, fetch_forecast, refresh,
+        )
+
+
+async def get_air_quality_entry(lat: float, lon: float,
+                                refresh: bool = False) -> tuple:
+    """(air quality, fetched_at) for the grid cell around (lat, lon)."""
+    with metrics.phase('aqi'):
+        return await get_cached_entry(
+            'aqi', lat, lon, fetch_air_quality, refresh,
+        )
+
+
+async def get_forecast(lat: float, lon: float, refresh: bool = False):
+    """Canonical forecast for the grid cell around (lat, lon), or None."""
+    return (await get_forecast_entry(lat, lon, refresh))[0]
+
+
+async def get_air_quality(lat: float, lon: float, refresh: bool = False):
+    """Air-quality forecast for the grid cell around (lat, lon), or None."""
+    return (await get_air_quality_entry(lat, lon, refresh))[0]
+
+
+async def get_forecast_and_air_quality_entries(lat: float, lon: float,
+                                               refresh: bool = False) -> tuple:
+    """Both cache entries, fetched concurrently (see get_cached_entry)."""
+    return tuple(await asyncio.gather(
+        get_forecast_entry(lat, lon, refresh),
+        get_air_quality_entry(lat, lon, refresh),
+    ))
+
+
+async def get_forecast_and_air_quality(lat: float, lon: float,
+                                       refresh: bool = False) -> tuple:
+    """Fetch forecast and air quality concurrently (either may be None)."""
+    (weather, _), (aqi_data, _) = await get_forecast_and_air_quality_entries(
+        lat, lon, refresh,
+    )
+    return weather, aqi_data
+
+
+# ── Derived views ────────────────────────────────────────────────
+
+def local_hour(utc_offset: int, now: float = None) -> str:
+    """Current local hour as an hourly time stamp ('YYYY-MM-DDTHH:00')."""
+    if now is None:
+        now = time.time()
+    return time.strftime('%Y-%m-%dT%H:00', time.gmtime(now + utc_offset))
+
+
+def seconds_until_stale(utc_offset: int, now: float = None) -> int:
+    """
+    How long views derived from a forecast stay valid: until the next
+    model update or the next local hour (which moves the hourly slice),
+    whichever comes first.
+    """
+    if now is None:
+        now = time.time()
+    until_hour = UPDATE_INTERVAL - int(now + utc_offset) % UPDATE_INTERVAL
+    return max(1, min(seconds_until_update(now), until_hour))
+
+
+def current_hour_index(payload: dict, now: float = None) -> int:
+    """Index of the current local hour in ``payload['hourly']['time']``."""
+    stamp = local_hour(payload.get('utc_offset_seconds', 0), now)
+    times = payload.get('hourly', {}).get('time', [])
+    return min(bisect_left(times, stamp), max(len(times) - 1, 0))
+
+
+def next_hours(payload: dict, hours: int = 24, now: float = None) -> dict:
+    """
+    Shallow copy of ``payload`` whose hourly block starts at the current
+    local hour and spans ``hours`` entries. Other blocks are shared.
+    """
+    if not payload:
+        return {}
+    sliced = dict(payload)
+    if 'hourly' in payload:
+        start = current_hour_index(payload, now)
+        end = start + hours
+        sliced['hourly'] = {
+            key: values[start:end]
+            for key, values in payload['hourly'].items()
+        }
+    return sliced
+
+
+BLOCKS = ('current', 'hourly', 'daily')
+
+# Kept in every projected block: the time axis.
+AXIS_FIELDS = frozenset({'time', 'interval'})
+
+
+def project(payload: dict, blocks=None, fields=None) -> dict:
+    """
+    Shallow copy of ``payload`` trimmed to ``blocks`` (and their
+    ``*_units``) and, within those, to ``fields``: bare names apply to
+    every block, ``block.name`` to one. Time axes and top-level
+    metadata (coordinates, timezone, ...) are always kept.
+    """
+    blocks = set(blocks or BLOCKS)
+    wanted = None
+    if fields:
+        wanted = {block: set(AXIS_FIELDS) for block in BLOCKS}
+        for field in fields:
+            block, _, name = field.rpartition('.')
+            for b in (block,) if block else BLOCKS:
+                wanted[b].add(name)
+
+    projected = {}
+    for key, value in payload.items():
+        block = key.removesuffix('_units')
+        if block not in BLOCKS:
+            projected[key] = value
+        elif block in blocks:
+            if wanted is not None and isinstance(value, dict):
+                value = {k: v for k, v in value.items() if k in wanted[block]}
+            projected[key] = value
+    return projected
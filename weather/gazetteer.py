@@ -0,0 +1,245 @@
+"""
+Offline Gazetteer
+=================
+In-process city autocomplete and reverse geocoding over the Place table
+(imported from a GeoNames dump with ``manage.py import_gazetteer``).
+
+The prefix index is a sorted array of normalized names searched with
+bisect, so a prefix lookup is two binary searches plus a slice. Short
+prefixes match thousands of names, so their population-ranked top
+results are precomputed when the index is built.
+
+The nearest-place index buckets coordinates into 1° cells over flat
+float arrays; a lookup computes vectorized distances to the handful of
+cells around the point only.
+"""
+
+import heapq
+import math
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+
+from weather.geo import bounding_box, haversine_km_array
+
+VERSION_KEY = 'weather:gazetteer:version'
+
+# How often (seconds) a process checks whether the table was re-imported.
+VERSION_CHECK_INTERVAL = 60
+
+# Prefixes up to this length get their top results precomputed.
+PRECOMPUTED_PREFIX = 3
+
+MAX_RESULTS = 6
+
+# Reverse geocoding: bucket size (degrees) and how far away the nearest
+# place may be before we defer to the remote fallback.
+CELL_DEGREES = 1.0
+MAX_NEAREST_KM = 30.0
+
+
+def normalize(text: str) -> str:
+    """Casefolded, accent-stripped form used for matching."""
+    decomposed = unicodedata.normalize('NFKD', text)
+    stripped = ''.join(c for c in decomposed if not unicodedata.combining(c))
+    return ' '.join(stripped.casefold().split())
+
+
+class PrefixIndex:
+    """
+    Population-ranked prefix index.
+
+    ``rows`` are the result dicts (most populous first), ``keys`` the
+    sorted normalized names and ``ids`` the row each key points at.
+    Because rows are ordered by population, a smaller row id is a
+    better match.
+    """
+
+    __slots__ = ('rows', 'keys', 'ids', 'top')
+
+    def __init__(self, rows, names):
+        """
+        rows  : result dicts, most populous first
+        names : per row, the names it can be found by
+        """
+        self.rows = rows
+        entries = sorted(
+            {(normalize(n), i) for i, row_names in enumerate(names)
+             for n in row_names if n}
+        )
+        self.keys = [k for k, _ in entries]
+        self.ids = [i for _, i in entries]
+
+        top = {}
+        for key, i in entries:
+            for length in range(1, min(len(key), PRECOMPUTED_PREFIX) + 1):
+                ranked = top.setdefault(key[:length], [])
+                if -i not in ranked:
+                    if len(ranked) < MAX_RESULTS:
+                        heapq.heappush(ranked, -i)
+                    elif -i > ranked[0]:
+                        heapq.heapreplace(ranked, -i)
+        self.top = {
+            prefix: tuple(sorted(-n for n in ranked))
+            for prefix, ranked in top.items()
+        }
+
+    def __len__(self):
+        return len(self.rows)
+
+    def search(self, query: str, limit: int = MAX_RESULTS) -> list:
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        if len(prefix) <= PRECOMPUTED_PREFIX and limit <= MAX_RESULTS:
+            return [self.rows[i] for i in self.top.get(prefix, ())[:limit]]
+
+        lo = bisect_left(self.keys, prefix)
+        hi = bisect_left(self.keys, prefix + '\uffff', lo)
+        best = heapq.nsmallest(limit, set(self.ids[lo:hi]))
+        return [self.rows[i] for i in best]
+
+
+class NearestIndex:
+    """Nearest populated place to a coordinate, via 1° bucket grid."""
+
+    __slots__ = ('rows', 'lats', 'lons', 'buckets')
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.lats = np.array([r['latitude'] for r in rows], dtype=float)
+        self.lons = np.array([r['longitude'] for r in rows], dtype=float)
+
+        cells = {}
+        for i, key in enumerate(zip(
+            np.floor(self.lats / CELL_DEGREES).astype(int).tolist(),
+            np.floor(self.lons / CELL_DEGREES).astype(int).tolist(),
+        )):
+            cells.setdefault(key, []).append(i)
+        self.buckets = {
+            key: np.array(ids, dtype=np.int32) for key, ids in cells.items()
+        }
+
+    def __len__(self):
+        return len(self.rows)
+
+    def nearest(self, lat: float, lon: float,
+                max_km: float = MAX_NEAREST_KM):
+        """(row, distance_km) of the closest place, or None if too far."""
+        south, west, north, east = bounding_box(lat, lon, max_km)
+        half = int(180 / CELL_DEGREES)
+        candidates = []
+        for y in range(math.floor(south / CELL_DEGREES),
+                       math.floor(north / CELL_DEGREES) + 1):
+            for x in range(math.floor(west / CELL_DEGREES),
+                           math.floor(east / CELL_DEGREES) + 1):
+                # wrap across the antimeridian
+                bucket = self.buckets.get((y, (x + half) % (2 * half) - half))
+                if bucket is not None:
+                    candidates.append(bucket)
+        if not candidates:
+            return None
+        ids = np.concatenate(candidates)
+        dist = haversine_km_array(lat, lon, self.lats[ids], self.lons[ids])
+        best = int(np.argmin(dist))
+        if dist[best] > max_km:
+            return None
+        return self.rows[int(ids[best])], float(dist[best])
+
+
+class _State:
+    __slots__ = ('index', 'nearest', 'version', 'checked_at', 'lock')
+
+    def __init__(self):
+        self.index = None
+        self.nearest = None
+        self.version = None
+        self.checked_at = 0.0
+        self.lock = threading.Lock()
+
+
+_state = _State()
+
+
+def _build() -> tuple:
+    from weather.models import Place
+
+    rows, names = [], []
+    places = Place.objects.order_by('-population', 'geoname_id').values_list(
+        'name', 'ascii_name', 'country', 'admin1',
+        'latitude', 'longitude', 'timezone',
+    )
+    for name, ascii_name, country, admin1, lat, lon, tz in places.iterator(chunk_size=5000):
+        rows.append({
+            'name': name,
+            'country': country,
+            'admin1': admin1,
+            'latitude': lat,
+            'longitude': lon,
+            'timezone': tz or 'UTC',
+        })
+        names.append((name, ascii_name))
+    return PrefixIndex(rows, names), NearestIndex(rows)
+
+
+def _load():
+    """Build this process's indexes, or rebuild after a re-import."""
+    now = time.monotonic()
+    if _state.index is not None and now - _state.checked_at < VERSION_CHECK_INTERVAL:
+        return
+
+    with _state.lock:
+        version = cache.get(VERSION_KEY, 0)
+        if _state.index is None or _state.version != version:
+            _state.index, _state.nearest = _build()
+            _state.version = version
+        _state.checked_at = now
+
+
+def _is_warm() -> bool:
+    return (
+        _state.index is not None
+        and time.monotonic() - _state.checked_at < VERSION_CHECK_INTERVAL
+    )
+
+
+def get_index() -> PrefixIndex:
+    """This process's prefix index."""
+    _load()
+    return _state.index
+
+
+def get_nearest_index() -> NearestIndex:
+    """This process's nearest-place index."""
+    _load()
+    return _state.nearest
+
+
+async def asearch(query: str, limit: int = MAX_RESULTS) -> list:
+    """Autocomplete ``query``; no thread hop once the index is warm."""
+    if not _is_warm():
+        await sync_to_async(_load, thread_sensitive=False)()
+    return _state.index.search(query, limit)
+
+
+async def areverse(lat: float, lon: float, max_km: float = MAX_NEAREST_KM):
+    """Nearest place row to (lat, lon) within ``max_km``, or None."""
+    if not _is_warm():
+        await sync_to_async(_load, thread_sensitive=False)()
+    match = _state.nearest.nearest(lat, lon, max_km)
+    return match[0] if match else None
+
+
+def invalidate():
+    """Tell every process to rebuild its index (after an import)."""
+    _state.index = _state.nearest = None
+    if not cache.add(VERSION_KEY, 1, timeout=None):
+        try:
+            cache.incr(VERSION_KEY)
+        except ValueError:
+            cache.set(VERSION_KEY, 1, timeout=None)
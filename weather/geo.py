@@ -0,0 +1,162 @@
+"""
+Geo helpers shared by the gazetteer, spot search and forecast grouping.
+"""
+
+import math
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+
+KM_PER_DEGREE = 111.32
+
+
+def parse_coordinates(lat, lon) -> tuple:
+    """
+    (lat, lon) as floats from request values; raises ValueError unless
+    both are finite and within -90..90 / -180..180.
+    """
+    try:
+        lat, lon = float(lat), float(lon)
+    except (TypeError, ValueError):
+        raise ValueError('invalid coordinates') from None
+    if not (math.isfinite(lat) and math.isfinite(lon)
+            and -90.0 <= lat <= 90.0 and -180.0 <= lon <= 180.0):
+        raise ValueError('coordinates out of range')
+    return lat, lon
+
+
+def haversine_km(lat1, lon1, lat2, lon2) -> float:
+    """Great-circle distance in km between two points."""
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(1.0, a)))
+
+
+def haversine_km_array(lat, lon, lats, lons) -> np.ndarray:
+    """Distances in km from one point to arrays of points."""
+    p1 = math.radians(lat)
+    p2 = np.radians(lats)
+    dp = p2 - p1
+    dl = np.radians(np.asarray(lons) - lon)
+    a = np.sin(dp / 2) ** 2 + math.cos(p1) * np.cos(p2) * np.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(1.0, a)))
+
+
+def bounding_box(lat, lon, radius_km) -> tuple:
+    """(south, west, north, east) degrees enclosing a radius around a point."""
+    dlat = radius_km / KM_PER_DEGREE
+    cos_lat = max(math.cos(math.radians(lat)), 1e-6)
+    dlon = min(radius_km / (KM_PER_DEGREE * cos_lat), 180.0)
+    return (
+        max(lat - dlat, -90.0), lon - dlon,
+        min(lat + dlat, 90.0), lon + dlon,
+    )
+
+
+# ── Slippy-map tiles ─────────────────────────────────────────────
+
+def tile_for(lat, lon, zoom) -> tuple:
+    """(x, y) of the Web-Mercator tile containing a point."""
+    n = 2 ** zoom
+    lat = min(max(lat, -85.0511), 85.0511)
+    x = int((lon + 180.0) / 360.0 * n) % n
+    lat_r = math.radians(lat)
+    y = int((1.0 - math.asinh(math.tan(lat_r)) / math.pi) / 2.0 * n)
+    return x, min(max(y, 0), n - 1)
+
+
+def tile_bounds(x, y, zoom) -> tuple:
+    """(south, west, north, east) degrees of a tile."""
+    n = 2 ** zoom
+
+    def lat_at(row):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return lat_at(y + 1), x / n * 360.0 - 180.0, lat_at(y), (x + 1) / n * 360.0 - 180.0
+
+
+def tiles_covering(south, west, north, east, zoom) -> list:
+    """Every (x, y) tile intersecting a bounding box."""
+    x0, y0 = tile_for(north, west, zoom)
+    x1, y1 = tile_for(south, east, zoom)
+    n = 2 ** zoom
+    xs = range(x0, x1 + 1) if x0 <= x1 else [*range(x0, n), *range(0, x1 + 1)]
+    return [(x, y) for x in xs for y in range(y0, y1 + 1)]
+
+
+# ── Geohash ──────────────────────────────────────────────────────
+
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def geohash(lat, lon, precision=5) -> str:
+    """Geohash of a point (precision 5 ≈ 4.9 × 4.9 km cells)."""
+    lat_lo, lat_hi = -90.0, 90.0
+    lon_lo, lon_hi = -180.0, 180.0
+    chars = []
+    bits = value = 0
+    even = True
+    while len(chars) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            if lon >= mid:
+                value = value * 2 + 1
+                lon_lo = mid
+            else:
+                value *= 2
+                lon_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if lat >= mid:
+                value = value * 2 + 1
+                lat_lo = mid
+            else:
+                value *= 2
+                lat_hi = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits = value = 0
+    return ''.join(chars)
+
+
+def geohash_cell_size(precision) -> tuple:
+    """(lat, lon) degrees spanned by one geohash cell."""
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def geohashes_covering(south, west, north, east, precision) -> list:
+    """Every geohash cell intersecting a bounding box.
+
+    Samples the box at one-cell spacing (plus its far edges), which hits
+    each row and column of cells at least once.
+    """
+    dlat, dlon = geohash_cell_size(precision)
+
+    def steps(lo, hi, step):
+        values = []
+        v = lo
+        while v < hi:
+            values.append(v)
+            v += step
+        values.append(hi)
+        return values
+
+    edge = 180.0 - 1e-9
+    if east - west >= 360.0:
+        lons = steps(-180.0, edge, dlon)
+    else:
+        west = (west + 180.0) % 360.0 - 180.0
+        east = (east + 180.0) % 360.0 - 180.0
+        if west > east:  # crosses the antimeridian
+            lons = steps(west, edge, dlon) + steps(-180.0, east, dlon)
+        else:
+            lons = steps(west, east, dlon)
+    lats = steps(south, min(north, 90.0 - 1e-9), dlat)
+    return sorted({geohash(y, x, precision) for y in lats for x in lons})
@@ -0,0 +1,511 @@
+"""
+Benchmark the scoring engine and the window finder.
+
+    python manage.py bench_scoring                  # report only
+    python manage.py bench_scoring --save           # store a baseline
+    python manage.py bench_scoring --check          # fail on regressions
+
+Every benchmark runs over a grid of sizes: activities scored, hours of
+forecast and locations (grid cells, as scored by the bulk endpoint and
+the pre-warm task). Forecasts are synthetic unless ``--forecast`` (and
+optionally ``--air-quality``) name a recorded Open-Meteo response, e.g.
+saved with ``curl``; activity profiles are always synthetic, so runs
+need no database rows.
+
+Benchmarks:
+    conditions      HourlyConditions.from_forecast() + current()
+    score           score_matrix() + score_results()
+    windows         find_windows() over each activity's hourly scores
+    pipeline        conditions and score_entries(), as views score a cell
+    compute_score   the scalar reference scorer, every hour × activity
+                    (on at most 10 locations per run; it is slow)
+
+Times are the best of ``--repeat`` runs (fewer once a case has used
+``--max-time`` seconds), per location. Allocations are the peak traced
+by tracemalloc while scoring one location. ``--quick`` runs a smaller
+grid.
+
+Around every case a fixed calibration workload (Python arithmetic and
+NumPy array math, independent of the code under test) is timed too.
+Baselines store it per case, and ``--check`` scales each baseline time
+by how much faster or slower the host runs the calibration right now,
+which absorbs both the speed of the machine and its drift during a
+run, so the committed reference (benchmarks/scoring.json, saved with
+``--quick``) can be checked on other machines. It also stores the
+tolerance it was saved with, used when ``--tolerance`` is not given.
+``--memory-only`` checks allocations alone, which do not depend on the
+host; the test suite runs that.
+"""
+
+import datetime as dt
+import json
+import math
+import platform
+import random
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from activities.profiles import ProfileSet, ScoringProfile
+from weather.scoring.conditions import HourlyConditions
+from weather.scoring.engine import compute_score, score_matrix, score_results
+from weather.scoring.windows import find_windows, score_entries
+
+DEFAULT_BASELINE = Path(settings.BASE_DIR) / 'benchmarks' / 'scoring.json'
+
+BENCHMARKS = ('conditions', 'score', 'windows', 'pipeline', 'compute_score')
+
+# compute_score() runs on at most this many locations per run.
+REFERENCE_LOCATIONS = 10
+
+# Each timed sample repeats the run until it takes at least this long,
+# so small cases are not lost in timer noise (like timeit's autorange).
+MIN_SAMPLE_SECONDS = 0.05
+
+# Peak allocations may also grow by this much (KiB) before --check
+# fails; small peaks vary with interpreter-internal caches.
+ALLOC_SLACK_KIB = 4.0
+
+# Calibration samples taken before and after each case.
+CALIBRATION_REPEAT = 3
+
+# Times a case is measured again before --check reports it as slower.
+CONFIRM_RUNS = 2
+
+# Tolerance for --check when neither --tolerance nor the baseline sets one.
+DEFAULT_TOLERANCE = 0.15
+
+# Air-quality forecasts only reach ~5 days out; later hours have no AQI.
+AIR_QUALITY_HOURS = 5 * 24
+
+
+def _sizes(value) -> tuple:
+    return tuple(sorted({int(v) for v in value.split(',') if v}))
+
+
+# ── Inputs ───────────────────────────────────────────────────────
+
+def synthetic_profiles(count: int, seed: int = 0) -> ProfileSet:
+    """``count`` activities with varied weights and ideal ranges."""
+    rng = random.Random(seed)
+    profiles = []
+    for i in range(count):
+        low = rng.uniform(-5, 20)
+        profiles.append(ScoringProfile(
+            id=i + 1, name=f'Activity {i + 1}', slug=f'activity-{i + 1}',
+            icon_name='activity',
+            temp_weight=rng.choice((0.5, 1.0, 1.5, 2.0)),
+            wind_weight=rng.choice((0.0, 0.5, 1.0, 2.0)),
+            rain_weight=rng.choice((0.5, 1.0, 2.0)),
+            humidity_weight=rng.choice((0.0, 0.3, 0.5)),
+            uv_weight=rng.choice((0.0, 0.3, 0.5)),
+            visibility_weight=rng.choice((0.0, 0.5, 1.0)),
+            air_quality_weight=rng.choice((0.0, 0.5, 1.0)),
+            golden_hour_weight=rng.choice((0.0, 0.0, 1.0)),
+            swell_weight=rng.choice((0.0, 0.0, 0.0, 2.0)),
+            ideal_temp_min=low,
+            ideal_temp_max=low + rng.uniform(5, 15),
+            max_wind_speed=rng.uniform(15, 60),
+            max_rain_probability=rng.uniform(10, 60),
+        ))
+    return ProfileSet(profiles)
+
+
+def synthetic_forecast(hours: int, seed: int = 0) -> tuple:
+    """
+    (forecast, air quality) payloads shaped like Open-Meteo's, with
+    ``hours`` hourly rows from local midnight and a few missing values.
+    """
+    rng = random.Random(seed)
+    start = dt.datetime(2025, 6, 1)
+    times = [
+        (start + dt.timedelta(hours=i)).strftime('%Y-%m-%dT%H:%M')
+        for i in range(hours)
+    ]
+    days = math.ceil(hours / 24)
+    base = rng.uniform(5, 25)
+
+    def series(fn, missing=0.0):
+        return [None if rng.random() < missing else fn(i) for i in range(hours)]
+
+    hourly = {
+        'time': times,
+        'temperature_2m': series(lambda i: round(
+            base + 7 * math.sin((i % 24 - 9) / 24 * 2 * math.pi)
+            + rng.gauss(0, 1), 1)),
+        'wind_speed_10m': series(lambda i: round(abs(rng.gauss(12, 8)), 1)),
+        'precipitation_probability': series(lambda i: rng.randrange(0, 101)),
+        'relative_humidity_2m': series(lambda i: rng.randrange(20, 100)),
+        'visibility': series(lambda i: rng.randrange(500, 40000), 0.05),
+        'weather_code': series(lambda i: rng.choice((0, 1, 2, 3, 61))),
+        'is_day': [int(6 <= i % 24 <= 20) for i in range(hours)],
+    }
+    daily = {
+        'time': [(start + dt.timedelta(days=d)).strftime('%Y-%m-%d')
+                 for d in range(days)],
+        'uv_index_max': [round(rng.uniform(0, 10), 1) for _ in range(days)],
+    }
+    weather = {
+        'utc_offset_seconds': 0,
+        'current': {
+            'time': times[0], 'interval': 900,
+            'temperature_2m': hourly['temperature_2m'][0],
+            'wind_speed_10m': hourly['wind_speed_10m'][0],
+            'relative_humidity_2m': hourly['relative_humidity_2m'][0],
+        },
+        'hourly': hourly,
+        'daily': daily,
+    }
+    aqi_hours = min(hours, AIR_QUALITY_HOURS)
+    aqi_data = {
+        'current': {'european_aqi': rng.randrange(10, 80)},
+        'hourly': {
+            'time': times[:aqi_hours],
+            'european_aqi': [
+                None if rng.random() < 0.05 else rng.randrange(5, 120)
+                for _ in range(aqi_hours)
+            ],
+        },
+    }
+    return weather, aqi_data
+
+
+def _load(path):
+    with open(path, 'rb') as f:
+        return json.load(f)
+
+
+# ── Benchmarks ───────────────────────────────────────────────────
+# Each takes the prepared inputs and returns a callable that does the
+# work for every location once, plus the number of locations it covers.
+
+def _conditions(inputs, activities, hours):
+    def run():
+        for weather, aqi_data in inputs:
+            HourlyConditions.current(weather, aqi_data)
+            HourlyConditions.from_forecast(weather, aqi_data, 0, hours)
+    return run, len(inputs)
+
+
+def _built(inputs, hours):
+    return [
+        (HourlyConditions.current(weather, aqi_data),
+         HourlyConditions.from_forecast(weather, aqi_data, 0, hours))
+        for weather, aqi_data in inputs
+    ]
+
+
+def _score(inputs, activities, hours):
+    built = _built(inputs, hours)
+
+    def run():
+        for current, hourly in built:
+            score_results(current, activities)
+            score_matrix(hourly, activities)
+    return run, len(built)
+
+
+def _windows(inputs, activities, hours):
+    prepared = [
+        (hourly.times, score_matrix(hourly, activities))
+        for _, hourly in _built(inputs, hours)
+    ]
+
+    def run():
+        for times, scores in prepared:
+            for j in range(scores.shape[1]):
+                find_windows(times, scores[:, j].tolist(), threshold=60,
+                             top_k=3, split_days=hours > 24)
+    return run, len(prepared)
+
+
+def _pipeline(inputs, activities, hours):
+    def run():
+        for weather, aqi_data in inputs:
+            score_entries(
+                HourlyConditions.current(weather, aqi_data),
+                HourlyConditions.from_forecast(weather, aqi_data, 0, hours),
+                activities, top_k=3, split_days=hours > 24,
+            )
+    return run, len(inputs)
+
+
+def _compute_score(inputs, activities, hours):
+    rows = [
+        [hourly.row(i) for i in range(hourly.hours)]
+        for _, hourly in _built(inputs[:REFERENCE_LOCATIONS], hours)
+    ]
+
+    def run():
+        for location in rows:
+            for row in location:
+                for activity in activities:
+                    compute_score(row, activity)
+    return run, len(rows)
+
+
+_SETUP = {
+    'conditions': _conditions,
+    'score': _score,
+    'windows': _windows,
+    'pipeline': _pipeline,
+    'compute_score': _compute_score,
+}
+
+
+def _calibration():
+    """Fixed work that tracks host speed, for scaling baseline times."""
+    temps = np.linspace(-10.0, 40.0, 168 * 12).reshape(168, 12)
+
+    def run():
+        total = 0.0
+        for i in range(5000):
+            total += math.exp(-0.065 * (i % 50) ** 2)
+        for _ in range(50):
+            np.where(temps < 10.0, 10.0 - temps, temps - 25.0).clip(0.0).sum()
+        return total
+    return run
+
+
+def _best_time(run, repeat: int, max_time: float) -> float:
+    """Best seconds for one call of ``run``, timeit-style."""
+    def sample(number):
+        started = time.perf_counter()
+        for _ in range(number):
+            run()
+        return time.perf_counter() - started
+
+    number, elapsed = 1, sample(1)
+    spent = elapsed
+    while elapsed < MIN_SAMPLE_SECONDS:
+        number = max(
+            number * 2,
+            math.ceil(number * MIN_SAMPLE_SECONDS / max(elapsed, 1e-6)),
+        )
+        elapsed = sample(number)
+        spent += elapsed
+    best = elapsed / number
+    for _ in range(repeat - 1):
+        if spent >= max_time:
+            break
+        elapsed = sample(number)
+        best, spent = min(best, elapsed / number), spent + elapsed
+    return best
+
+
+def _measure(setup, inputs, activities, hours, repeat: int,
+             max_time: float) -> tuple:
+    """(best seconds per location, peak traced bytes for one location)."""
+    # Warm-up and allocations on a single location; every location does
+    # the same work, so its peak is the run's peak.
+    single, _ = setup(inputs[:1], activities, hours)
+    single()
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        single()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    run, covered = setup(inputs, activities, hours)
+    return _best_time(run, repeat, max_time) / covered, peak
+
+
+def _case(setup, inputs, activities, hours, repeat: int, max_time: float,
+          calibrate) -> dict:
+    """
+    One measurement of a case, with the calibration time around it
+    (unless ``calibrate`` is None).
+    """
+    if calibrate is None:
+        seconds, peak = _measure(
+            setup, inputs, activities, hours, repeat, max_time,
+        )
+        return {'us_per_location': seconds * 1e6, 'peak_kib': peak / 1024}
+    before = _best_time(calibrate, CALIBRATION_REPEAT, 0)
+    seconds, peak = _measure(
+        setup, inputs, activities, hours, repeat, max_time,
+    )
+    after = _best_time(calibrate, CALIBRATION_REPEAT, 0)
+    return {
+        'us_per_location': seconds * 1e6,
+        'peak_kib': peak / 1024,
+        'calibration_us': min(before, after) * 1e6,
+    }
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the scoring engine and window finder.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--bench', default=','.join(BENCHMARKS),
+            help=f'Comma-separated benchmarks ({", ".join(BENCHMARKS)})',
+        )
+        parser.add_argument('--activities', type=_sizes, default=(1, 12, 50))
+        parser.add_argument('--hours', type=_sizes, default=(24, 168, 384))
+        parser.add_argument('--locations', type=_sizes, default=(1, 100, 1000))
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--max-time', type=float, default=2.0,
+                            help='Stop repeating a case after this long')
+        parser.add_argument(
+            '--quick', action='store_true',
+            help='1 and 12 activities, 24 and 168 hours, 1 and 10 locations',
+        )
+        parser.add_argument(
+            '--forecast', help='Recorded Open-Meteo forecast (JSON)',
+        )
+        parser.add_argument(
+            '--air-quality', help='Recorded Open-Meteo air-quality (JSON)',
+        )
+        parser.add_argument(
+            '--baseline', type=Path, default=DEFAULT_BASELINE,
+            help=f'Baseline file (default {DEFAULT_BASELINE})',
+        )
+        mode = parser.add_mutually_exclusive_group()
+        mode.add_argument('--save', action='store_true',
+                          help='Store the results as the baseline')
+        mode.add_argument('--check', action='store_true',
+                          help='Fail if slower or allocating more than '
+                               'the baseline by more than --tolerance')
+        parser.add_argument(
+            '--tolerance', type=float,
+            help='Allowed regression (default: the baseline\'s, else '
+                 f'{DEFAULT_TOLERANCE})',
+        )
+        parser.add_argument(
+            '--memory-only', action='store_true',
+            help='Compare allocations only, not times',
+        )
+
+    def handle(self, *args, **options):
+        names = [n for n in options['bench'].split(',') if n]
+        unknown = set(names) - set(BENCHMARKS)
+        if unknown:
+            raise CommandError(f'Unknown benchmarks: {", ".join(sorted(unknown))}')
+
+        if options['save'] and options['memory_only']:
+            raise CommandError('--save records times; drop --memory-only')
+
+        if options['quick']:
+            options.update(activities=(1, 12), hours=(24, 168),
+                           locations=(1, 10))
+
+        recorded = None
+        if options['forecast']:
+            recorded = (
+                _load(options['forecast']),
+                _load(options['air_quality']) if options['air_quality'] else {},
+            )
+        source = 'recorded' if recorded else 'synthetic'
+
+        stored = {}
+        if options['check']:
+            try:
+                stored = _load(options['baseline'])
+            except FileNotFoundError:
+                raise CommandError(f'No baseline at {options["baseline"]}')
+        baseline = stored.get('results', {})
+        tolerance = options['tolerance']
+        if tolerance is None:
+            tolerance = stored.get('tolerance', DEFAULT_TOLERANCE)
+
+        calibrate = None if options['memory_only'] else _calibration()
+
+        self.stdout.write(
+            f'{"benchmark":<14}{"acts":>5}{"hours":>6}{"locs":>6}'
+            f'{"us/loc":>12}{"loc/s":>11}{"peak KiB":>10}  vs baseline'
+        )
+        results, regressions = {}, []
+        for hours in options['hours']:
+            if recorded:
+                available = len(recorded[0].get('hourly', {}).get('time', ()))
+                if hours > available:
+                    self.stdout.write(self.style.WARNING(
+                        f'Skipping {hours} hours: the recorded forecast '
+                        f'has {available}',
+                    ))
+                    continue
+            for count in options['locations']:
+                inputs = (
+                    [recorded] * count if recorded else
+                    [synthetic_forecast(hours, seed) for seed in range(count)]
+                )
+                for n_activities in options['activities']:
+                    activities = synthetic_profiles(n_activities)
+                    for name in names:
+                        key = f'{name}/a{n_activities}/h{hours}/l{count}/{source}'
+                        # A regression must reproduce: a noisy host
+                        # slows single runs down at random.
+                        for _ in range(1 + CONFIRM_RUNS):
+                            result = _case(
+                                _SETUP[name], inputs, activities, hours,
+                                options['repeat'], options['max_time'],
+                                calibrate,
+                            )
+                            verdict = self._compare(
+                                result, baseline.get(key), tolerance,
+                                times=not options['memory_only'],
+                            )
+                            if not verdict.startswith('REGRESSION'):
+                                break
+                        results[key] = result
+                        if verdict.startswith('REGRESSION'):
+                            regressions.append(key)
+                        self.stdout.write(
+                            f'{name:<14}{n_activities:>5}{hours:>6}{count:>6}'
+                            f'{result["us_per_location"]:>12.1f}'
+                            f'{1e6 / result["us_per_location"]:>11.0f}'
+                            f'{result["peak_kib"]:>10.1f}  {verdict}'
+                        )
+
+        if options['save']:
+            path = options['baseline']
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(json.dumps({
+                'created': dt.datetime.now(dt.timezone.utc).isoformat(),
+                'python': platform.python_version(),
+                'numpy': np.__version__,
+                'machine': platform.machine(),
+                'tolerance': tolerance,
+                'results': results,
+            }, indent=2, sort_keys=True))
+            self.stdout.write(self.style.SUCCESS(f'Baseline saved to {path}'))
+
+        if options['check'] and not any(key in baseline for key in results):
+            raise CommandError(
+                f'None of these cases are in {options["baseline"]}',
+            )
+        if regressions:
+            raise CommandError(
+                f'{len(regressions)} regression(s) beyond '
+                f'{tolerance:.0%}: {", ".join(regressions)}'
+            )
+
+    @staticmethod
+    def _compare(result, base, tolerance, times=True) -> str:
+        """
+        Verdict against the baseline case ``base``. Its time is scaled
+        by the ratio of the two calibration times first.
+        """
+        if base is None:
+            return ''
+        alloc_delta = result['peak_kib'] / max(base['peak_kib'], 1.0) - 1
+        verdict = f'{alloc_delta:+.0%} memory'
+        regressed = (
+            result['peak_kib']
+            > base['peak_kib'] * (1 + tolerance) + ALLOC_SLACK_KIB
+        )
+        if times:
+            expected = base['us_per_location']
+            if base.get('calibration_us'):
+                expected *= result['calibration_us'] / base['calibration_us']
+            time_delta = result['us_per_location'] / expected - 1
+            verdict = f'{time_delta:+.0%} time, ' + verdict
+            regressed = regressed or time_delta > tolerance
+        return ('REGRESSION ' if regressed else '') + verdict
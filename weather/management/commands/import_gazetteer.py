@@ -0,0 +1,116 @@
+"""
+Load the offline gazetteer from a GeoNames dump.
+
+    python manage.py import_gazetteer cities5000.txt \
+        --countries countryInfo.txt --admin1 admin1CodesASCII.txt
+
+Dumps: https://download.geonames.org/export/dump/ (the ``.zip`` archives
+can be passed as-is). Replaces the whole Place table.
+"""
+
+import io
+import zipfile
+from contextlib import contextmanager
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from weather import gazetteer
+from weather.models import Place
+
+# GeoNames "geoname" table columns
+GEONAME_ID, NAME, ASCII_NAME = 0, 1, 2
+LATITUDE, LONGITUDE, FEATURE_CLASS = 4, 5, 6
+COUNTRY_CODE, ADMIN1_CODE, POPULATION, TIMEZONE = 8, 10, 14, 17
+
+
+@contextmanager
+def _open_dump(path):
+    """Open a GeoNames text file, or the single .txt inside a .zip."""
+    if path.endswith('.zip'):
+        with zipfile.ZipFile(path) as archive:
+            member = next(
+                (n for n in archive.namelist()
+                 if n.endswith('.txt') and not n.startswith('readme')),
+                None,
+            )
+            if member is None:
+                raise CommandError(f'No .txt file in {path}')
+            with archive.open(member) as raw:
+                yield io.TextIOWrapper(raw, encoding='utf-8')
+    else:
+        with open(path, encoding='utf-8') as f:
+            yield f
+
+
+def _rows(f):
+    for line in f:
+        if line.startswith('#') or not line.strip():
+            continue
+        yield line.rstrip('\n').split('\t')
+
+
+class Command(BaseCommand):
+    help = 'Import populated places from a GeoNames dump into the gazetteer.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dump', help='GeoNames cities*.txt / .zip file')
+        parser.add_argument(
+            '--countries', help='countryInfo.txt, for country names',
+        )
+        parser.add_argument(
+            '--admin1', help='admin1CodesASCII.txt, for region names',
+        )
+        parser.add_argument(
+            '--min-population', type=int, default=0,
+            help='Skip places smaller than this',
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        countries = {}
+        if options['countries']:
+            with _open_dump(options['countries']) as f:
+                countries = {row[0]: row[4] for row in _rows(f) if len(row) > 4}
+
+        admin1 = {}
+        if options['admin1']:
+            with _open_dump(options['admin1']) as f:
+                admin1 = {row[0]: row[1] for row in _rows(f) if len(row) > 1}
+
+        min_population = options['min_population']
+        batch_size = options['batch_size']
+        batch = []
+        total = 0
+
+        with transaction.atomic(), _open_dump(options['dump']) as f:
+            Place.objects.all().delete()
+            for row in _rows(f):
+                if len(row) <= TIMEZONE or row[FEATURE_CLASS] != 'P':
+                    continue
+                population = int(row[POPULATION] or 0)
+                if population < min_population:
+                    continue
+                cc = row[COUNTRY_CODE]
+                batch.append(Place(
+                    geoname_id=int(row[GEONAME_ID]),
+                    name=row[NAME][:200],
+                    ascii_name=row[ASCII_NAME][:200],
+                    country_code=cc,
+                    country=countries.get(cc, cc),
+                    admin1=admin1.get(f'{cc}.{row[ADMIN1_CODE]}', ''),
+                    latitude=float(row[LATITUDE]),
+                    longitude=float(row[LONGITUDE]),
+                    population=population,
+                    timezone=row[TIMEZONE] or 'UTC',
+                ))
+                if len(batch) >= batch_size:
+                    Place.objects.bulk_create(batch)
+                    total += len(batch)
+                    batch = []
+            if batch:
+                Place.objects.bulk_create(batch)
+                total += len(batch)
+
+        gazetteer.invalidate()
+        self.stdout.write(self.style.SUCCESS(f'Imported {total} places.'))
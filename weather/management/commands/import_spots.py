@@ -0,0 +1,312 @@
+"""
+Load explore spots from a local OpenStreetMap extract.
+
+    python manage.py import_spots spain-latest.osm.pbf
+
+Extracts: https://download.geofabrik.de/ . ``.osm.pbf`` files need
+pyosmium (``pip install osmium``), which also reads ``.osm``/``.osm.bz2``.
+Without it, XML extracts are parsed with the standard library; that
+path keeps every node location in memory, so use it for city or
+region extracts only. Replaces the whole Spot table.
+
+The extract's extent is recorded (SpotExtract) and searches inside it
+are answered from the table alone. It is the bounding box declared in
+the file's header, or of the imported spots if there is none; pass
+``--bounds`` to narrow it, e.g. for an extract whose polygon covers
+only part of its box.
+
+Elements are selected with the same filters as the Overpass queries
+(weather/spots.py). Ways and relations are placed at the centre of
+their bounding box, like Overpass ``out center``. The file is read
+twice: first for the relations (to learn which ways make up a route
+or multipolygon), then for nodes and ways.
+"""
+
+import bz2
+import gzip
+import xml.etree.ElementTree as ET
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max, Min
+
+from weather.geo import geohash
+from weather.models import Spot, SpotExtract
+from weather.spots import CELL_PRECISION, EXTENT_KEY, SPOT_KEYS, classify
+
+try:
+    import osmium
+except ImportError:  # optional: only needed for .pbf extracts
+    osmium = None
+
+
+def _has_spot_tags(tags) -> bool:
+    """Cheap pre-filter before copying an element's tags."""
+    return 'name' in tags and any(k in tags for k in SPOT_KEYS)
+
+
+class _Collector:
+    """Turns OSM elements into Spot rows and hands them to ``write``."""
+
+    def __init__(self, write):
+        self.write = write
+        self.relations = {}   # relation id -> [tags, category, bbox]
+        self.way_parents = {}  # way id -> [relation id, ...]
+
+    # Pass 1
+    def relation(self, osm_id, tags, way_refs):
+        category = classify(tags)
+        if category is None:
+            return
+        self.relations[osm_id] = [tags, category, None]
+        for ref in way_refs:
+            self.way_parents.setdefault(ref, []).append(osm_id)
+
+    # Pass 2
+    def wants_way(self, osm_id, tags) -> bool:
+        return osm_id in self.way_parents or _has_spot_tags(tags)
+
+    def node(self, osm_id, lat, lon, tags):
+        category = classify(tags)
+        if category is not None:
+            self._emit('n', osm_id, tags, category, lat, lon)
+
+    def way(self, osm_id, tags, coords):
+        if not coords:
+            return
+        lats = [c[0] for c in coords]
+        lons = [c[1] for c in coords]
+        bbox = (min(lats), min(lons), max(lats), max(lons))
+
+        category = classify(tags)
+        if category is not None:
+            self._emit('w', osm_id, tags, category, *_center(bbox))
+        for parent in self.way_parents.get(osm_id, ()):
+            entry = self.relations[parent]
+            entry[2] = bbox if entry[2] is None else (
+                min(entry[2][0], bbox[0]), min(entry[2][1], bbox[1]),
+                max(entry[2][2], bbox[2]), max(entry[2][3], bbox[3]),
+            )
+
+    def finish(self):
+        for osm_id, (tags, category, bbox) in self.relations.items():
+            if bbox is not None:
+                self._emit('r', osm_id, tags, category, *_center(bbox))
+
+    def _emit(self, osm_type, osm_id, tags, category, lat, lon):
+        self.write(Spot(
+            osm_type=osm_type,
+            osm_id=osm_id,
+            name=tags['name'].strip()[:200],
+            category=category,
+            latitude=lat,
+            longitude=lon,
+            cell=geohash(lat, lon, CELL_PRECISION),
+            surface=tags.get('surface', '')[:100],
+            sport=tags.get('sport', '')[:100],
+            access=tags.get('access', '')[:100],
+        ))
+
+
+def _center(bbox) -> tuple:
+    south, west, north, east = bbox
+    return (south + north) / 2, (west + east) / 2
+
+
+# ── pyosmium reader ──────────────────────────────────────────────
+
+def _read_osmium(path, collector, index):
+    class Relations(osmium.SimpleHandler):
+        def relation(self, r):
+            if _has_spot_tags(r.tags):
+                collector.relation(
+                    r.id, dict(r.tags),
+                    [m.ref for m in r.members if m.type == 'w'],
+                )
+
+    class Elements(osmium.SimpleHandler):
+        def node(self, n):
+            if _has_spot_tags(n.tags):
+                collector.node(
+                    n.id, n.location.lat, n.location.lon, dict(n.tags),
+                )
+
+        def way(self, w):
+            if collector.wants_way(w.id, w.tags):
+                collector.way(w.id, dict(w.tags), [
+                    (nd.lat, nd.lon) for nd in w.nodes if nd.location.valid()
+                ])
+
+    Relations().apply_file(path)
+    Elements().apply_file(path, locations=True, idx=index)
+
+
+def _osmium_bounds(path):
+    """(south, west, north, east) from the file header, or None."""
+    reader = osmium.io.Reader(path, osmium.osm.osm_entity_bits.NOTHING)
+    try:
+        box = reader.header().box()
+    finally:
+        reader.close()
+    if not box.valid():
+        return None
+    return (box.bottom_left.lat, box.bottom_left.lon,
+            box.top_right.lat, box.top_right.lon)
+
+
+# ── XML reader (standard library) ────────────────────────────────
+
+def _open_xml(path):
+    if path.endswith('.bz2'):
+        return bz2.open(path, 'rb')
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    return open(path, 'rb')
+
+
+def _iter_elements(path, tag_names):
+    """Stream top-level OSM elements, freeing each after it is handled."""
+    with _open_xml(path) as f:
+        context = ET.iterparse(f, events=('start', 'end'))
+        _, root = next(context)
+        for event, elem in context:
+            if event != 'end' or elem.tag not in ('node', 'way', 'relation'):
+                continue
+            if elem.tag in tag_names:
+                yield elem
+            root.clear()
+
+
+def _xml_bounds(path):
+    """(south, west, north, east) from the <bounds> element, or None."""
+    with _open_xml(path) as f:
+        for _, elem in ET.iterparse(f, events=('start',)):
+            if elem.tag == 'bounds':
+                return tuple(float(elem.get(k)) for k in (
+                    'minlat', 'minlon', 'maxlat', 'maxlon',
+                ))
+            if elem.tag in ('node', 'way', 'relation'):
+                return None
+    return None
+
+
+def _parse_bounds(value) -> tuple:
+    try:
+        south, west, north, east = map(float, value.split(','))
+    except ValueError:
+        raise CommandError('--bounds takes south,west,north,east')
+    if not (-90 <= south < north <= 90 and -180 <= west < east <= 180):
+        raise CommandError('--bounds is not a valid box')
+    return south, west, north, east
+
+
+def _spot_bounds():
+    """(south, west, north, east) of the imported spots, or None."""
+    found = Spot.objects.aggregate(
+        Min('latitude'), Min('longitude'), Max('latitude'), Max('longitude'),
+    )
+    if found['latitude__min'] is None:
+        return None
+    return (found['latitude__min'], found['longitude__min'],
+            found['latitude__max'], found['longitude__max'])
+
+
+def _xml_tags(elem) -> dict:
+    return {t.get('k'): t.get('v') for t in elem.iter('tag')}
+
+
+def _read_xml(path, collector):
+    for elem in _iter_elements(path, ('relation',)):
+        tags = _xml_tags(elem)
+        if _has_spot_tags(tags):
+            collector.relation(int(elem.get('id')), tags, [
+                int(m.get('ref')) for m in elem.iter('member')
+                if m.get('type') == 'way'
+            ])
+
+    locations = {}
+    for elem in _iter_elements(path, ('node', 'way')):
+        osm_id = int(elem.get('id'))
+        if elem.tag == 'node':
+            lat, lon = float(elem.get('lat')), float(elem.get('lon'))
+            locations[osm_id] = (lat, lon)
+            tags = _xml_tags(elem)
+            if _has_spot_tags(tags):
+                collector.node(osm_id, lat, lon, tags)
+        else:
+            tags = _xml_tags(elem)
+            if collector.wants_way(osm_id, tags):
+                refs = (int(nd.get('ref')) for nd in elem.iter('nd'))
+                collector.way(osm_id, tags, [
+                    locations[ref] for ref in refs if ref in locations
+                ])
+
+
+class Command(BaseCommand):
+    help = 'Import explore spots from an OpenStreetMap extract.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'extract', help='OSM extract (.osm.pbf, .osm, .osm.bz2, .osm.gz)',
+        )
+        parser.add_argument(
+            '--index', default='flex_mem',
+            help='pyosmium node location index, e.g. '
+                 '"dense_file_array,/tmp/nodes.idx" for large extracts',
+        )
+        parser.add_argument(
+            '--bounds', metavar='S,W,N,E',
+            help='extent the extract covers (default: from the file)',
+        )
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        path = options['extract']
+        batch_size = options['batch_size']
+        if osmium is None and path.endswith('.pbf'):
+            raise CommandError(
+                'Reading .pbf extracts requires pyosmium (pip install osmium)',
+            )
+
+        bounds = options['bounds'] and _parse_bounds(options['bounds'])
+        if not bounds:
+            bounds = (_osmium_bounds(path) if osmium is not None
+                      else _xml_bounds(path))
+
+        batch = []
+        counts = {}
+
+        def write(spot):
+            batch.append(spot)
+            counts[spot.category] = counts.get(spot.category, 0) + 1
+            if len(batch) >= batch_size:
+                Spot.objects.bulk_create(batch)
+                batch.clear()
+
+        collector = _Collector(write)
+        with transaction.atomic():
+            Spot.objects.all().delete()
+            if osmium is not None:
+                _read_osmium(path, collector, options['index'])
+            else:
+                _read_xml(path, collector)
+            collector.finish()
+            if batch:
+                Spot.objects.bulk_create(batch)
+            bounds = bounds or _spot_bounds()
+            SpotExtract.objects.all().delete()
+            if bounds:
+                south, west, north, east = bounds
+                SpotExtract.objects.create(
+                    source=path[-255:],
+                    south=south, west=west, north=north, east=east,
+                )
+            transaction.on_commit(lambda: cache.delete(EXTENT_KEY))
+
+        summary = ', '.join(f'{n} {c}' for c, n in sorted(counts.items()))
+        extent = ', '.join(f'{v:.4f}' for v in bounds) if bounds else 'none'
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {sum(counts.values())} spots ({summary or "none"}); '
+            f'extent {extent}.'
+        ))
@@ -0,0 +1,464 @@
+"""
+Load-test the API end to end against a local stand-in for upstream.
+
+    python manage.py loadtest --concurrency 20 --duration 30
+    python manage.py loadtest --latency 0.3 --jitter 0.1 --error-rate 0.05 --cold
+
+A stand-in HTTP server (a thread in this process) answers for the
+Open-Meteo forecast, air-quality and geocoding APIs, Nominatim and
+Overpass. It serves synthetic payloads, or recorded ones from
+``--payloads DIR`` (forecast.json, air-quality.json, search.json,
+reverse.json, overpass.json; any subset). Each response is delayed by
+``--latency`` ± ``--jitter`` seconds, and ``--error-rate`` of them
+fail with a 503.
+
+The weather, scores and spots endpoints are requested the way the
+dashboard and explore pages call them, for ``--locations`` random
+points in ``--area``, from ``--concurrency`` concurrent clients. By
+default the project's ASGI application (middleware included) is driven
+in-process with the upstream URL settings pointed at the stand-in.
+With ``--target``, requests go to a running server instead; fix the
+stand-in's port with ``--stub-port`` and start the server with the
+environment printed at startup.
+
+Caches, circuit breakers and the rate limiter are the configured ones;
+``--cold`` clears the configured cache first, so never run this against
+production settings. The stand-in's host has no rate-limit budget.
+"""
+
+import asyncio
+import datetime as dt
+import itertools
+import json
+import math
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+import httpx
+from django.core.asgi import get_asgi_application
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+from weather.spots import SPOT_FILTERS, SPOT_QUERIES
+
+# Paths on the stand-in, by the setting that points at them.
+STUB_PATHS = {
+    'OPEN_METEO_FORECAST_URL': '/v1/forecast',
+    'OPEN_METEO_AIR_QUALITY_URL': '/v1/air-quality',
+    'OPEN_METEO_GEOCODING_URL': '/v1/search',
+    'NOMINATIM_REVERSE_URL': '/reverse',
+    'OVERPASS_URL': '/api/interpreter',
+}
+
+# Recorded payload file, by stand-in path.
+PAYLOAD_FILES = {
+    '/v1/forecast': 'forecast.json',
+    '/v1/air-quality': 'air-quality.json',
+    '/v1/search': 'search.json',
+    '/reverse': 'reverse.json',
+    '/api/interpreter': 'overpass.json',
+}
+
+# Request paths, as the dashboard (app.js) and explore page call them.
+ENDPOINTS = {
+    'weather': '/weather/api/weather/?lat={lat:.4f}&lon={lon:.4f}',
+    'scores': '/weather/api/scores/?lat={lat:.4f}&lon={lon:.4f}&weekly=1',
+    'spots': '/explore/api/spots/?lat={lat:.4f}&lon={lon:.4f}&radius=8000',
+}
+
+# Greater Madrid
+DEFAULT_AREA = '40.30,-3.85,40.55,-3.55'
+
+SPOTS_PER_CATEGORY = 8
+
+
+# ── Synthetic upstream payloads ──────────────────────────────────
+
+def _value(var: str, rng: random.Random, hour: int):
+    if 'temperature' in var:
+        return round(14 + 8 * math.sin((hour - 9) / 24 * 2 * math.pi)
+                     + rng.gauss(0, 1.5), 1)
+    if 'wind_speed' in var:
+        return round(abs(rng.gauss(12, 7)), 1)
+    if 'wind_direction' in var:
+        return rng.randrange(360)
+    if 'precipitation_probability' in var:
+        return rng.randrange(0, 101)
+    if 'humidity' in var:
+        return rng.randrange(25, 100)
+    if var == 'visibility':
+        return rng.randrange(1000, 40000)
+    if var == 'european_aqi':
+        return rng.randrange(10, 90)
+    if var == 'is_day':
+        return int(7 <= hour <= 20)
+    if var == 'weather_code':
+        return rng.choice((0, 1, 2, 3, 45, 61))
+    if var == 'surface_pressure':
+        return round(rng.gauss(1013, 6), 1)
+    if var == 'uv_index_max':
+        return round(rng.uniform(1, 9), 1)
+    return round(rng.uniform(0, 50), 1)
+
+
+def forecast_payload(query: dict) -> dict:
+    """An Open-Meteo style response (UTC clock) for a forecast or
+    air-quality query, with the variables and days it asks for."""
+    lat = float(query.get('latitude', 0))
+    lon = float(query.get('longitude', 0))
+    rng = random.Random(f'{lat:.2f},{lon:.2f}')
+    days = int(query.get('forecast_days', 7))
+    today = dt.datetime.now(dt.timezone.utc).replace(
+        hour=0, minute=0, second=0, microsecond=0, tzinfo=None,
+    )
+    now = dt.datetime.now(dt.timezone.utc).replace(tzinfo=None)
+    payload = {
+        'latitude': lat, 'longitude': lon,
+        'timezone': 'GMT', 'utc_offset_seconds': 0,
+    }
+    if query.get('current'):
+        payload['current'] = {
+            'time': now.replace(minute=now.minute // 15 * 15, second=0,
+                                microsecond=0).strftime('%Y-%m-%dT%H:%M'),
+            'interval': 900,
+            **{var: _value(var, rng, now.hour)
+               for var in query['current'].split(',')},
+        }
+    if query.get('hourly'):
+        hours = [today + dt.timedelta(hours=i) for i in range(days * 24)]
+        payload['hourly'] = {
+            'time': [h.strftime('%Y-%m-%dT%H:%M') for h in hours],
+            **{var: [_value(var, rng, h.hour) for h in hours]
+               for var in query['hourly'].split(',')},
+        }
+    if query.get('daily'):
+        dates = [today + dt.timedelta(days=d) for d in range(days)]
+        daily = {'time': [d.strftime('%Y-%m-%d') for d in dates]}
+        for var in query['daily'].split(','):
+            if var in ('sunrise', 'sunset'):
+                hour = 6 if var == 'sunrise' else 20
+                daily[var] = [
+                    (d + dt.timedelta(hours=hour)).strftime('%Y-%m-%dT%H:%M')
+                    for d in dates
+                ]
+            else:
+                daily[var] = [_value(var, rng, 14) for _ in dates]
+        payload['daily'] = daily
+    return payload
+
+
+_BBOX_RE = re.compile(r'\(([-\d.]+),([-\d.]+),([-\d.]+),([-\d.]+)\)')
+
+
+def overpass_payload(query: str) -> dict:
+    """Elements for each (tile, category) statement in an Overpass
+    query, spread over its bounding box and closed by a count."""
+    elements = []
+    for n, statement in enumerate(query.split('out count;')[:-1]):
+        box = _BBOX_RE.search(statement)
+        south, west, north, east = map(float, box.groups())
+        rng = random.Random(box.group(0))
+        for category, tests in SPOT_FILTERS.items():
+            if SPOT_QUERIES[category] not in statement:
+                continue
+            tags = {k: v for k, equals, v in tests if equals}
+            for i in range(SPOTS_PER_CATEGORY):
+                elements.append({
+                    'type': 'node',
+                    'id': rng.randrange(1, 10 ** 10),
+                    'lat': rng.uniform(south, north),
+                    'lon': rng.uniform(west, east),
+                    'tags': {**tags,
+                             'name': f'{category.title()} {n + 1}.{i + 1}'},
+                })
+        elements.append({'type': 'count', 'id': 0, 'tags': {
+            'total': str(SPOTS_PER_CATEGORY),
+        }})
+    return {'elements': elements}
+
+
+def geocoding_payload(query: dict) -> dict:
+    return {'results': [{
+        'name': query.get('name', 'Placeville').title(),
+        'country': 'Nowhere', 'admin1': '',
+        'latitude': 40.4168, 'longitude': -3.7038, 'timezone': 'GMT',
+    }]}
+
+
+def reverse_payload(query: dict) -> dict:
+    return {'address': {'city': 'Placeville', 'country': 'Nowhere'}}
+
+
+# ── Upstream stand-in ────────────────────────────────────────────
+
+class Stub:
+    """The stand-in server and its call counts."""
+
+    def __init__(self, port=0, latency=0.0, jitter=0.0, error_rate=0.0,
+                 payloads=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.recorded = {}
+        if payloads:
+            for path, name in PAYLOAD_FILES.items():
+                file = Path(payloads) / name
+                if file.exists():
+                    self.recorded[path] = file.read_bytes()
+        self.calls = Counter()
+        self.failed = Counter()
+        self.lock = threading.Lock()
+        self.rng = random.Random()
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive, like the real APIs
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                self._serve(b'')
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                self._serve(self.rfile.read(length))
+
+            def _serve(self, body):
+                status, content = stub.respond(self.path, body)
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, daemon=True,
+        )
+
+    @property
+    def base_url(self) -> str:
+        return 'http://127.0.0.1:%d' % self.server.server_address[1]
+
+    def urls(self) -> dict:
+        """Upstream URL settings that point at this stand-in."""
+        return {name: self.base_url + path for name, path in STUB_PATHS.items()}
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def respond(self, raw_path: str, body: bytes) -> tuple:
+        parts = urlsplit(raw_path)
+        path = parts.path
+        with self.lock:
+            self.calls[path] += 1
+            delay = max(0.0, self.rng.gauss(self.latency, self.jitter)
+                        if self.jitter else self.latency)
+            failing = self.rng.random() < self.error_rate
+            if failing:
+                self.failed[path] += 1
+        if delay:
+            time.sleep(delay)
+        if failing:
+            return 503, b'{"error": true, "reason": "injected"}'
+        if path in self.recorded:
+            return 200, self.recorded[path]
+
+        query = {k: v[0] for k, v in parse_qs(parts.query).items()}
+        if path in ('/v1/forecast', '/v1/air-quality'):
+            payload = forecast_payload(query)
+        elif path == '/api/interpreter':
+            form = parse_qs(body.decode())
+            payload = overpass_payload(form.get('data', [''])[0])
+        elif path == '/v1/search':
+            payload = geocoding_payload(query)
+        elif path == '/reverse':
+            payload = reverse_payload(query)
+        else:
+            return 404, b'{}'
+        return 200, json.dumps(payload).encode()
+
+
+# ── Load driver ──────────────────────────────────────────────────
+
+def _percentile(ordered: list, p: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return math.nan
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def _mix(value) -> dict:
+    weights = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        if name not in ENDPOINTS:
+            raise ValueError(name)
+        weights[name] = float(weight or 1)
+    return weights
+
+
+def _area(value) -> tuple:
+    south, west, north, east = map(float, value.split(','))
+    return south, west, north, east
+
+
+async def _drive(client, requests, concurrency, duration, limit) -> tuple:
+    """Issue ``requests`` from ``concurrency`` workers until ``duration``
+    seconds or ``limit`` requests; returns (results, elapsed)."""
+    results = []  # (endpoint, status, seconds)
+    counter = itertools.count()
+    started = time.perf_counter()
+    deadline = started + duration
+
+    async def worker():
+        while True:
+            i = next(counter)
+            if (limit and i >= limit) or time.perf_counter() >= deadline:
+                return
+            endpoint, path = requests(i)
+            t = time.perf_counter()
+            try:
+                response = await client.get(path)
+                status = response.status_code
+            except httpx.HTTPError as exc:
+                status = type(exc).__name__
+            results.append((endpoint, status, time.perf_counter() - t))
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return results, time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = 'Load-test the API against a local stand-in for upstream APIs.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=10)
+        parser.add_argument('--duration', type=float, default=10.0,
+                            help='Seconds to run (default 10)')
+        parser.add_argument('--requests', type=int, default=0,
+                            help='Stop after this many requests')
+        parser.add_argument(
+            '--mix', type=_mix, default='weather=4,scores=4,spots=2',
+            help='Endpoint weights, e.g. "weather=4,scores=4,spots=2"',
+        )
+        parser.add_argument('--locations', type=int, default=50,
+                            help='Distinct points requested')
+        parser.add_argument('--area', type=_area, default=DEFAULT_AREA,
+                            help='south,west,north,east to pick points in')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--latency', type=float, default=0.05,
+                            help='Upstream response delay (seconds)')
+        parser.add_argument('--jitter', type=float, default=0.0)
+        parser.add_argument('--error-rate', type=float, default=0.0,
+                            help='Share of upstream calls that fail (503)')
+        parser.add_argument('--payloads',
+                            help='Directory of recorded upstream payloads')
+        parser.add_argument('--stub-port', type=int, default=0)
+        parser.add_argument('--target',
+                            help='Base URL of a running server to drive')
+        parser.add_argument('--cold', action='store_true',
+                            help='Clear the configured cache first')
+
+    def handle(self, *args, **options):
+        if options['target'] and not options['stub_port']:
+            raise CommandError(
+                '--target needs --stub-port, so the server can be started '
+                'pointing at the stand-in',
+            )
+        stub = Stub(
+            port=options['stub_port'], latency=options['latency'],
+            jitter=options['jitter'], error_rate=options['error_rate'],
+            payloads=options['payloads'],
+        )
+        stub.start()
+        try:
+            if options['target']:
+                self.stdout.write('Start the server with:')
+                for name, url in stub.urls().items():
+                    self.stdout.write(f'    {name}={url}')
+            if options['cold']:
+                cache.clear()
+            with override_settings(**stub.urls()):
+                results, elapsed = asyncio.run(self._run(options))
+        finally:
+            stub.stop()
+        self._report(results, elapsed, stub, options)
+
+    async def _run(self, options):
+        rng = random.Random(options['seed'])
+        south, west, north, east = options['area']
+        points = [
+            (rng.uniform(south, north), rng.uniform(west, east))
+            for _ in range(options['locations'])
+        ]
+        names = list(options['mix'])
+        weights = [options['mix'][n] for n in names]
+
+        def requests(i):
+            endpoint = rng.choices(names, weights)[0]
+            lat, lon = rng.choice(points)
+            return endpoint, ENDPOINTS[endpoint].format(lat=lat, lon=lon)
+
+        if options['target']:
+            transport, base_url = None, options['target']
+        else:
+            transport = httpx.ASGITransport(app=get_asgi_application())
+            base_url = 'http://localhost'
+        async with httpx.AsyncClient(
+            transport=transport, base_url=base_url, timeout=60,
+            limits=httpx.Limits(max_connections=options['concurrency']),
+        ) as client:
+            return await _drive(
+                client, requests, options['concurrency'],
+                options['duration'], options['requests'],
+            )
+
+    def _report(self, results, elapsed, stub, options):
+        write = self.stdout.write
+        write(
+            f'{len(results)} requests in {elapsed:.1f}s '
+            f'({len(results) / elapsed:.1f} req/s) at concurrency '
+            f'{options["concurrency"]}\n'
+        )
+        write(f'{"endpoint":<10}{"count":>7}{"ok":>7}{"req/s":>8}'
+              f'{"p50":>9}{"p95":>9}{"p99":>9}{"max":>9}  (ms)')
+        groups = {}
+        for endpoint, status, seconds in results:
+            groups.setdefault(endpoint, []).append((status, seconds))
+        groups['all'] = [(status, seconds) for _, status, seconds in results]
+        for endpoint, rows in groups.items():
+            times = sorted(seconds * 1000 for _, seconds in rows)
+            ok = sum(1 for status, _ in rows if status == 200)
+            write(
+                f'{endpoint:<10}{len(rows):>7}{ok:>7}'
+                f'{len(rows) / elapsed:>8.1f}'
+                f'{_percentile(times, 50):>9.1f}{_percentile(times, 95):>9.1f}'
+                f'{_percentile(times, 99):>9.1f}'
+                f'{(times[-1] if times else math.nan):>9.1f}'
+            )
+
+        statuses = Counter(str(status) for _, status, _ in results)
+        write('\nResponses: ' + ', '.join(
+            f'{status} × {n}' for status, n in sorted(statuses.items())
+        ))
+        total = sum(stub.calls.values())
+        write(f'Upstream calls: {total} '
+              f'({total / max(len(results), 1):.2f} per request)')
+        for path, n in sorted(stub.calls.items()):
+            failed = stub.failed.get(path, 0)
+            write(f'    {path:<18}{n:>7}' + (f'  ({failed} failed)' if failed else ''))
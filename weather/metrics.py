@@ -0,0 +1,176 @@
+"""
+Metrics
+=======
+Request phase timings and aggregate metrics for the hot paths.
+
+``phase(name)`` times a block of a request. The timings of the current
+request (kept in a context variable by ServerTimingMiddleware, so they
+follow the request into sync_to_async threads and gathered tasks) go
+out in its ``Server-Timing`` header, along with the total time spent in
+ORM queries. Phases can also feed a histogram.
+
+Counters and histograms are prometheus_client metrics, served by the
+/metrics view. Under gunicorn every worker writes its samples to files
+in ``PROMETHEUS_MULTIPROC_DIR`` (prometheus_client's multiprocess mode,
+set up by gunicorn.conf.py) and a scrape of any worker sums them, so
+totals are the same whichever worker answers. Without that variable
+(runserver, a single uvicorn process) the process's own registry is
+served.
+"""
+
+import contextlib
+import contextvars
+import os
+import threading
+import time
+
+import prometheus_client
+from django.db.backends.signals import connection_created
+from prometheus_client import multiprocess
+
+# Prometheus' default latency buckets (seconds).
+DEFAULT_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = prometheus_client.CONTENT_TYPE_LATEST
+
+
+class Counter:
+    """A labelled counter: ``inc(amount, **labels)``."""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self._metric = prometheus_client.Counter(
+            name, documentation, labelnames,
+        )
+
+    def inc(self, amount: float = 1, **labels):
+        (self._metric.labels(**labels) if labels else self._metric).inc(amount)
+
+
+class Histogram:
+    """A labelled histogram: ``observe(value, **labels)``."""
+
+    def __init__(self, name, documentation, labelnames=(),
+                 buckets=DEFAULT_BUCKETS):
+        self._metric = prometheus_client.Histogram(
+            name, documentation, labelnames, buckets=buckets,
+        )
+
+    def observe(self, value: float, **labels):
+        (self._metric.labels(**labels) if labels else self._metric).observe(value)
+
+
+def render() -> bytes:
+    """
+    All metrics in the Prometheus text format: summed over every worker
+    in multiprocess mode, else this process's.
+    """
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    return prometheus_client.generate_latest(registry)
+
+
+REQUEST_SECONDS = Histogram(
+    'http_request_duration_seconds', 'Time to respond, by view.', ['view'],
+)
+UPSTREAM_SECONDS = Histogram(
+    'upstream_request_duration_seconds',
+    'Upstream API call latency, by host and outcome.', ['host', 'outcome'],
+)
+CACHE_LOOKUPS = Counter(
+    'cache_lookups_total',
+    'Shared-cache lookups on the hot paths, by cache and result '
+    '(hit, miss, stale).', ['cache', 'result'],
+)
+SCORING_SECONDS = Histogram(
+    'scoring_duration_seconds',
+    'Batch scoring time, by number of activities scored.', ['activities'],
+    buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25),
+)
+
+
+# ── Server-Timing ────────────────────────────────────────────────
+
+class Timings:
+    """Phase timings of one request (milliseconds)."""
+
+    __slots__ = ('phases', 'db_ms', 'db_queries', 'lock')
+
+    def __init__(self):
+        self.phases = []  # [(name, ms)], in completion order
+        self.db_ms = 0.0
+        self.db_queries = 0
+        self.lock = threading.Lock()
+
+    def add(self, name: str, ms: float):
+        with self.lock:
+            self.phases.append((name, ms))
+
+    def add_query(self, ms: float):
+        with self.lock:
+            self.db_ms += ms
+            self.db_queries += 1
+
+    def header(self, total_ms: float) -> str:
+        entries = [f'{name};dur={ms:.1f}' for name, ms in self.phases]
+        if self.db_queries:
+            entries.append(
+                f'db;dur={self.db_ms:.1f};desc="{self.db_queries} queries"',
+            )
+        entries.append(f'total;dur={total_ms:.1f}')
+        return ', '.join(entries)
+
+
+_timings = contextvars.ContextVar('request_timings', default=None)
+
+
+def start_request():
+    """Begin collecting timings; returns a token for end_request()."""
+    return _timings.set(Timings())
+
+
+def end_request(token) -> Timings:
+    timings = _timings.get()
+    _timings.reset(token)
+    return timings
+
+
+@contextlib.contextmanager
+def phase(name: str, histogram: Histogram = None, **labels):
+    """
+    Time the block as Server-Timing phase ``name`` (outside a request,
+    only the histogram, if any, is fed).
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        timings = _timings.get()
+        if timings is not None:
+            timings.add(name, elapsed * 1000)
+        if histogram is not None:
+            histogram.observe(elapsed, **labels)
+
+
+def _time_query(execute, sql, params, many, context):
+    timings = _timings.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.add_query((time.perf_counter() - started) * 1000)
+
+
+def _instrument_connection(sender, connection, **kwargs):
+    if _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_query)
+
+
+def install():
+    """Time ORM queries on every database connection (see WeatherConfig)."""
+    connection_created.connect(_instrument_connection)
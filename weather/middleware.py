@@ -0,0 +1,51 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from weather import metrics
+
+
+class ServerTimingMiddleware:
+    """
+    Collect phase timings for each request (see weather/metrics.py),
+    send them in a ``Server-Timing`` header and record the response
+    time per view.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        token = metrics.start_request()
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            timings = metrics.end_request(token)
+        return self._finish(request, response, timings, started)
+
+    async def __acall__(self, request):
+        token = metrics.start_request()
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            timings = metrics.end_request(token)
+        return self._finish(request, response, timings, started)
+
+    def _finish(self, request, response, timings, started):
+        elapsed = time.perf_counter() - started
+        response['Server-Timing'] = timings.header(elapsed * 1000)
+        match = getattr(request, 'resolver_match', None)
+        metrics.REQUEST_SECONDS.observe(
+            elapsed, view=match.view_name if match else 'unmatched',
+        )
+        return response
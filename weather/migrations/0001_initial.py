@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Place',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('geoname_id', models.IntegerField(unique=True)),
+                ('name', models.CharField(max_length=200)),
+                ('ascii_name', models.CharField(blank=True, default='', max_length=200)),
+                ('country_code', models.CharField(blank=True, default='', max_length=2)),
+                ('country', models.CharField(blank=True, default='', max_length=200)),
+                ('admin1', models.CharField(blank=True, default='', max_length=200)),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+                ('population', models.BigIntegerField(default=0)),
+                ('timezone', models.CharField(blank=True, default='UTC', max_length=63)),
+            ],
+            options={
+                'db_table': 'places',
+                'ordering': ['-population'],
+            },
+        ),
+    ]
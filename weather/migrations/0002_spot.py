@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weather', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Spot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('osm_type', models.CharField(choices=[('n', 'node'), ('w', 'way'), ('r', 'relation')], max_length=1)),
+                ('osm_id', models.BigIntegerField()),
+                ('name', models.CharField(max_length=200)),
+                ('category', models.CharField(max_length=20)),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+                ('cell', models.CharField(db_index=True, max_length=5)),
+                ('surface', models.CharField(blank=True, default='', max_length=100)),
+                ('sport', models.CharField(blank=True, default='', max_length=100)),
+                ('access', models.CharField(blank=True, default='', max_length=100)),
+            ],
+            options={
+                'db_table': 'spots',
+                'constraints': [models.UniqueConstraint(fields=('osm_type', 'osm_id'), name='spot_osm_element')],
+            },
+        ),
+    ]
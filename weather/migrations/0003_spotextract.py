@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weather', '0002_spot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SpotExtract',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=255)),
+                ('south', models.FloatField()),
+                ('west', models.FloatField()),
+                ('north', models.FloatField()),
+                ('east', models.FloatField()),
+                ('imported_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'spot_extracts',
+            },
+        ),
+    ]
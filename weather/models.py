@@ -1,3 +1,86 @@
 from django.db import models
 
-# Create your models here.
+
+class Place(models.Model):
+    """A populated place from the offline gazetteer (GeoNames dump).
+
+    Backs in-process city autocomplete; loaded with
+    ``manage.py import_gazetteer``.
+    """
+
+    geoname_id = models.IntegerField(unique=True)
+    name = models.CharField(max_length=200)
+    ascii_name = models.CharField(max_length=200, blank=True, default='')
+    country_code = models.CharField(max_length=2, blank=True, default='')
+    country = models.CharField(max_length=200, blank=True, default='')
+    admin1 = models.CharField(max_length=200, blank=True, default='')
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    population = models.BigIntegerField(default=0)
+    timezone = models.CharField(max_length=63, blank=True, default='UTC')
+
+    class Meta:
+        db_table = 'places'
+        ordering = ['-population']
+
+    def __str__(self):
+        return f'{self.name}, {self.country_code}'
+
+
+class Spot(models.Model):
+    """An outdoor POI imported from a local OpenStreetMap extract.
+
+    ``cell`` is the precision-5 geohash of the location; radius searches
+    look up the covering cells through its B-tree index. Loaded with
+    ``manage.py import_spots``.
+    """
+
+    OSM_TYPES = [('n', 'node'), ('w', 'way'), ('r', 'relation')]
+
+    osm_type = models.CharField(max_length=1, choices=OSM_TYPES)
+    osm_id = models.BigIntegerField()
+    name = models.CharField(max_length=200)
+    category = models.CharField(max_length=20)
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    cell = models.CharField(max_length=5, db_index=True)
+    surface = models.CharField(max_length=100, blank=True, default='')
+    sport = models.CharField(max_length=100, blank=True, default='')
+    access = models.CharField(max_length=100, blank=True, default='')
+
+    class Meta:
+        db_table = 'spots'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['osm_type', 'osm_id'], name='spot_osm_element',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.name} ({self.category})'
+
+
+class SpotExtract(models.Model):
+    """The OpenStreetMap extract the Spot table was last loaded from.
+
+    Spot searches whose bounding box lies inside ``south``/``west``/
+    ``north``/``east`` are answered from the table alone; elsewhere they
+    go to Overpass. Written by ``manage.py import_spots``.
+    """
+
+    source = models.CharField(max_length=255)
+    south = models.FloatField()
+    west = models.FloatField()
+    north = models.FloatField()
+    east = models.FloatField()
+    imported_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'spot_extracts'
+
+    def __str__(self):
+        return self.source
+
+    @property
+    def bounds(self) -> tuple:
+        return self.south, self.west, self.north, self.east
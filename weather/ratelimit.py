@@ -0,0 +1,167 @@
+"""
+Outbound Rate Limiting
+======================
+Cluster-wide token buckets for the public APIs we call, so all workers
+together stay inside each provider's usage policy (Nominatim: 1 req/s;
+Open-Meteo: 600/min; Overpass: a couple of slots per IP).
+
+Each upstream host with a budget in ``UPSTREAM_RATE_LIMITS`` has one
+bucket in Redis (the Celery broker), refilled and drawn from atomically
+by a Lua script. A caller that finds the bucket empty waits until the
+script says a token will be available, up to a deadline; past it the
+call fails with RateLimited (an httpx.TransportError, so the usual
+upstream error handling applies).
+
+Background work (see background()) must leave a reserve of tokens for
+interactive requests and may queue for longer. For a one-token bucket
+(Nominatim) the reserve is time instead: background calls go out only
+after the bucket has sat idle a while longer than interactive ones wait. If Redis is unreachable
+the limiter fails open rather than taking the site down with it.
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import logging
+import random
+import time
+import weakref
+
+import httpx
+import redis.asyncio as aioredis
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# How long a call may queue for a token before giving up (seconds).
+INTERACTIVE_DEADLINE = 5.0
+BACKGROUND_DEADLINE = 60.0
+
+# Share of a bucket that background calls leave for interactive ones,
+# and the least they leave (tokens) however small the bucket.
+BACKGROUND_RESERVE = 0.25
+MIN_BACKGROUND_RESERVE = 1.0
+
+# After Redis fails, calls go unlimited for this long before retrying it.
+REDIS_RETRY_AFTER = 30
+
+BUCKET_KEY = 'ratelimit:upstream:{}'
+
+# KEYS[1]: bucket. ARGV: refill rate (tokens/s), capacity, tokens that
+# must remain after taking one. Takes a token and returns "0", or
+# returns how many seconds until one may be taken (as a string; Lua
+# numbers are truncated to integers in replies).
+#
+# The reserve is checked against what the bucket would hold with no
+# cap, i.e. the refill since the last token was taken. A reserve larger
+# than the bucket (Nominatim's holds one token) then still works: it
+# becomes idle time that must pass beyond what an interactive call waits.
+# State is only written when a token is taken, so waiting callers do not
+# reset each other's refill.
+TAKE_TOKEN = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local reserve = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1])
+local ts = tonumber(state[2])
+if not tokens or not ts then
+    tokens, ts = capacity, now
+    redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(ts))
+    redis.call('EXPIRE', KEYS[1], math.ceil((capacity + reserve) / rate) + 1)
+end
+local uncapped = tokens + math.max(0, now - ts) * rate
+local needed = 1 + reserve
+if uncapped < needed then
+    return tostring((needed - uncapped) / rate)
+end
+tokens = math.min(capacity, uncapped) - 1
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil((capacity + reserve) / rate) + 1)
+return '0'
+"""
+
+_background = contextvars.ContextVar('upstream_background', default=False)
+
+_scripts = weakref.WeakKeyDictionary()  # event loop -> AsyncScript
+_redis_down_until = 0.0
+
+
+class RateLimited(httpx.TransportError):
+    """No token for this host became available before the deadline."""
+
+
+@contextlib.contextmanager
+def background():
+    """Mark upstream calls made in this block (and tasks it spawns) as
+    background work: lower priority, longer queueing."""
+    token = _background.set(True)
+    try:
+        yield
+    finally:
+        _background.reset(token)
+
+
+def _script():
+    """The token script on a Redis client bound to the running loop."""
+    loop = asyncio.get_running_loop()
+    script = _scripts.get(loop)
+    if script is None:
+        client = aioredis.from_url(
+            settings.CELERY_BROKER_URL,
+            socket_connect_timeout=0.5, socket_timeout=0.5,
+        )
+        script = _scripts[loop] = client.register_script(TAKE_TOKEN)
+    return script
+
+
+async def aclose():
+    """Close the running loop's Redis client, if it has one."""
+    script = _scripts.pop(asyncio.get_running_loop(), None)
+    if script is not None:
+        await script.registered_client.aclose()
+
+
+async def _take(host: str, rate: float, burst: int, reserve: float):
+    """Seconds to wait for a token (0: taken), or None if Redis failed."""
+    global _redis_down_until
+    if time.monotonic() < _redis_down_until:
+        return None
+    try:
+        wait = await _script()(
+            keys=[BUCKET_KEY.format(host)], args=[rate, burst, reserve],
+        )
+    except aioredis.RedisError as exc:
+        _redis_down_until = time.monotonic() + REDIS_RETRY_AFTER
+        logger.warning('Rate limiter unavailable, failing open: %r', exc)
+        return None
+    return float(wait)
+
+
+async def acquire(host: str):
+    """
+    Wait for a token for ``host``; raises RateLimited past the deadline.
+    Hosts without a budget are not limited.
+    """
+    budget = getattr(settings, 'UPSTREAM_RATE_LIMITS', {}).get(host)
+    if budget is None:
+        return
+    rate, burst = budget
+    if _background.get():
+        reserve = max(burst * BACKGROUND_RESERVE, MIN_BACKGROUND_RESERVE)
+        timeout = BACKGROUND_DEADLINE
+    else:
+        reserve, timeout = 0, INTERACTIVE_DEADLINE
+    deadline = time.monotonic() + timeout
+
+    while True:
+        wait = await _take(host, rate, burst, reserve)
+        if not wait:
+            return  # taken, or failing open
+        remaining = deadline - time.monotonic()
+        if wait > remaining:
+            raise RateLimited(f'No capacity for {host} within {timeout:.0f}s')
+        # Jitter spreads out waiters that were told the same time.
+        await asyncio.sleep(min(wait * random.uniform(1.0, 1.2), remaining))
@@ -0,0 +1,82 @@
+"""
+API Responses
+=============
+Encoded bodies, validators and freshness headers for the JSON APIs.
+
+Responses derived from a cached forecast carry a strong ETag built from
+the forecast's fetch time and grid cell (plus whatever else the body
+depends on), a Last-Modified of the fetch time, and a max-age that runs
+until the body would change. Conditional requests are answered with
+304 before anything is scored or serialized, and the encoded body
+itself is cached under its ETag, so a repeat from another client is
+served as stored bytes.
+"""
+
+import hashlib
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import (
+    get_conditional_response, patch_cache_control, patch_vary_headers,
+)
+from django.utils.http import http_date
+
+from weather.encoding import encode, negotiate
+
+
+def make_etag(*parts) -> str:
+    """Strong (quoted) ETag over ``parts``."""
+    return '"%s"' % hashlib.sha1(repr(parts).encode()).hexdigest()[:24]
+
+
+def set_validators(response, etag: str, last_modified: float, max_age: int,
+                   private: bool = False):
+    """Add ETag, Last-Modified and Cache-Control to ``response``."""
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    if private:
+        patch_cache_control(response, private=True, max_age=max_age)
+    else:
+        patch_cache_control(response, public=True, max_age=max_age)
+    return response
+
+
+def conditional(request, etag: str, last_modified: float, max_age: int,
+                private: bool = False):
+    """
+    A 304 (carrying the same validators and Vary as the full response)
+    if the client's copy is still current, else None.
+    """
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(last_modified),
+    )
+    if response is not None:
+        set_validators(response, etag, last_modified, max_age, private)
+        patch_vary_headers(response, ['Accept'])
+    return response
+
+
+def encoded_response(body: bytes, media_type: str, status: int = 200):
+    """Response for an already-encoded body (negotiated on Accept)."""
+    response = HttpResponse(body, content_type=media_type, status=status)
+    patch_vary_headers(response, ['Accept'])
+    return response
+
+
+def api_response(request, payload, status: int = 200):
+    """Encode ``payload`` in the media type the client asked for."""
+    media_type = negotiate(request)
+    return encoded_response(encode(payload, media_type), media_type, status)
+
+
+def _body_key(etag: str) -> str:
+    return 'api:body:' + etag.strip('"')
+
+
+async def get_body(etag: str):
+    """Encoded body stored under ``etag``, or None."""
+    return await cache.aget(_body_key(etag))
+
+
+async def set_body(etag: str, body: bytes, timeout: int):
+    await cache.aset(_body_key(etag), body, timeout)
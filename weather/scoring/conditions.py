@@ -0,0 +1,162 @@
+"""
+Hourly Conditions
+=================
+Columnar (struct-of-arrays) view of an hourly forecast: one contiguous
+float64 array per scoring input, NaN where upstream has no value. Built
+once per request straight from the Open-Meteo payloads and consumed
+directly by the batch scorer and the window finder.
+"""
+
+from bisect import bisect_left
+from collections.abc import Mapping
+
+import numpy as np
+
+# Scoring input -> Open-Meteo hourly variable
+HOURLY_SOURCES = {
+    'temp': 'temperature_2m',
+    'wind_speed': 'wind_speed_10m',
+    'rain_prob': 'precipitation_probability',
+    'humidity': 'relative_humidity_2m',
+    'visibility': 'visibility',
+}
+
+
+def _floats(values, start: int, count: int) -> np.ndarray:
+    """values[start:start + count] as float64, None/missing -> NaN."""
+    out = np.full(count, np.nan)
+    chunk = values[start:start + count]
+    if chunk:
+        out[:len(chunk)] = np.array(chunk, dtype=float)
+    return out
+
+
+def _aligned(times: list, hourly: dict, source: str) -> np.ndarray:
+    """``hourly[source]`` re-indexed onto ``times`` (both hourly, sorted)."""
+    out = np.full(len(times), np.nan)
+    other_times = hourly.get('time', ())
+    values = hourly.get(source, ())
+    if not times or not other_times:
+        return out
+    src = bisect_left(other_times, times[0])
+    if src >= len(other_times):
+        return out
+    dst = bisect_left(times, other_times[src])
+    n = min(len(times) - dst, len(values) - src)
+    if n > 0:
+        out[dst:dst + n] = np.array(values[src:src + n], dtype=float)
+    return out
+
+
+class HourlyConditions(Mapping):
+    """
+    Read-only mapping of condition key (see engine.CONDITION_DEFAULTS) to
+    a float array, plus the local ISO ``times`` of each row.
+    """
+
+    __slots__ = ('times', '_columns')
+
+    def __init__(self, times: list, columns: dict):
+        self.times = times
+        self._columns = columns
+        for col in columns.values():
+            col.flags.writeable = False
+
+    # Mapping protocol, so the engine can take us as ``conditions``.
+    def __getitem__(self, key):
+        return self._columns[key]
+
+    def __iter__(self):
+        return iter(self._columns)
+
+    def __len__(self):
+        return len(self._columns)
+
+    @property
+    def hours(self) -> int:
+        return len(self.times)
+
+    @classmethod
+    def from_forecast(cls, weather: dict, aqi_data: dict = None,
+                      start: int = 0, hours: int = None) -> 'HourlyConditions':
+        """
+        Build from a canonical forecast payload (and optional air-quality
+        payload), taking ``hours`` rows from hourly index ``start``.
+        Air quality and daily UV are aligned by local time, not index.
+        """
+        hourly = weather.get('hourly', {})
+        all_times = hourly.get('time', [])
+        stop = len(all_times) if hours is None else min(len(all_times), start + hours)
+        times = all_times[start:stop]
+        count = len(times)
+
+        columns = {
+            key: _floats(hourly.get(source, ()), start, count)
+            for key, source in HOURLY_SOURCES.items()
+        }
+
+        # UV is only published per day; every hour gets its day's max.
+        daily = weather.get('daily', {})
+        uv_by_day = dict(zip(daily.get('time', ()), daily.get('uv_index_max', ())))
+        columns['uv_index'] = np.array(
+            [uv_by_day.get(t[:10]) for t in times], dtype=float,
+        ).reshape(count)
+
+        columns['aqi'] = _aligned(
+            times, (aqi_data or {}).get('hourly', {}), 'european_aqi',
+        )
+
+        # Phase 3: golden hour from sunrise/sunset, swell from marine API
+        columns['minutes_to_golden'] = np.full(count, np.nan)
+        columns['swell_height'] = np.full(count, np.nan)
+        return cls(times, columns)
+
+    @classmethod
+    def current(cls, weather: dict, aqi_data: dict = None,
+                start: int = 0) -> 'HourlyConditions':
+        """
+        One-row conditions for "now": the ``current`` block where the
+        forecast has it, hourly index ``start`` (the current hour) and
+        today's UV for the rest.
+        """
+        cur = weather.get('current', {})
+        hourly = weather.get('hourly', {})
+        daily = weather.get('daily', {})
+
+        def at(block, source, i):
+            values = block.get(source, ())
+            return values[i] if i < len(values) else None
+
+        times = hourly.get('time', ())
+        time_str = times[start] if start < len(times) else cur.get('time', '')
+        uv_by_day = dict(zip(daily.get('time', ()), daily.get('uv_index_max', ())))
+        values = {
+            'temp': cur.get('temperature_2m'),
+            'wind_speed': cur.get('wind_speed_10m'),
+            'rain_prob': at(hourly, 'precipitation_probability', start),
+            'humidity': cur.get('relative_humidity_2m'),
+            'uv_index': uv_by_day.get(time_str[:10], at(daily, 'uv_index_max', 0)),
+            'visibility': at(hourly, 'visibility', start),
+            'aqi': (aqi_data or {}).get('current', {}).get('european_aqi'),
+            'minutes_to_golden': None,
+            'swell_height': None,
+        }
+        return cls([time_str], {
+            key: np.array([value], dtype=float)
+            for key, value in values.items()
+        })
+
+    def slice(self, start: int, stop: int = None) -> 'HourlyConditions':
+        """Rows [start:stop] (views, no copy)."""
+        return HourlyConditions(
+            self.times[start:stop],
+            {key: col[start:stop] for key, col in self._columns.items()},
+        )
+
+    def row(self, i: int) -> dict:
+        """Row ``i`` as a compute_score()-style dict (None for NaN)."""
+        out = {'time': self.times[i]}
+        for key, col in self._columns.items():
+            value = float(col[i])
+            out[key] = None if value != value else value
+        return out
@@ -4,10 +4,19 @@ Activity Scoring Engine
 Pure functions that rate weather conditions for outdoor activities.
 Each factor scorer returns 0.0–1.0, then we weight-sum them into a
 final 0–100 score.
+
+``compute_score`` scores one set of conditions for one activity. The
+batch API (``score_matrix`` / ``score_results``) scores an hours ×
+activities grid in one vectorized NumPy pass and yields exactly the same
+numbers.
 """
 
 import math
 
+import numpy as np
+
+from weather.metrics import SCORING_SECONDS, phase
+
 # ── Individual factor scorers ────────────────────────────────────
 
 def score_temperature(temp: float, ideal_min: float, ideal_max: float) -> float:
@@ -191,3 +200,258 @@ def compute_score(weather: dict, activity) -> dict:
         'label': score_label(final),
         'factors': breakdown,
     }
+
+
+# ── Batch (vectorized) scorer ────────────────────────────────────
+
+# Factor order matches compute_score(); the weighted sum is accumulated
+# in this order so batch results are bit-for-bit the scalar ones.
+FACTORS = (
+    'temp', 'wind', 'rain', 'humidity', 'uv',
+    'visibility', 'air_quality', 'golden_hour', 'swell',
+)
+
+WEIGHT_ATTRS = (
+    'temp_weight', 'wind_weight', 'rain_weight', 'humidity_weight',
+    'uv_weight', 'visibility_weight', 'air_quality_weight',
+    'golden_hour_weight', 'swell_weight',
+)
+
+# Condition keys and the default compute_score() uses when a key is
+# missing. NaN means "unknown" and gets the scorer's neutral fallback.
+CONDITION_DEFAULTS = {
+    'temp': 20.0,
+    'wind_speed': 0.0,
+    'rain_prob': 0.0,
+    'humidity': 50.0,
+    'uv_index': math.nan,
+    'visibility': math.nan,
+    'aqi': math.nan,
+    'minutes_to_golden': math.nan,
+    'swell_height': math.nan,
+}
+
+
+def conditions_from_dicts(rows: list) -> dict:
+    """Turn a list of compute_score()-style weather dicts into columns."""
+    columns = {}
+    for key, default in CONDITION_DEFAULTS.items():
+        values = [row.get(key, default) for row in rows]
+        columns[key] = np.array(
+            [math.nan if v is None else v for v in values], dtype=float,
+        )
+    return columns
+
+
+def _column(conditions: dict, key: str, hours: int) -> np.ndarray:
+    col = conditions.get(key)
+    if col is None:
+        return np.full(hours, CONDITION_DEFAULTS[key])
+    col = np.asarray(col, dtype=float)
+    default = CONDITION_DEFAULTS[key]
+    if not math.isnan(default):
+        col = np.where(np.isnan(col), default, col)
+    return col
+
+
+def _activity_params(activities) -> tuple:
+    """(weights (A, 9), temp_min, temp_max, max_wind, max_rain) arrays."""
+    compiled = getattr(activities, 'params', None)
+    if compiled is not None:
+        # activities.profiles.ProfileSet: arrays are pre-built
+        return compiled
+    weights = np.array(
+        [[getattr(a, attr) for attr in WEIGHT_ATTRS] for a in activities],
+        dtype=float,
+    ).reshape(len(activities), len(WEIGHT_ATTRS))
+    temp_min = np.array([a.ideal_temp_min for a in activities], dtype=float)
+    temp_max = np.array([a.ideal_temp_max for a in activities], dtype=float)
+    max_wind = np.array([a.max_wind_speed for a in activities], dtype=float)
+    max_rain = np.array(
+        [a.max_rain_probability for a in activities], dtype=float,
+    )
+    return weights, temp_min, temp_max, max_wind, max_rain
+
+
+def _batch_temperature(temp, ideal_min, ideal_max):
+    t = temp[:, None]
+    diff = np.where(t < ideal_min, ideal_min - t, t - ideal_max)
+    inside = (ideal_min <= t) & (t <= ideal_max)
+    return np.where(inside, 1.0, np.exp(-0.065 * diff * diff))
+
+
+def _batch_wind(speed, max_speed):
+    safe = np.where(max_speed > 0, max_speed, 1.0)
+    ratio = speed[:, None] / safe
+    return np.select(
+        [max_speed <= 0, ratio <= 0.4, ratio <= 1.0],
+        [1.0, 1.0, 1.0 - 0.5 * ((ratio - 0.4) / 0.6)],
+        np.maximum(0.0, 0.5 - 0.5 * (ratio - 1.0)),
+    )
+
+
+def _batch_rain(probability, max_prob):
+    p = probability[:, None]
+    safe = np.where(max_prob > 0, max_prob, 1.0)
+    ratio = p / safe
+    return np.select(
+        [p <= 0, max_prob <= 0, ratio <= 1.0],
+        [1.0, 0.0, 1.0 - 0.5 * ratio],
+        np.maximum(0.0, 0.5 - 0.5 * (ratio - 1.0)),
+    )
+
+
+def _batch_humidity(humidity):
+    diff = humidity - 45.0
+    return np.exp(-0.5 * (diff / 30.0) ** 2)
+
+
+def _batch_uv(uv):
+    return np.select(
+        [np.isnan(uv), uv <= 5, uv <= 8],
+        [0.7, 1.0, 1.0 - 0.15 * (uv - 5)],
+        np.maximum(0.0, 0.55 - 0.12 * (uv - 8)),
+    )
+
+
+def _batch_visibility(visibility_m):
+    km = visibility_m / 1000.0
+    return np.select(
+        [np.isnan(km), km >= 10, km >= 1],
+        [0.7, 1.0, 0.4 + 0.6 * (km / 10.0)],
+        np.maximum(0.0, 0.4 * km),
+    )
+
+
+def _batch_aqi(aqi):
+    return np.select(
+        [np.isnan(aqi), aqi <= 20, aqi <= 40, aqi <= 60, aqi <= 80],
+        [
+            0.7,
+            1.0,
+            0.85 + 0.15 * (1 - (aqi - 20) / 20),
+            0.55 + 0.30 * (1 - (aqi - 40) / 20),
+            0.25 + 0.30 * (1 - (aqi - 60) / 20),
+        ],
+        np.maximum(0.0, 0.25 * (1 - (aqi - 80) / 40)),
+    )
+
+
+def _batch_golden_hour(minutes):
+    return np.select(
+        [np.isnan(minutes), minutes <= 0, minutes <= 60],
+        [0.5, 1.0, 1.0 - (minutes / 60.0) * 0.7],
+        0.3,
+    )
+
+
+def _batch_swell(height):
+    return np.select(
+        [np.isnan(height), (1.0 <= height) & (height <= 2.5),
+         height < 1.0, height <= 4.0],
+        [0.5, 1.0, np.maximum(0.1, height / 1.0),
+         np.maximum(0.2, 1.0 - (height - 2.5) / 3.0)],
+        0.1,
+    )
+
+
+def factor_matrix(conditions: dict, activities) -> np.ndarray:
+    """
+    Score every factor for every hour × activity.
+
+    Parameters
+    ----------
+    conditions : dict of equal-length arrays keyed like CONDITION_DEFAULTS
+        (NaN = missing value).
+    activities : sequence of ActivityType-like objects, or a compiled
+        activities.profiles.ProfileSet
+
+    Returns
+    -------
+    float array of shape (9, hours, activities), factors in FACTORS order.
+    """
+    hours = len(next(iter(conditions.values()), ()))
+    _, temp_min, temp_max, max_wind, max_rain = _activity_params(activities)
+    col = lambda key: _column(conditions, key, hours)  # noqa: E731
+
+    shape = (hours, len(activities))
+    out = np.empty((len(FACTORS),) + shape)
+    out[0] = _batch_temperature(col('temp'), temp_min, temp_max)
+    out[1] = _batch_wind(col('wind_speed'), max_wind)
+    out[2] = _batch_rain(col('rain_prob'), max_rain)
+    out[3] = _batch_humidity(col('humidity'))[:, None]
+    out[4] = _batch_uv(col('uv_index'))[:, None]
+    out[5] = _batch_visibility(col('visibility'))[:, None]
+    out[6] = _batch_aqi(col('aqi'))[:, None]
+    out[7] = _batch_golden_hour(col('minutes_to_golden'))[:, None]
+    out[8] = _batch_swell(col('swell_height'))[:, None]
+    return out
+
+
+def _weighted_scores(factors: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """Raw (unrounded) 0–100 scores; NaN where an activity has no weight."""
+    weighted = np.zeros(factors.shape[1:])
+    total = np.zeros(weights.shape[0])
+    for i in range(len(FACTORS)):
+        weighted = weighted + factors[i] * weights[:, i]
+        total = total + weights[:, i]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scores = weighted / total * 100
+    scores[:, total == 0] = math.nan
+    return scores
+
+
+def _round_scores(raw: np.ndarray) -> np.ndarray:
+    # Python's round() (correctly rounded) rather than np.round(), so the
+    # results match compute_score() exactly.
+    flat = [50.0 if v != v else round(v, 1) for v in raw.ravel().tolist()]
+    return np.array(flat, dtype=float).reshape(raw.shape)
+
+
+def score_matrix(conditions: dict, activities) -> np.ndarray:
+    """
+    Scores for every hour × activity, shape (hours, activities), rounded
+    exactly like compute_score()['score'].
+    """
+    if not len(activities):
+        hours = len(next(iter(conditions.values()), ()))
+        return np.empty((hours, 0))
+    with phase('engine', SCORING_SECONDS, activities=len(activities)):
+        weights = _activity_params(activities)[0]
+        factors = factor_matrix(conditions, activities)
+        return _round_scores(_weighted_scores(factors, weights))
+
+
+def score_results(conditions: dict, activities, hour: int = 0) -> list:
+    """
+    compute_score()-identical result dicts for one hour of ``conditions``,
+    one per activity (in order).
+    """
+    if not len(activities):
+        return []
+    with phase('engine', SCORING_SECONDS, activities=len(activities)):
+        weights = _activity_params(activities)[0]
+        factors = factor_matrix(
+            {key: np.asarray(col, dtype=float)[hour:hour + 1]
+             for key, col in conditions.items()},
+            activities,
+        )
+        scores = _round_scores(_weighted_scores(factors, weights))[0].tolist()
+    factors = factors[:, 0, :].tolist()
+    weights = weights.tolist()
+
+    results = []
+    for a, final in enumerate(scores):
+        if sum(weights[a]) == 0:
+            results.append({'score': 50.0, 'label': 'Fair', 'factors': {}})
+            continue
+        breakdown = {}
+        for i, name in enumerate(FACTORS):
+            if weights[a][i] > 0:
+                breakdown[name] = round(factors[i][a] * 100, 1)
+        results.append({
+            'score': final,
+            'label': score_label(final),
+            'factors': breakdown,
+        })
+    return results
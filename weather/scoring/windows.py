@@ -1,18 +1,25 @@
 """
 Best-Windows Analyzer
 =====================
-Scans a 24-hour hourly forecast and finds the optimal time windows
-for a given activity.
+Scans an hourly forecast (24 hours up to the full 7-day horizon) and
+finds the optimal time windows for a given activity.
+
+``score_entries`` builds the per-activity results of the scores APIs
+(current score and factors plus the best window), shared by the views
+and ``manage.py bench_scoring``.
 """
 
-from .engine import compute_score
+import heapq
+
+from .conditions import HourlyConditions
+from .engine import conditions_from_dicts, score_matrix, score_results
 
 
 def find_best_windows(hourly_data: list, activity, threshold: int = 60) -> list:
     """
     Parameters
     ----------
-    hourly_data : list of dicts
+    hourly_data : HourlyConditions, or list of dicts
         Each dict has 'hour' (str like '07:00') plus weather keys
         expected by compute_score().
     activity : ActivityType instance
@@ -23,48 +30,139 @@ def find_best_windows(hourly_data: list, activity, threshold: int = 60) -> list:
     list of window dicts sorted by peak score (best first):
         [{'start': '07:00', 'end': '09:00', 'peak': 87, 'avg': 82}]
     """
+    if isinstance(hourly_data, HourlyConditions):
+        if not hourly_data.hours:
+            return []
+        scores = score_matrix(hourly_data, [activity])
+        return windows_from_scores(
+            hourly_data.times, scores[:, 0].tolist(), threshold,
+        )
+
     if not hourly_data:
         return []
 
-    scored = []
-    for h in hourly_data:
-        result = compute_score(h, activity)
-        scored.append({
-            'hour': h.get('hour', '??'),
-            'score': result['score'],
-        })
-
-    # Find contiguous blocks above threshold
-    windows = []
-    current = None
-
-    for entry in scored:
-        if entry['score'] >= threshold:
-            if current is None:
-                current = {
-                    'start': entry['hour'],
-                    'end': entry['hour'],
-                    'peak': entry['score'],
-                    'scores': [entry['score']],
-                }
-            else:
-                current['end'] = entry['hour']
-                current['peak'] = max(current['peak'], entry['score'])
-                current['scores'].append(entry['score'])
-        else:
-            if current is not None:
-                current['avg'] = round(
-                    sum(current['scores']) / len(current['scores']), 1
-                )
-                del current['scores']
-                windows.append(current)
-                current = None
-
-    if current is not None:
-        current['avg'] = round(
-            sum(current['scores']) / len(current['scores']), 1
+    scores = score_matrix(conditions_from_dicts(hourly_data), [activity])
+    hours = [h.get('hour', '??') for h in hourly_data]
+    return windows_from_scores(hours, scores[:, 0].tolist(), threshold)
+
+
+def windows_from_scores(hours: list, scores: list, threshold: int = 60) -> list:
+    """
+    Same as find_best_windows() but over already-computed hourly scores
+    (e.g. one column of engine.score_matrix()).
+    """
+    return find_windows(hours, scores, threshold, split_days=False)
+
+
+def find_windows(times: list, scores: list, threshold: int = 60,
+                 min_hours: int = 1, top_k: int = None,
+                 split_days: bool = True) -> list:
+    """
+    Single pass over hourly scores for contiguous blocks >= threshold.
+
+    Parameters
+    ----------
+    times : list of str
+        ISO local times ('2024-06-01T07:00') or bare hours ('07:00').
+    scores : list of float, one per entry in ``times``
+    threshold : minimum score for an hour to join a window
+    min_hours : drop windows shorter than this many hours
+    top_k : keep only the k best windows (None = all)
+    split_days : close a window at local midnight, so every window
+        belongs to a single day
+
+    Returns
+    -------
+    list of window dicts, best peak first (earlier window on ties):
+        [{'date': '2024-06-01', 'start': '07:00', 'end': '09:00',
+          'hours': 3, 'peak': 87, 'avg': 82}]
+    ``date`` is None when ``times`` carry no date.
+    """
+    if top_k is not None and top_k <= 0:
+        return []
+
+    heap = []  # (peak, -start_index, window); min-heap of the best k
+    start = None
+    peak = total = 0.0
+    prev_day = None
+
+    def close(end):
+        length = end - start
+        if length < min_hours:
+            return
+        first, last = times[start], times[end - 1]
+        window = {
+            'date': first[:10] if 'T' in first else None,
+            'start': first[11:16] if 'T' in first else first,
+            'end': last[11:16] if 'T' in last else last,
+            'hours': length,
+            'peak': peak,
+            'avg': round(total / length, 1),
+        }
+        item = (peak, -start, window)
+        if top_k is None or len(heap) < top_k:
+            heapq.heappush(heap, item)
+        elif item[:2] > heap[0][:2]:
+            heapq.heapreplace(heap, item)
+
+    for i, (time_str, score) in enumerate(zip(times, scores)):
+        day = time_str[:10] if split_days and 'T' in time_str else None
+        if start is not None and (score < threshold or day != prev_day):
+            close(i)
+            start = None
+        if score >= threshold:
+            if start is None:
+                start, peak, total = i, score, 0.0
+            peak = max(peak, score)
+            total += score
+        prev_day = day
+
+    if start is not None:
+        close(min(len(times), len(scores)))
+
+    ranked = sorted(heap, key=lambda item: item[:2], reverse=True)
+    return [window for _, _, window in ranked]
+
+
+def score_entries(current_wx, hourly_wx, activities, min_hours=1, top_k=0,
+                  split_days=False) -> list:
+    """
+    Score result per activity (in ``activities`` order): current score
+    and factors plus the best window over ``hourly_wx``.
+    """
+    # Score every activity for now + each hour of the horizon in two
+    # vectorized passes instead of one scalar call per hour per activity.
+    current = score_results(current_wx, activities)
+    hourly_scores = score_matrix(hourly_wx, activities)
+
+    results = []
+
+    for j, act in enumerate(activities):
+        result = current[j]
+        # Multi-day horizons are split at local midnight so each window
+        # belongs to one day; the 24h view may run past midnight.
+        windows = find_windows(
+            hourly_wx.times, hourly_scores[:, j].tolist(), threshold=60,
+            min_hours=min_hours, top_k=max(top_k, 1),
+            split_days=split_days,
         )
-        del current['scores']
-        windows.append(current)
+        best = windows[0] if windows else None
 
-    return sorted(windows, key=lambda w: w['peak'], reverse=True)
+        entry = {
+            'name': act.name,
+            'slug': act.slug,
+            'icon': act.icon_name,
+            'score': result['score'],
+            'label': result['label'],
+            'factors': result['factors'],
+            'best_window': {
+                'date': best['date'],
+                'start': best['start'],
+                'end': best['end'],
+                'peak': best['peak'],
+            } if best else None,
+        }
+        if top_k:
+            entry['windows'] = windows
+        results.append(entry)
+    return results
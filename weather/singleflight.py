@@ -0,0 +1,107 @@
+"""
+Single-flight
+=============
+Coalesce identical upstream fetches so one cache miss means one fetch.
+
+Within a process, concurrent callers for the same key share one
+in-flight call through a table of ``concurrent.futures.Future``s, which
+callers on any event loop (ASGI, ``async_to_sync`` threads, Celery) can
+await via ``asyncio.wrap_future``.
+
+Across workers, the fetching process holds a short-lived lock in the
+shared cache (``cache.add``); the others poll the cache for the value
+it writes instead of calling upstream themselves. If the holder fails
+or the lock expires, a waiter takes over.
+"""
+
+import asyncio
+import concurrent.futures
+import threading
+import time
+import uuid
+
+from django.core.cache import cache
+
+# Upper bound (seconds) on one fetch; the shared lock expires after it.
+LOCK_TIMEOUT = 15
+
+# Waiters re-check the shared cache this often, backing off to the max.
+POLL_INTERVAL = 0.05
+MAX_POLL_INTERVAL = 0.5
+
+_inflight = {}  # key -> concurrent.futures.Future
+_inflight_lock = threading.Lock()
+
+
+async def coalesce(key: str, call):
+    """
+    Await ``call()`` once per ``key`` among concurrent callers in this
+    process; the others get its result (or exception).
+    """
+    while True:
+        with _inflight_lock:
+            future = _inflight.get(key)
+            leader = future is None
+            if leader:
+                future = _inflight[key] = concurrent.futures.Future()
+
+        if leader:
+            break
+        try:
+            # Shielded: a cancelled waiter must not cancel the shared call.
+            return await asyncio.shield(asyncio.wrap_future(future))
+        except asyncio.CancelledError:
+            if not future.cancelled():
+                raise
+            # The leader itself was cancelled: take over.
+
+    try:
+        result = await call()
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except BaseException as exc:
+        future.set_exception(exc)
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        with _inflight_lock:
+            del _inflight[key]
+
+
+async def across_workers(key: str, fill, peek, timeout: int = LOCK_TIMEOUT):
+    """
+    Run ``fill()`` only if no other worker is already filling ``key``.
+
+    While another worker holds the lock, poll ``peek()`` (which returns
+    the stored value or None) and return what it finds. Take over if
+    the lock is released without a value or the wait exceeds
+    ``timeout``.
+    """
+    lock_key = f'singleflight:{key}'
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + timeout
+
+    while True:
+        if await cache.aadd(lock_key, token, timeout):
+            try:
+                return await fill()
+            finally:
+                # Best effort: don't release a lock that expired and was
+                # taken over by someone else.
+                if await cache.aget(lock_key) == token:
+                    await cache.adelete(lock_key)
+
+        interval = POLL_INTERVAL
+        while True:
+            if time.monotonic() >= deadline:
+                return await fill()
+            await asyncio.sleep(interval)
+            interval = min(interval * 2, MAX_POLL_INTERVAL)
+            value = await peek()
+            if value is not None:
+                return value
+            if not await cache.ahas_key(lock_key):
+                break  # holder gave up without a value: try to take over
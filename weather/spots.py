@@ -0,0 +1,319 @@
+"""
+Explore Spots
+=============
+Outdoor POIs from OpenStreetMap, cached per slippy-map tile and category.
+
+Overpass is queried for whole fixed tiles (one request covering every
+tile and category a search is missing, with the output capped per
+pair), never around the exact user coordinate, so nearby users share
+cache entries. A radius search reads the covering tiles and filters
+them by distance locally. OSM POIs change on the scale of weeks, so
+tiles are kept for a week.
+
+Once an OSM extract has been loaded into the Spot table (``manage.py
+import_spots``), searches inside its extent read the table by geohash
+cell, even when they find nothing, and only searches reaching outside
+it go to Overpass.
+"""
+
+import re
+
+import httpx
+from django.conf import settings
+from django.core.cache import cache
+
+from weather import upstream
+from weather.geo import (
+    bounding_box, geohashes_covering, haversine_km, tile_bounds,
+    tiles_covering,
+)
+
+# ~10 km tiles (~7.5 km wide at 45°): a 15 km radius needs about 5×5.
+TILE_ZOOM = 12
+TILE_TTL = 7 * 24 * 3600
+
+MAX_SPOTS = 50
+
+# Overpass elements returned per tile and category, and the server-side
+# query timeout (seconds); keeps each request light on the shared public
+# instance.
+OVERPASS_TILE_LIMIT = 60
+OVERPASS_TIMEOUT = 10
+
+# Geohash precision of Spot.cell (~4.9 km cells).
+CELL_PRECISION = 5
+
+# The imported extract's bounds (see local_extent()); import_spots
+# deletes the key, the timeout bounds staleness if that fails.
+EXTENT_KEY = 'spots:extent'
+EXTENT_TTL = 3600
+
+# Category → Overpass tags mapping
+SPOT_QUERIES = {
+    'park':   '["leisure"="park"]',
+    'trail':  '["route"="hiking"]',
+    'beach':  '["natural"="beach"]',
+    'sports': '["leisure"="sports_centre"]',
+    'pitch':  '["leisure"="pitch"]',
+    'swimming': '["leisure"="swimming_pool"]["access"!="private"]',
+    'viewpoint': '["tourism"="viewpoint"]',
+    'garden': '["leisure"="garden"]',
+    'playground': '["leisure"="playground"]',
+    'nature': '["leisure"="nature_reserve"]',
+}
+
+# Map spot categories to activity slugs for scoring
+CATEGORY_ACTIVITIES = {
+    'park':       ['running', 'hiking', 'yoga'],
+    'trail':      ['hiking', 'trail-running', 'mountain-biking'],
+    'beach':      ['swimming', 'surfing', 'kayaking'],
+    'sports':     ['running', 'cycling', 'yoga'],
+    'pitch':      ['running'],
+    'swimming':   ['swimming'],
+    'viewpoint':  ['hiking', 'photography'],
+    'garden':     ['yoga', 'walking'],
+    'playground': ['walking'],
+    'nature':     ['hiking', 'photography', 'bird-watching'],
+}
+
+# SPOT_QUERIES as (key, equals, value) tests, for matching raw OSM tags
+_FILTER_RE = re.compile(r'\["([^"]+)"(!?=)"([^"]*)"\]')
+SPOT_FILTERS = {
+    category: [(k, op == '=', v) for k, op, v in _FILTER_RE.findall(query)]
+    for category, query in SPOT_QUERIES.items()
+}
+SPOT_KEYS = frozenset(
+    k for tests in SPOT_FILTERS.values() for k, equals, _ in tests if equals
+)
+
+CATEGORY_ICONS = {
+    'park': 'trees', 'trail': 'mountain', 'beach': 'umbrella',
+    'sports': 'dumbbell', 'pitch': 'goal', 'swimming': 'waves',
+    'viewpoint': 'binoculars', 'garden': 'flower-2',
+    'playground': 'baby', 'nature': 'leaf',
+}
+
+
+class OverpassError(Exception):
+    """Overpass could not be reached or returned an error."""
+
+
+def categorize(tags: dict) -> str:
+    """Spot category from OSM tags."""
+    if tags.get('natural') == 'beach':
+        return 'beach'
+    if tags.get('route') == 'hiking':
+        return 'trail'
+    leisure = tags.get('leisure')
+    if leisure == 'sports_centre':
+        return 'sports'
+    if leisure == 'pitch':
+        return 'pitch'
+    if leisure == 'swimming_pool':
+        return 'swimming'
+    if tags.get('tourism') == 'viewpoint':
+        return 'viewpoint'
+    if leisure == 'garden':
+        return 'garden'
+    if leisure == 'playground':
+        return 'playground'
+    if leisure == 'nature_reserve':
+        return 'nature'
+    return 'park'
+
+
+def classify(tags: dict):
+    """
+    Category of a named OSM element matching any SPOT_QUERIES filter
+    (as Overpass would select it), else None.
+    """
+    if not tags.get('name', '').strip():
+        return None
+    for tests in SPOT_FILTERS.values():
+        if all((tags.get(k) == v) == equals for k, equals, v in tests):
+            return categorize(tags)
+    return None
+
+
+def to_spot(record: tuple, category: str) -> dict:
+    """API representation of a cached (name, lat, lon, surface, sport, access)."""
+    name, lat, lon, surface, sport, access = record
+    return {
+        'name': name,
+        'lat': lat,
+        'lon': lon,
+        'category': category,
+        'icon': CATEGORY_ICONS.get(category, 'map-pin'),
+        'activities': CATEGORY_ACTIVITIES.get(category, []),
+        'tags': {'surface': surface, 'sport': sport, 'access': access},
+    }
+
+
+def _tile_key(tile: tuple, category: str) -> str:
+    x, y = tile
+    return f'spots:{TILE_ZOOM}:{x}:{y}:{category}'
+
+
+def _record(el: dict, category: str):
+    """
+    Cached (name, lat, lon, surface, sport, access) for an Overpass
+    element selected for ``category``, or None if it is unnamed, has no
+    position or belongs to another category (see categorize()).
+    """
+    tags = el.get('tags', {})
+    name = tags.get('name', '').strip()
+    if not name or categorize(tags) != category:
+        return None
+    spot_lat = el.get('lat') or el.get('center', {}).get('lat')
+    spot_lon = el.get('lon') or el.get('center', {}).get('lon')
+    if not spot_lat or not spot_lon:
+        return None
+    return (
+        name, spot_lat, spot_lon,
+        tags.get('surface', ''), tags.get('sport', ''),
+        tags.get('access', ''),
+    )
+
+
+async def _fetch_tiles(pairs: list) -> dict:
+    """
+    One Overpass request for the (tile, category) ``pairs``, each with
+    its own output capped at OVERPASS_TILE_LIMIT elements; returns
+    {(tile, category): [record, ...]} for every requested pair.
+    """
+    statements = []
+    for (x, y), category in pairs:
+        area = ','.join(f'{v:.6f}' for v in tile_bounds(x, y, TILE_ZOOM))
+        # The count element closes this pair's output in the response.
+        statements.append(
+            f'nwr{SPOT_QUERIES[category]}({area});'
+            f'out center tags {OVERPASS_TILE_LIMIT};out count;'
+        )
+    query = f'[out:json][timeout:{OVERPASS_TIMEOUT}];' + ''.join(statements)
+
+    try:
+        resp = await upstream.post(
+            settings.OVERPASS_URL,
+            data={'data': query},
+            timeout=httpx.Timeout(OVERPASS_TIMEOUT + 2, connect=3.05),
+        )
+    except httpx.HTTPError as exc:
+        raise OverpassError(str(exc)) from exc
+    if resp.status_code != 200:
+        raise OverpassError(f'Overpass returned {resp.status_code}')
+
+    payload = resp.json()
+    if payload.get('remark'):
+        # Timeouts and memory aborts come back as a 200 with whatever
+        # output was produced so far.
+        raise OverpassError(f'Overpass: {payload["remark"]}')
+
+    found = {pair: [] for pair in pairs}
+    pending = iter(pairs)
+    pair = next(pending, None)
+    for el in payload.get('elements', []):
+        if pair is None:
+            break
+        if el.get('type') == 'count':
+            pair = next(pending, None)
+            continue
+        record = _record(el, pair[1])
+        if record is not None:
+            found[pair].append(record)
+    if pair is not None:
+        raise OverpassError('Overpass response ended early')
+    return found
+
+
+def _rank(lat: float, lon: float, radius_km: float, candidates) -> list:
+    """
+    Spots from (record, category) pairs within ``radius_km``, nearest
+    first, deduplicated by name and capped at MAX_SPOTS.
+    """
+    nearest = {}  # name -> (distance, record, category)
+    for record, category in candidates:
+        d = haversine_km(lat, lon, record[1], record[2])
+        if d > radius_km:
+            continue
+        best = nearest.get(record[0])
+        if best is None or d < best[0]:
+            nearest[record[0]] = (d, record, category)
+
+    ranked = sorted(nearest.values(), key=lambda item: item[0])[:MAX_SPOTS]
+    return [to_spot(record, category) for _, record, category in ranked]
+
+
+async def local_extent():
+    """(south, west, north, east) of the imported extract, or None."""
+    from weather.models import SpotExtract
+
+    extent = await cache.aget(EXTENT_KEY)
+    if extent is None:
+        latest = await SpotExtract.objects.order_by('-imported_at').afirst()
+        extent = latest.bounds if latest is not None else ()
+        await cache.aset(EXTENT_KEY, extent, EXTENT_TTL)
+    return extent or None
+
+
+def _covers(extent, box) -> bool:
+    south, west, north, east = box
+    return (
+        extent[0] <= south and north <= extent[2]
+        and extent[1] <= west and east <= extent[3]
+    )
+
+
+async def search_local(lat: float, lon: float, radius_m: int,
+                       categories: list) -> list:
+    """Radius search over the imported Spot table."""
+    from weather.models import Spot
+
+    radius_km = radius_m / 1000.0
+    cells = geohashes_covering(
+        *bounding_box(lat, lon, radius_km), CELL_PRECISION,
+    )
+    rows = Spot.objects.filter(
+        cell__in=cells, category__in=categories,
+    ).values_list(
+        'name', 'latitude', 'longitude', 'surface', 'sport', 'access',
+        'category',
+    )
+    candidates = [(row[:6], row[6]) async for row in rows]
+    return _rank(lat, lon, radius_km, candidates)
+
+
+async def search(lat: float, lon: float, radius_m: int,
+                 categories: list = None) -> list:
+    """
+    Spots within ``radius_m`` of (lat, lon), nearest first, deduplicated
+    by name and capped at MAX_SPOTS. Searches inside the imported
+    extract's extent read the Spot table; elsewhere, raises
+    OverpassError if missing tiles cannot be fetched.
+    """
+    categories = [c for c in (categories or SPOT_QUERIES) if c in SPOT_QUERIES]
+    radius_km = radius_m / 1000.0
+    box = bounding_box(lat, lon, radius_km)
+
+    extent = await local_extent()
+    if extent is not None and _covers(extent, box):
+        return await search_local(lat, lon, radius_m, categories)
+
+    tiles = tiles_covering(*box, TILE_ZOOM)
+
+    keys = {_tile_key(t, c): (t, c) for t in tiles for c in categories}
+    cached = await cache.aget_many(list(keys))
+
+    missing = sorted(pair for key, pair in keys.items() if key not in cached)
+    if missing:
+        fetched = await _fetch_tiles(missing)
+        fresh = {
+            _tile_key(t, c): records for (t, c), records in fetched.items()
+        }
+        await cache.aset_many(fresh, TILE_TTL)
+        cached.update(fresh)
+
+    return _rank(lat, lon, radius_km, (
+        (record, category)
+        for key, (tile, category) in keys.items()
+        for record in cached.get(key, ())
+    ))
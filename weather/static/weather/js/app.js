@@ -631,6 +631,44 @@ function getCsrf() {
   return cookie ? cookie.split('=')[1] : '';
 }
 
+/* Best activity score per saved location, fetched for all chips in one
+   bulk request (missing ones only) */
+const savedScores = new Map();
+const savedKey = loc => `${loc.latitude},${loc.longitude}`;
+
+let savedScoresPending = null;
+
+async function fetchSavedScores(missing) {
+  const res = await fetch('/weather/api/scores/bulk/', {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json', 'X-CSRFToken': getCsrf() },
+    body: JSON.stringify({
+      locations: missing.map(loc => ({ lat: loc.latitude, lon: loc.longitude })),
+    }),
+  });
+  if (!res.ok) return false;
+  const data = await res.json();
+  data.results.forEach((r, i) => {
+    savedScores.set(savedKey(missing[i]), r.scores && r.scores.length ? r.scores[0] : null);
+  });
+  return true;
+}
+
+/* One bulk request at a time: re-renders while it is in flight reuse it,
+   and the re-render once it lands asks for locations saved meanwhile */
+function loadSavedScores() {
+  if (savedScoresPending) return savedScoresPending;
+  const missing = savedLocations.filter(loc => !savedScores.has(savedKey(loc)));
+  if (!missing.length) return Promise.resolve();
+  savedScoresPending = fetchSavedScores(missing)
+    .catch(() => false)
+    .then(ok => {
+      savedScoresPending = null;
+      if (ok) updateSavedBar();
+    });
+  return savedScoresPending;
+}
+
 function updateSavedBar() {
   const bar = $('savedBar');
   if (!bar || !isAuthed) return;
@@ -653,10 +691,13 @@ function updateSavedBar() {
   // Saved location chips
   savedLocations.forEach(loc => {
     const isActive = loc.name.startsWith(currentLocation.city);
+    const best = savedScores.get(savedKey(loc));
     html += `<button class="saved-chip${isActive ? ' active' : ''}"
       data-lat="${loc.latitude}" data-lon="${loc.longitude}" data-name="${esc(loc.name)}">
       <i data-lucide="map-pin"></i>
       <span>${esc(loc.name.split(',')[0])}</span>
+      ${best ? `<span class="saved-score" style="color:${scoreColor(best.score)}"
+        title="${esc(best.name)}">${Math.round(best.score)}</span>` : ''}
       <span class="saved-remove" data-remove="${esc(loc.name)}">&times;</span>
     </button>`;
   });
@@ -665,6 +706,7 @@ function updateSavedBar() {
   if (!html) { bar.style.display = 'none'; return; }
   bar.style.display = '';
   renderIcons();
+  loadSavedScores();
 
   // Save click
   const saveBtn = document.getElementById('btnSaveLocation');
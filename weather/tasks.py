@@ -0,0 +1,105 @@
+"""
+Background tasks for the weather app.
+
+Scheduled by Celery beat (see CELERY_BEAT_SCHEDULE in settings):
+    celery -A weatherapp worker -l info
+    celery -A weatherapp beat -l info
+"""
+
+import asyncio
+import datetime as dt
+import logging
+
+from celery import shared_task
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+from accounts.models import SavedLocation
+from weather import forecast, ratelimit, upstream
+
+logger = logging.getLogger(__name__)
+
+# Cells refreshed in parallel; keeps the warm-up from bursting upstream.
+PREWARM_CONCURRENCY = 8
+
+# Only locations of users who logged in this recently are pre-warmed.
+PREWARM_ACTIVE_DAYS = 14
+
+# Local hours (approximated from longitude) at which a cell is pre-warmed:
+# the hourly runs before the morning check, not all 24 of them.
+PREWARM_LOCAL_HOURS = range(4, 9)
+
+
+def _solar_hour(lon: float, now: dt.datetime) -> int:
+    """Local hour at ``lon``, from its offset from UTC in mean solar time."""
+    return (now.hour + round(lon / 15)) % 24
+
+
+def _user_cells(now: dt.datetime = None) -> set:
+    """
+    Distinct forecast grid cells behind the home and saved locations of
+    recently active users, where it is shortly before morning.
+    """
+    now = now or timezone.now()
+    since = now - dt.timedelta(days=PREWARM_ACTIVE_DAYS)
+    User = get_user_model()
+    points = list(
+        User.objects.filter(
+            last_login__gte=since,
+            home_latitude__isnull=False, home_longitude__isnull=False,
+        ).values_list('home_latitude', 'home_longitude')
+    )
+    points += list(
+        SavedLocation.objects.filter(user__last_login__gte=since)
+        .values_list('latitude', 'longitude')
+    )
+    return {
+        forecast.snap_to_grid(lat, lon) for lat, lon in points
+        if _solar_hour(lon, now) in PREWARM_LOCAL_HOURS
+    }
+
+
+async def _refresh_cells(cells) -> int:
+    semaphore = asyncio.Semaphore(PREWARM_CONCURRENCY)
+
+    async def refresh(lat, lon):
+        async with semaphore:
+            try:
+                weather, aqi_data = await forecast.get_forecast_and_air_quality(
+                    lat, lon, refresh=True,
+                )
+            except Exception:
+                logger.warning('Pre-warm failed for %s,%s', lat, lon, exc_info=True)
+                return False
+            return bool(weather)
+
+    # Background priority: leaves upstream budget for user requests.
+    with ratelimit.background():
+        results = await asyncio.gather(
+            *(refresh(lat, lon) for lat, lon in cells),
+        )
+    return sum(results)
+
+
+@shared_task
+def prewarm_forecasts():
+    """
+    Refresh the cached forecast and air quality (the inputs to activity
+    scores) for the grid cells active users have a home or saved
+    location in, in the hours before their morning, so the morning's
+    first request is a cache hit.
+    """
+    cells = _user_cells()
+    refreshed = upstream.run_sync(_refresh_cells, cells)
+    logger.info('Pre-warmed %d/%d forecast cells', refreshed, len(cells))
+    return {'cells': len(cells), 'refreshed': refreshed}
+
+
+@shared_task(ignore_result=True)
+def refresh_cell(lat, lon):
+    """
+    Refetch one cell whose forecast is being served stale because
+    upstream failed; enqueued by forecast.revalidate_later().
+    """
+    if not upstream.run_sync(_refresh_cells, [(lat, lon)]):
+        logger.info('Upstream still failing for %s,%s', lat, lon)
@@ -1,3 +1,1138 @@
-from django.test import TestCase
+import asyncio
+import datetime as dt
+import io
+import random
+import tempfile
+import time
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import httpx
+import redis.asyncio as aioredis
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+try:
+    import fakeredis
+except ImportError:  # optional: only the rate-limiter tests need it
+    fakeredis = None
+
+from accounts.models import SavedLocation
+from activities import profiles
+from activities.models import ActivityType
+from activities.profiles import ProfileSet, ScoringProfile
+from weather import (
+    encoding, forecast, gazetteer, metrics, ratelimit, singleflight, spots,
+    tasks, upstream, views,
+)
+from weather.management.commands.loadtest import overpass_payload
+from weather.models import Place
+from weather.scoring.conditions import HourlyConditions
+from weather.scoring.engine import (
+    compute_score, conditions_from_dicts, score_matrix, score_results,
+)
+from weather.scoring.windows import find_best_windows, find_windows
+
+
+def _value(rng, lo, hi, none=0.0, special=()):
+    """A random reading: sometimes missing, sometimes a boundary value."""
+    r = rng.random()
+    if r < none:
+        return None
+    if r < none + 0.2 and special:
+        return rng.choice(special)
+    return round(rng.uniform(lo, hi), rng.choice((0, 1, 2, 6)))
+
+
+def _rows(rng, count) -> list:
+    """compute_score()-style weather dicts, a few with keys missing."""
+    rows = []
+    for _ in range(count):
+        row = {
+            'temp': _value(rng, -20, 45, special=(10, 12.5, 20, 25)),
+            'wind_speed': _value(rng, 0, 80, special=(0, 6, 12, 30, 40.5)),
+            'rain_prob': _value(rng, 0, 100, special=(0, 10, 20, 40)),
+            'humidity': _value(rng, 0, 100),
+            'uv_index': _value(rng, 0, 12, .1, (5, 8)),
+            'visibility': _value(rng, 0, 50000, .1, (1000, 10000)),
+            'aqi': _value(rng, 0, 150, .1, (20, 40, 60, 80)),
+            'minutes_to_golden': _value(rng, -30, 200, .3, (0, 60)),
+            'swell_height': _value(rng, 0, 6, .3, (1, 2.5, 4)),
+        }
+        for key in list(row):
+            if rng.random() < 0.03:
+                del row[key]
+        rows.append(row)
+    return rows
+
+
+def _profiles(rng, count) -> ProfileSet:
+    """Activities with varied weights and ranges (the first weighs nothing)."""
+    weights = (0, 0, 0.05, 0.1, 0.2, 0.3, 0.5, 1.0, 2.0)
+    profiles = []
+    for i in range(count):
+        pick = (lambda: 0) if i == 0 else (lambda: rng.choice(weights))
+        profiles.append(ScoringProfile(
+            id=i + 1, name=f'Activity {i + 1}', slug=f'activity-{i + 1}',
+            icon_name='activity',
+            temp_weight=pick(), wind_weight=pick(), rain_weight=pick(),
+            humidity_weight=pick(), uv_weight=pick(),
+            visibility_weight=pick(), air_quality_weight=pick(),
+            golden_hour_weight=pick(), swell_weight=pick(),
+            ideal_temp_min=rng.choice((5, 10, 12.5)),
+            ideal_temp_max=rng.choice((20, 25, 28.3)),
+            max_wind_speed=rng.choice((0, 15, 30, 40.5)),
+            max_rain_probability=rng.choice((0, 10, 20, 35)),
+        ))
+    return ProfileSet(profiles)
+
+
+def _forecast(rng, hours) -> tuple:
+    """
+    (forecast, air quality) payloads shaped like Open-Meteo's; only the
+    readings compute_score() treats as optional have gaps.
+    """
+    times = [f'2025-06-{1 + i // 24:02d}T{i % 24:02d}:00' for i in range(hours)]
+
+    def series(lo, hi, missing=0.0):
+        return [None if rng.random() < missing else round(rng.uniform(lo, hi), 1)
+                for _ in times]
+
+    weather = {
+        'utc_offset_seconds': 0,
+        'hourly': {
+            'time': times,
+            'temperature_2m': series(-5, 35),
+            'wind_speed_10m': series(0, 60),
+            'precipitation_probability': series(0, 100),
+            'relative_humidity_2m': series(10, 100),
+            'visibility': series(200, 40000, 0.05),
+            'is_day': [int(6 <= i % 24 <= 20) for i in range(hours)],
+        },
+        'daily': {
+            'time': sorted({t[:10] for t in times}),
+            'uv_index_max': [round(rng.uniform(0, 10), 1)
+                             for _ in range(hours // 24 + 1)],
+        },
+    }
+    aqi_data = {'hourly': {'time': times, 'european_aqi': series(5, 120, 0.05)}}
+    return weather, aqi_data
+
+
+def _reference_windows(hours, scores, threshold=60) -> list:
+    """The original scalar window scan, kept as the reference."""
+    windows = []
+    current = None
+    for hour, score in zip(hours, scores):
+        if score >= threshold:
+            if current is None:
+                current = {'start': hour, 'end': hour, 'peak': score,
+                           'scores': [score]}
+            else:
+                current['end'] = hour
+                current['peak'] = max(current['peak'], score)
+                current['scores'].append(score)
+        elif current is not None:
+            current['avg'] = round(sum(current['scores']) / len(current['scores']), 1)
+            del current['scores']
+            windows.append(current)
+            current = None
+    if current is not None:
+        current['avg'] = round(sum(current['scores']) / len(current['scores']), 1)
+        del current['scores']
+        windows.append(current)
+    return sorted(windows, key=lambda w: w['peak'], reverse=True)
+
+
+class BatchScoringTests(SimpleTestCase):
+    """score_matrix() / score_results() must match compute_score() exactly."""
+
+    def test_matrix_matches_scalar_scores(self):
+        for seed in range(5):
+            rng = random.Random(seed)
+            rows = _rows(rng, 200)
+            profiles = _profiles(rng, 30)
+            conditions = conditions_from_dicts(rows)
+            # Compiled ProfileSet parameters and plain profile objects
+            # take different paths into the batch scorer.
+            for activities in (profiles, list(profiles)):
+                matrix = score_matrix(conditions, activities)
+                for h, row in enumerate(rows):
+                    for a, act in enumerate(profiles):
+                        self.assertEqual(
+                            matrix[h, a], compute_score(row, act)['score'],
+                            f'seed {seed}, hour {h}, activity {a}',
+                        )
+
+    def test_results_match_scalar_results(self):
+        rng = random.Random(42)
+        rows = _rows(rng, 60)
+        profiles = _profiles(rng, 20)
+        conditions = conditions_from_dicts(rows)
+        for h, row in enumerate(rows):
+            self.assertEqual(
+                score_results(conditions, profiles, h),
+                [compute_score(row, act) for act in profiles],
+            )
+
+    def test_hourly_conditions_match_their_rows(self):
+        rng = random.Random(7)
+        weather, aqi_data = _forecast(rng, 72)
+        profiles = _profiles(rng, 10)
+        hourly = HourlyConditions.from_forecast(weather, aqi_data, 0, 72)
+        matrix = score_matrix(hourly, profiles)
+        for h in range(hourly.hours):
+            row = hourly.row(h)
+            for a, act in enumerate(profiles):
+                self.assertEqual(matrix[h, a], compute_score(row, act)['score'])
+
+
+class WindowTests(SimpleTestCase):
+    """find_windows() must agree with the original window scan."""
+
+    def test_single_day_windows_match_reference(self):
+        keys = ('start', 'end', 'peak', 'avg')
+        for seed in range(50):
+            rng = random.Random(seed)
+            hours = [f'{h:02d}:00' for h in range(24)]
+            scores = [rng.choice((0, 40, 59, 60, 61, 75, 90, 100))
+                      for _ in hours]
+            expected = _reference_windows(hours, scores)
+            found = find_windows(hours, scores, split_days=False)
+            self.assertEqual(
+                [{k: w[k] for k in keys} for w in found], expected,
+                f'seed {seed}',
+            )
+
+    def test_find_best_windows_matches_scalar_scoring(self):
+        rng = random.Random(3)
+        rows = _rows(rng, 24)
+        for i, row in enumerate(rows):
+            row['hour'] = f'{i:02d}:00'
+        for act in _profiles(rng, 10):
+            expected = _reference_windows(
+                [row['hour'] for row in rows],
+                [compute_score(row, act)['score'] for row in rows],
+            )
+            found = find_best_windows(rows, act)
+            self.assertEqual(
+                [{k: w[k] for k in ('start', 'end', 'peak', 'avg')}
+                 for w in found],
+                expected,
+            )
+
+    def test_multi_day_windows_split_at_midnight(self):
+        times = [f'2025-06-0{1 + i // 24}T{i % 24:02d}:00' for i in range(48)]
+        windows = find_windows(times, [80] * 48, top_k=None)
+        self.assertEqual(
+            [(w['date'], w['start'], w['end'], w['hours']) for w in windows],
+            [('2025-06-01', '00:00', '23:00', 24),
+             ('2025-06-02', '00:00', '23:00', 24)],
+        )
+
+
+class ScoringBenchmarkTests(SimpleTestCase):
+    """Allocations stay within the committed bench_scoring baseline."""
+
+    def test_allocations_within_baseline(self):
+        # Times depend on the host; bench_scoring --check compares them.
+        call_command(
+            'bench_scoring', check=True, memory_only=True,
+            activities=(1, 12), hours=(24, 168), locations=(1,),
+            repeat=1, max_time=0, stdout=io.StringIO(),
+        )
+
+
+LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+# An hour boundary plus UPDATE_DELAY: when a model run is due.
+RUN = 1749999600 + forecast.UPDATE_DELAY
+
+
+class UpstreamStub:
+    """
+    Stands in for Open-Meteo behind an httpx.MockTransport: answers with
+    ``status`` (503 for latitudes in ``failing``) after ``delay``
+    seconds and records each request's URL.
+    """
+
+    def __init__(self):
+        self.status = 200
+        self.delay = 0
+        self.failing = set()
+        self.calls = []
+
+    async def handler(self, request):
+        self.calls.append(request.url)
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        lat = float(request.url.params['latitude'])
+        if lat in self.failing:
+            return httpx.Response(503)
+        if self.status != 200:
+            return httpx.Response(self.status)
+        times = [f'2025-06-15T{h:02d}:00' for h in range(24)]
+        return httpx.Response(200, json={
+            'latitude': lat,
+            'longitude': float(request.url.params['longitude']),
+            'utc_offset_seconds': 3600,
+            'current': {'time': times[12], 'temperature_2m': 18.0,
+                        'wind_speed_10m': 9.0, 'relative_humidity_2m': 60,
+                        'is_day': 1},
+            'hourly': {
+                'time': times, 'temperature_2m': [18.0] * 24,
+                'wind_speed_10m': [9.0] * 24,
+                'precipitation_probability': [10] * 24,
+                'relative_humidity_2m': [60] * 24,
+                'visibility': [20000] * 24, 'is_day': [1] * 24,
+            },
+            'daily': {'time': ['2025-06-15'], 'sunrise': ['2025-06-15T04:43'],
+                      'temperature_2m_max': [22.0], 'uv_index_max': [5.0]},
+        })
+
+
+class UpstreamMixin:
+    """
+    Upstream calls go to ``self.upstream``; the clock (``self.now``)
+    stands a minute after a model run until a test moves it. Test
+    classes use a LocMemCache and no rate limits (see UpstreamTestCase).
+    """
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        upstream._breakers.clear()
+        self.upstream = UpstreamStub()
+        http = httpx.AsyncClient(
+            transport=httpx.MockTransport(self.upstream.handler),
+        )
+        self.now = RUN + 60
+        for patcher in (
+            mock.patch.object(upstream, 'client', return_value=http),
+            mock.patch('time.time', side_effect=lambda: self.now),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+
+@override_settings(CACHES=LOCMEM, UPSTREAM_RATE_LIMITS={})
+class UpstreamTestCase(UpstreamMixin, SimpleTestCase):
+    """UpstreamMixin for tests without the database."""
+
+
+class ForecastCacheTests(UpstreamTestCase):
+    """One cached forecast per grid cell, refetched after each model run."""
+
+    def test_nearby_points_share_a_grid_cell(self):
+        self.assertEqual(forecast.snap_to_grid(51.5074, -0.1278), (51.5, -0.1))
+        self.assertEqual(forecast.snap_to_grid(51.46, -0.14), (51.5, -0.1))
+        self.assertEqual(forecast.snap_to_grid(51.44, -0.1), (51.4, -0.1))
+
+    def test_update_schedule(self):
+        self.assertEqual(forecast.seconds_until_update(RUN), 3600)
+        self.assertEqual(forecast.seconds_until_update(RUN - 300), 300)
+        self.assertEqual(forecast.seconds_until_update(RUN - 30), 60)
+        self.assertFalse(forecast.is_stale(RUN, RUN + 3599))
+        self.assertTrue(forecast.is_stale(RUN - 1, RUN))
+
+    async def test_nearby_requests_share_one_fetch(self):
+        first = await forecast.get_forecast_entry(51.5074, -0.1278)
+        again = await forecast.get_forecast_entry(51.46, -0.14)
+        self.assertEqual(again, first)
+        self.assertEqual(len(self.upstream.calls), 1)
+        self.assertEqual(self.upstream.calls[0].params['latitude'], '51.5')
+
+    async def test_generation_expires_at_next_model_run(self):
+        _, fetched_at = await forecast.get_forecast_entry(51.5, -0.1)
+        self.assertEqual(fetched_at, self.now)
+        self.assertEqual(
+            await forecast.get_generations(51.5, -0.1, ('forecast', 'aqi')),
+            {'forecast': (fetched_at, 3600)},
+        )
+        self.now = RUN + 3599
+        self.assertTrue(
+            await forecast.get_generations(51.5, -0.1, ('forecast',)),
+        )
+        self.now = RUN + 3601
+        self.assertEqual(
+            await forecast.get_generations(51.5, -0.1, ('forecast',)), {},
+        )
+        # The payload itself is kept as a fallback.
+        self.assertIsNotNone(
+            await cache.aget(forecast.cache_key('forecast', 51.5, -0.1)),
+        )
+
+    async def test_stale_entry_refetched_after_model_run(self):
+        await forecast.get_forecast_entry(51.5, -0.1)
+        self.now = RUN + 3600 + 60
+        _, fetched_at = await forecast.get_forecast_entry(51.5, -0.1)
+        self.assertEqual(fetched_at, self.now)
+        self.assertEqual(len(self.upstream.calls), 2)
+
+    async def test_stale_entry_served_while_upstream_fails(self):
+        first = await forecast.get_forecast_entry(51.5, -0.1)
+        self.now = RUN + 3600 + 60
+        self.upstream.status = 503
+        with mock.patch.object(forecast, 'revalidate_later') as revalidate:
+            self.assertEqual(
+                await forecast.get_forecast_entry(51.5, -0.1), first,
+            )
+        revalidate.assert_awaited_once_with(51.5, -0.1)
+
+    async def test_failures_are_not_cached(self):
+        self.upstream.status = 500
+        self.assertEqual(
+            await forecast.get_forecast_entry(51.5, -0.1), (None, None),
+        )
+        self.upstream.status = 200
+        data, _ = await forecast.get_forecast_entry(51.5, -0.1)
+        self.assertEqual(data['latitude'], 51.5)
+        self.assertEqual(len(self.upstream.calls), 2)
+
+
+class PrewarmTests(TestCase):
+    """prewarm_forecasts() refreshes active users' cells before morning."""
+
+    NOW = dt.datetime(2025, 6, 15, 6, 0, tzinfo=dt.timezone.utc)
+
+    def _user(self, name, last_login, home=None, saved=()):
+        user = get_user_model().objects.create_user(name, last_login=last_login)
+        if home:
+            user.home_latitude, user.home_longitude = home
+            user.save()
+        for lat, lon in saved:
+            SavedLocation.objects.create(
+                user=user, name=f'{lat},{lon}', latitude=lat, longitude=lon,
+            )
+
+    def test_warms_active_users_cells_in_the_morning_window(self):
+        recent = self.NOW - dt.timedelta(days=tasks.PREWARM_ACTIVE_DAYS - 1)
+        lapsed = self.NOW - dt.timedelta(days=tasks.PREWARM_ACTIVE_DAYS + 1)
+        self._user('london', recent, home=(51.5074, -0.1278), saved=[
+            (51.52, -0.08),     # same cell as home
+            (52.52, 13.40),     # Berlin: 07:00 solar
+            (40.71, -74.01),    # New York: 01:00 solar
+        ])
+        self._user('athens', recent, saved=[
+            (37.98, 23.73),     # 08:00 solar, the last hour warmed
+            (33.31, 44.36),     # Baghdad: 09:00 solar, too late
+        ])
+        self._user('lapsed', lapsed, home=(48.85, 2.35))
+        self._user('never', None, saved=[(40.42, -3.70)])
+
+        warmed = []
+
+        async def get_cached_entry(kind, lat, lon, fetch, refresh=False):
+            warmed.append((kind, lat, lon, refresh))
+            return {'utc_offset_seconds': 0}, 0.0
+
+        with mock.patch.object(timezone, 'now', return_value=self.NOW), \
+                mock.patch.object(forecast, 'get_cached_entry', get_cached_entry):
+            result = tasks.prewarm_forecasts()
+
+        cells = {(51.5, -0.1), (52.5, 13.4), (38.0, 23.7)}
+        self.assertEqual(result, {'cells': 3, 'refreshed': 3})
+        self.assertCountEqual(warmed, [
+            (kind, lat, lon, True)
+            for lat, lon in cells for kind in ('forecast', 'aqi')
+        ])
+
+
+PLACES = [
+    # name, ascii name, latitude, longitude, population
+    ('São Paulo', 'Sao Paulo', -23.55, -46.63, 12_000_000),
+    ('London', 'London', 51.51, -0.13, 8_900_000),
+    ('Santiago', 'Santiago', -33.46, -70.65, 6_000_000),
+    ('San Diego', 'San Diego', 32.72, -117.16, 1_400_000),
+    ('München', 'Muenchen', 48.14, 11.58, 1_500_000),
+    ('San Francisco', 'San Francisco', 37.77, -122.42, 870_000),
+    ('Santa Fe', 'Santa Fe', 35.69, -105.94, 88_000),
+    ('Sandy', 'Sandy', 40.59, -111.88, 96_000),
+    ('Sanford', 'Sanford', 28.80, -81.27, 61_000),
+    ('Greenwich', 'Greenwich', 51.48, 0.0, 290_000),
+    ('Witham', 'Witham', 51.80, 0.64, 25_000),
+    ('Suva', 'Suva', -18.14, 178.44, 93_000),
+    ('Taveuni', 'Taveuni', -16.85, 179.97, 9_000),
+]
+
+
+def _reset_gazetteer():
+    gazetteer._state.index = gazetteer._state.nearest = None
+    gazetteer._state.version = None
+    gazetteer._state.checked_at = 0.0
+
+
+@override_settings(CACHES=LOCMEM)
+class GazetteerTests(TestCase):
+    """Prefix search and nearest-place lookups over the Place table."""
+
+    @classmethod
+    def setUpTestData(cls):
+        Place.objects.bulk_create(
+            Place(geoname_id=i, name=name, ascii_name=ascii_name,
+                  latitude=lat, longitude=lon, population=population)
+            for i, (name, ascii_name, lat, lon, population)
+            in enumerate(PLACES)
+        )
+
+    def setUp(self):
+        cache.clear()
+        _reset_gazetteer()
+        self.addCleanup(_reset_gazetteer)
+
+    def _names(self, rows):
+        return [row['name'] for row in rows]
+
+    def test_prefix_search_ranks_by_population(self):
+        index = gazetteer.get_index()
+        self.assertEqual(
+            self._names(index.search('san')),
+            ['Santiago', 'San Diego', 'San Francisco', 'Sandy', 'Santa Fe',
+             'Sanford'],
+        )
+        self.assertEqual(
+            self._names(index.search('San D')), ['San Diego'],
+        )
+        self.assertEqual(self._names(index.search('san', limit=2)),
+                         ['Santiago', 'San Diego'])
+        self.assertEqual(index.search('  '), [])
+
+    def test_search_ignores_case_and_accents(self):
+        index = gazetteer.get_index()
+        self.assertEqual(self._names(index.search('SÃO p')), ['São Paulo'])
+        self.assertEqual(self._names(index.search('munchen')), ['München'])
+        self.assertEqual(self._names(index.search('muen')), ['München'])
+
+    def test_precomputed_prefixes_match_a_scan(self):
+        index = gazetteer.get_index()
+        by_population = sorted(PLACES, key=lambda p: -p[4])
+        prefixes = {
+            gazetteer.normalize(name)[:n].rstrip()
+            for place in PLACES for name in place[:2] for n in range(1, 6)
+        }
+        for prefix in prefixes:
+            expected = [
+                name for name, ascii_name, *_ in by_population
+                if any(gazetteer.normalize(n).startswith(prefix)
+                       for n in (name, ascii_name))
+            ][:gazetteer.MAX_RESULTS]
+            self.assertEqual(self._names(index.search(prefix)), expected,
+                             prefix)
+
+    def test_nearest_looks_across_cell_boundaries(self):
+        nearest = gazetteer.get_nearest_index()
+        # The point's cell (52, 0) is empty; Witham is in (51, 0).
+        row, km = nearest.nearest(52.02, 0.5)
+        self.assertEqual(row['name'], 'Witham')
+        self.assertLess(km, gazetteer.MAX_NEAREST_KM)
+        # London shares the point's cell (51, -1), Greenwich is closer.
+        row, _ = nearest.nearest(51.48, -0.05)
+        self.assertEqual(row['name'], 'Greenwich')
+
+    def test_nearest_wraps_across_the_antimeridian(self):
+        nearest = gazetteer.get_nearest_index()
+        row, km = nearest.nearest(-16.85, -179.9)
+        self.assertEqual(row['name'], 'Taveuni')
+        self.assertLess(km, 15)
+        self.assertIsNone(nearest.nearest(-17.5, -178.0))
+        self.assertIsNone(nearest.nearest(0.0, 0.0))
+
+    def test_reimport_rebuilds_every_process(self):
+        before = gazetteer.get_index()
+        Place.objects.create(geoname_id=100, name='Sanaa', latitude=15.37,
+                             longitude=44.19, population=2_500_000)
+        self.assertIs(gazetteer.get_index(), before)
+
+        # Another process imported: the version moved on.
+        cache.set(gazetteer.VERSION_KEY, 5, timeout=None)
+        self.assertIs(gazetteer.get_index(), before)  # not checked yet
+        gazetteer._state.checked_at = 0.0
+        self.assertEqual(self._names(gazetteer.get_index().search('sana')),
+                         ['Sanaa'])
+
+        # This process imported: rebuilt at once, version bumped.
+        Place.objects.filter(name='Sanaa').delete()
+        gazetteer.invalidate()
+        self.assertEqual(cache.get(gazetteer.VERSION_KEY), 6)
+        self.assertEqual(gazetteer.get_index().search('sana'), [])
+
+
+class OverpassMixin:
+    """Overpass calls go to the loadtest stand-in; queries are recorded."""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        upstream._breakers.clear()
+        self.queries = []
+        self.remark = None
+        http = httpx.AsyncClient(transport=httpx.MockTransport(self.overpass))
+        patcher = mock.patch.object(upstream, 'client', return_value=http)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def overpass(self, request):
+        query = dict(httpx.QueryParams(request.content.decode()))['data']
+        self.queries.append(query)
+        payload = overpass_payload(query)
+        if self.remark:
+            payload['remark'] = self.remark
+        return httpx.Response(200, json=payload)
+
+
+@override_settings(CACHES=LOCMEM, UPSTREAM_RATE_LIMITS={})
+class SpotSearchTests(OverpassMixin, TestCase):
+    """Overpass is asked only for the (tile, category) pairs not cached."""
+
+    async def test_fetches_only_missing_pairs(self):
+        found = await spots.search(51.5, -0.12, 3000, ['park'])
+        self.assertTrue(found)
+        self.assertEqual({s['category'] for s in found}, {'park'})
+        tiles = self.queries[0].count('out count;')
+        self.assertEqual(
+            self.queries[0].count(f'out center tags {spots.OVERPASS_TILE_LIMIT};'),
+            tiles,
+        )
+
+        await spots.search(51.5, -0.12, 3000, ['park', 'beach'])
+        self.assertEqual(len(self.queries), 2)
+        self.assertNotIn(spots.SPOT_QUERIES['park'], self.queries[1])
+        self.assertEqual(self.queries[1].count('out count;'), tiles)
+
+        await spots.search(51.5, -0.12, 3000, ['beach', 'park'])
+        self.assertEqual(len(self.queries), 2)
+
+    async def test_remark_is_an_error_and_not_cached(self):
+        self.remark = 'runtime error: Query timed out in "query" at line 1'
+        with self.assertRaises(spots.OverpassError):
+            await spots.search(51.5, -0.12, 3000, ['park'])
+        self.remark = None
+        await spots.search(51.5, -0.12, 3000, ['park'])
+        self.assertEqual(len(self.queries), 2)
+
+    async def test_truncated_response_is_an_error(self):
+        with mock.patch(f'{__name__}.overpass_payload',
+                        return_value={'elements': []}):
+            with self.assertRaises(spots.OverpassError):
+                await spots.search(51.5, -0.12, 3000, ['park'])
+
+
+OSM_EXTRACT = """<?xml version="1.0" encoding="UTF-8"?>
+<osm version="0.6">
+ <bounds minlat="51.3" minlon="-0.5" maxlat="51.7" maxlon="0.3"/>
+ <node id="1" lat="51.5010" lon="-0.1410">
+  <tag k="leisure" v="park"/><tag k="name" v="Green Park"/>
+ </node>
+ <node id="2" lat="51.5070" lon="-0.1650">
+  <tag k="leisure" v="park"/><tag k="name" v="Hyde Park"/>
+ </node>
+</osm>
+"""
+
+
+@override_settings(CACHES=LOCMEM, UPSTREAM_RATE_LIMITS={})
+class LocalSpotSearchTests(OverpassMixin, TestCase):
+    """Searches inside an imported extract's extent never reach Overpass."""
+
+    def setUp(self):
+        super().setUp()
+        with tempfile.NamedTemporaryFile('w', suffix='.osm') as f:
+            f.write(OSM_EXTRACT)
+            f.flush()
+            call_command('import_spots', f.name, stdout=io.StringIO())
+
+    async def test_inside_the_extent_reads_the_table(self):
+        found = await spots.search(51.5, -0.15, 2000, ['park'])
+        self.assertEqual([s['name'] for s in found],
+                         ['Green Park', 'Hyde Park'])
+        # Nothing local is still the answer inside the extent.
+        self.assertEqual(await spots.search(51.5, -0.15, 2000, ['beach']), [])
+        self.assertEqual(self.queries, [])
+
+    async def test_outside_the_extent_asks_overpass(self):
+        await spots.search(51.68, 0.28, 5000, ['park'])
+        self.assertEqual(len(self.queries), 1)
+
+    def test_bounds_option_narrows_the_extent(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.osm') as f:
+            f.write(OSM_EXTRACT)
+            f.flush()
+            call_command('import_spots', f.name, bounds='51.45,-0.2,51.55,0',
+                         stdout=io.StringIO())
+        self.assertEqual(
+            async_to_sync(spots.local_extent)(), (51.45, -0.2, 51.55, 0.0),
+        )
+
+
+def _reset_profiles():
+    profiles._registry.profiles = None
+    profiles._registry.version = None
+    profiles._registry.checked_at = 0.0
+
+
+@override_settings(CACHES=LOCMEM, UPSTREAM_RATE_LIMITS={})
+class BulkScoresTests(UpstreamMixin, TestCase):
+    """POST /weather/api/scores/bulk/ scores each grid cell once."""
+
+    url = '/weather/api/scores/bulk/'
+
+    @classmethod
+    def setUpTestData(cls):
+        ActivityType.objects.create(name='Running', slug='running', emoji='🏃')
+        ActivityType.objects.create(name='Hiking', slug='hiking', emoji='🥾')
+
+    def setUp(self):
+        super().setUp()
+        _reset_profiles()
+        self.addCleanup(_reset_profiles)
+
+    async def post(self, locations):
+        return await self.async_client.post(
+            self.url, {'locations': locations}, content_type='application/json',
+        )
+
+    async def test_locations_in_one_cell_share_a_fetch(self):
+        response = await self.post([
+            {'lat': 51.5074, 'lon': -0.1278},
+            {'lat': 48.85, 'lon': 2.35},
+            {'lat': 51.46, 'lon': -0.14},  # London's cell again
+        ])
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual([(r['lat'], r['lon']) for r in results], [
+            (51.5074, -0.1278), (48.85, 2.35), (51.46, -0.14),
+        ])
+        self.assertEqual(results[0]['scores'], results[2]['scores'])
+        self.assertEqual({s['slug'] for s in results[1]['scores']},
+                         {'running', 'hiking'})
+        # Two cells, a forecast and an air-quality call each.
+        self.assertEqual(len(self.upstream.calls), 4)
+
+    async def test_unavailable_cell_scores_none(self):
+        self.upstream.failing.add(48.9)
+        response = await self.post([
+            {'lat': 48.86, 'lon': 2.35}, {'lat': 51.5, 'lon': -0.1},
+        ])
+        self.assertEqual(response.status_code, 200)
+        first, second = response.json()['results']
+        self.assertIsNone(first['scores'])
+        self.assertEqual(len(second['scores']), 2)
+
+    async def test_too_many_locations(self):
+        response = await self.post(
+            [{'lat': 50, 'lon': i} for i in range(views.MAX_BULK_LOCATIONS + 1)],
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.upstream.calls, [])
+
+    async def test_invalid_location_is_named_by_index(self):
+        for bad in ({'lat': 91, 'lon': 0}, {'lat': 'nan', 'lon': 0},
+                    {'lat': 10}, 'here'):
+            response = await self.post([{'lat': 50, 'lon': 0}, bad])
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json(),
+                             {'error': 'Invalid coordinates at locations[1]'})
+        response = await self.async_client.post(
+            self.url, '{"places": []}', content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.upstream.calls, [])
+
+
+class ForecastApiTests(UpstreamTestCase):
+    """Validators and the cached body of /weather/api/weather/."""
+
+    url = '/weather/api/weather/?lat=51.5&lon=-0.12'
+
+    async def test_first_response_carries_validators(self):
+        response = await self.async_client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['ETag'].startswith('"'))
+        self.assertIn('Last-Modified', response)
+        self.assertIn('max-age=', response['Cache-Control'])
+        self.assertIn('Accept', response['Vary'])
+
+    async def test_revalidation_is_answered_with_304(self):
+        first = await self.async_client.get(self.url)
+        response = await self.async_client.get(
+            self.url, headers={'If-None-Match': first['ETag']},
+        )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], first['ETag'])
+        self.assertIn('Accept', response['Vary'])
+        self.assertEqual(len(self.upstream.calls), 1)
+
+    async def test_repeat_is_served_from_stored_bytes(self):
+        first = await self.async_client.get(self.url)
+        with mock.patch.object(views, 'encode') as encode:
+            again = await self.async_client.get(self.url)
+        encode.assert_not_called()
+        self.assertEqual(again.content, first.content)
+        self.assertEqual(again['ETag'], first['ETag'])
+
+    async def test_new_model_run_changes_the_etag(self):
+        first = await self.async_client.get(self.url)
+        self.now = RUN + 3600 + 60
+        response = await self.async_client.get(
+            self.url, headers={'If-None-Match': first['ETag']},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+        self.assertEqual(len(self.upstream.calls), 2)
+
+
+class EncodingTests(UpstreamTestCase):
+    """MessagePack for clients that ask for it, JSON otherwise."""
+
+    url = '/weather/api/weather/?lat=51.5&lon=-0.12'
+
+    @skipUnless(encoding.msgpack, 'msgpack is not installed')
+    async def test_msgpack_when_accepted(self):
+        as_json = await self.async_client.get(self.url)
+        response = await self.async_client.get(
+            self.url, headers={'Accept': 'application/msgpack'},
+        )
+        self.assertEqual(response['Content-Type'], encoding.MSGPACK)
+        self.assertEqual(encoding.msgpack.unpackb(response.content), as_json.json())
+        self.assertNotEqual(response['ETag'], as_json['ETag'])
+
+    async def test_json_by_default(self):
+        for accept in ('*/*', 'application/json', 'text/html'):
+            response = await self.async_client.get(
+                self.url, headers={'Accept': accept},
+            )
+            self.assertEqual(response['Content-Type'], encoding.JSON)
+
+    def test_encoder_is_pluggable(self):
+        encoding.json_encoder.cache_clear()
+        self.addCleanup(encoding.json_encoder.cache_clear)
+        with override_settings(API_JSON_ENCODER=f'{__name__}.upper_json'):
+            self.assertEqual(encoding.encode({'a': 'b'}), b'{"A":"B"}')
+
+
+def upper_json(obj) -> bytes:
+    return encoding._stdlib_dumps(obj).upper()
+
+
+class ProjectionTests(UpstreamTestCase):
+    """blocks= / fields= trim the forecast response."""
+
+    url = '/weather/api/weather/?lat=51.5&lon=-0.12'
+
+    async def test_blocks(self):
+        response = await self.async_client.get(self.url + '&blocks=current')
+        body = response.json()
+        self.assertIn('current', body)
+        self.assertNotIn('hourly', body)
+        self.assertNotIn('daily', body)
+        self.assertEqual(body['utc_offset_seconds'], 3600)
+
+    async def test_fields_keep_the_time_axis(self):
+        response = await self.async_client.get(
+            self.url + '&fields=temperature_2m,daily.sunrise',
+        )
+        body = response.json()
+        self.assertEqual(set(body['hourly']), {'time', 'temperature_2m'})
+        self.assertEqual(set(body['current']), {'time', 'temperature_2m'})
+        self.assertEqual(set(body['daily']), {'time', 'sunrise'})
+
+    async def test_each_projection_has_its_own_etag(self):
+        etags = set()
+        for query in ('', '&blocks=daily', '&blocks=daily,current',
+                      '&fields=temperature_2m'):
+            response = await self.async_client.get(self.url + query)
+            etags.add(response['ETag'])
+        self.assertEqual(len(etags), 4)
+        self.assertEqual(len(self.upstream.calls), 1)
+
+    async def test_unknown_block_is_rejected(self):
+        for query in ('&blocks=weekly', '&fields=minutely.rain',
+                      '&blocks=current,nope'):
+            response = await self.async_client.get(self.url + query)
+            self.assertEqual(response.status_code, 400, query)
+        self.assertEqual(self.upstream.calls, [])
+
+
+class SingleFlightTests(UpstreamTestCase):
+    """Concurrent misses for one cell make one upstream call per kind."""
+
+    async def test_concurrent_cold_requests_share_one_fetch(self):
+        self.upstream.delay = 0.05
+        results = await asyncio.gather(*(
+            forecast.get_forecast_and_air_quality(51.5 + i / 1000, -0.12)
+            for i in range(20)
+        ))
+        self.assertEqual(len(self.upstream.calls), 2)
+        self.assertEqual(
+            sorted(url.path for url in self.upstream.calls),
+            ['/v1/air-quality', '/v1/forecast'],
+        )
+        self.assertTrue(all(r == results[0] for r in results))
+
+    async def test_waits_for_another_workers_fetch(self):
+        key = forecast.cache_key('forecast', 51.5, -0.1)
+        await cache.aadd(f'singleflight:{key}', 'other-worker', 15)
+        entry = ({'latitude': 51.5, 'utc_offset_seconds': 0}, self.now)
+
+        async def other_worker():
+            await asyncio.sleep(0.1)
+            await cache.aset(key, entry, forecast.STALE_TTL)
+
+        found, _ = await asyncio.gather(
+            forecast.get_forecast_entry(51.5, -0.1), other_worker(),
+        )
+        self.assertEqual(found, entry)
+        self.assertEqual(self.upstream.calls, [])
+
+    async def test_takes_over_when_the_other_worker_gives_up(self):
+        key = forecast.cache_key('forecast', 51.5, -0.1)
+        lock = f'singleflight:{key}'
+        await cache.aadd(lock, 'other-worker', 15)
+
+        async def other_worker():
+            await asyncio.sleep(0.1)
+            await cache.adelete(lock)
+
+        (data, _), _ = await asyncio.gather(
+            forecast.get_forecast_entry(51.5, -0.1), other_worker(),
+        )
+        self.assertEqual(data['latitude'], 51.5)
+        self.assertEqual(len(self.upstream.calls), 1)
+
+    async def test_failure_is_shared_and_not_kept(self):
+        calls = []
+
+        async def failing():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            raise RuntimeError('upstream')
+
+        results = await asyncio.gather(
+            *(singleflight.coalesce('k', failing) for _ in range(5)),
+            return_exceptions=True,
+        )
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(isinstance(r, RuntimeError) for r in results))
+        self.assertEqual(singleflight._inflight, {})
+
+
+class StaleWhileRevalidateTests(UpstreamTestCase):
+    """A stale forecast is served at once while upstream is down or slow."""
+
+    async def _stale_entry(self):
+        entry = await forecast.get_forecast_entry(51.5, -0.1)
+        self.now = RUN + 3600 + 60
+        return entry
+
+    async def test_stale_entry_served_while_upstream_is_down(self):
+        stale = await self._stale_entry()
+        self.upstream.status = 503
+        loop = asyncio.get_running_loop()
+        with mock.patch.object(forecast, 'revalidate_later') as revalidate:
+            started = loop.time()
+            self.assertEqual(
+                await forecast.get_forecast_entry(51.5, -0.1), stale,
+            )
+        self.assertLess(loop.time() - started, 1)
+        revalidate.assert_awaited_once_with(51.5, -0.1)
+
+    async def test_slow_refetch_serves_stale_and_fills_the_cache(self):
+        stale = await self._stale_entry()
+        self.upstream.delay = 0.2
+        with mock.patch.object(forecast, 'STALE_WAIT', 0.05):
+            self.assertEqual(
+                await forecast.get_forecast_entry(51.5, -0.1), stale,
+            )
+            await asyncio.sleep(0.3)  # the fetch carries on
+            _, fetched_at = await forecast.get_forecast_entry(51.5, -0.1)
+        self.assertEqual(fetched_at, self.now)
+        self.assertEqual(len(self.upstream.calls), 2)
+
+    async def test_open_circuit_serves_stale_without_calling_upstream(self):
+        stale = await self._stale_entry()
+        b = upstream.breaker('api.open-meteo.com')
+        for _ in range(upstream.FAILURE_THRESHOLD):
+            b.record(ok=False)
+        with mock.patch.object(forecast, 'revalidate_later'):
+            self.assertEqual(
+                await forecast.get_forecast_entry(51.5, -0.1), stale,
+            )
+        self.assertEqual(len(self.upstream.calls), 1)
+
+
+class CircuitBreakerTests(UpstreamTestCase):
+    """Per-host breaker: closed, open, half-open and slow calls."""
+
+    url = 'https://api.open-meteo.com/v1/forecast?latitude=1&longitude=2'
+
+    async def _fail(self, times):
+        self.upstream.status = 503
+        for _ in range(times):
+            await upstream.get(self.url)
+        self.upstream.status = 200
+
+    async def test_opens_after_consecutive_failures(self):
+        await self._fail(upstream.FAILURE_THRESHOLD - 1)
+        await upstream.get(self.url)  # a success resets the count
+        await self._fail(upstream.FAILURE_THRESHOLD - 1)
+        self.assertFalse(upstream.breaker('api.open-meteo.com').is_open)
+        await self._fail(1)
+        self.assertTrue(upstream.breaker('api.open-meteo.com').is_open)
+
+        calls = len(self.upstream.calls)
+        with self.assertRaises(upstream.CircuitOpen):
+            await upstream.get(self.url)
+        self.assertEqual(len(self.upstream.calls), calls)
+        # Other hosts are unaffected.
+        await upstream.get('https://air-quality-api.open-meteo.com/v1/'
+                           'air-quality?latitude=1&longitude=2')
+
+    async def test_half_open_lets_one_probe_through(self):
+        await self._fail(upstream.FAILURE_THRESHOLD)
+        b = upstream.breaker('api.open-meteo.com')
+        b.opened_at -= upstream.OPEN_SECONDS  # cool-down over
+        self.upstream.delay = 0.05
+
+        probe = asyncio.ensure_future(upstream.get(self.url))
+        await asyncio.sleep(0)
+        with self.assertRaises(upstream.CircuitOpen):
+            await upstream.get(self.url)
+        self.assertEqual((await probe).status_code, 200)
+        self.assertFalse(b.is_open)
+
+    async def test_failed_probe_reopens(self):
+        await self._fail(upstream.FAILURE_THRESHOLD)
+        b = upstream.breaker('api.open-meteo.com')
+        b.opened_at -= upstream.OPEN_SECONDS
+        await self._fail(1)
+        self.assertTrue(b.is_open)
+        with self.assertRaises(upstream.CircuitOpen):
+            await upstream.get(self.url)
+
+    async def test_slow_calls_count_as_failures(self):
+        self.upstream.delay = 0.05
+        with mock.patch.object(upstream, 'SLOW_CALL_SECONDS', 0.01):
+            for _ in range(upstream.FAILURE_THRESHOLD):
+                response = await upstream.get(self.url)
+                self.assertEqual(response.status_code, 200)
+            self.assertTrue(upstream.breaker('api.open-meteo.com').is_open)
+
+    def test_slow_call_threshold_follows_the_callers_timeout(self):
+        self.assertEqual(upstream.slow_call_seconds(), 5.0)
+        self.assertEqual(upstream.slow_call_seconds(2), 5.0)
+        self.assertEqual(upstream.slow_call_seconds(
+            httpx.Timeout(12, connect=3.05)), 12 * 0.8)
+        self.assertEqual(upstream.slow_call_seconds(httpx.Timeout(None)),
+                         float('inf'))
+
+
+@skipUnless(fakeredis, 'fakeredis is not installed')
+@override_settings(UPSTREAM_RATE_LIMITS={
+    'fast.example': (20.0, 4), 'single.example': (10.0, 1),
+})
+class RateLimitTests(SimpleTestCase):
+    """The Redis token bucket, background priority and failing open."""
+
+    def setUp(self):
+        self.redis = fakeredis.FakeAsyncRedis()
+        self.scripts = 0
+
+        def script():
+            self.scripts += 1
+            return self.redis.register_script(ratelimit.TAKE_TOKEN)
+
+        patcher = mock.patch.object(ratelimit, '_script', script)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        ratelimit._redis_down_until = 0.0
+        self.addCleanup(setattr, ratelimit, '_redis_down_until', 0.0)
+
+    async def test_bucket_allows_a_burst_then_paces(self):
+        waits = [await ratelimit._take('fast.example', 20.0, 4, 0)
+                 for _ in range(5)]
+        self.assertEqual(waits[:4], [0.0] * 4)
+        self.assertGreater(waits[4], 0)
+        self.assertLessEqual(waits[4], 1 / 20)
+
+        started = time.monotonic()
+        await ratelimit.acquire('fast.example')
+        self.assertGreater(time.monotonic() - started, 0.02)
+
+    async def test_background_leaves_a_reserve(self):
+        with ratelimit.background():
+            for _ in range(3):
+                await ratelimit.acquire('fast.example')
+            self.assertGreater(
+                await ratelimit._take('fast.example', 20.0, 4, 1.0), 0,
+            )
+        # The last token is still there for an interactive call.
+        self.assertEqual(await ratelimit._take('fast.example', 20.0, 4, 0), 0)
+
+    async def test_reserve_works_for_a_one_token_bucket(self):
+        self.assertEqual(await ratelimit._take('single.example', 10.0, 1, 0), 0)
+        interactive = await ratelimit._take('single.example', 10.0, 1, 0)
+        background = await ratelimit._take('single.example', 10.0, 1, 1.0)
+        self.assertGreater(background, interactive + 0.05)
+
+        await asyncio.sleep(interactive + 0.01)
+        self.assertGreater(
+            await ratelimit._take('single.example', 10.0, 1, 1.0), 0,
+        )
+        self.assertEqual(await ratelimit._take('single.example', 10.0, 1, 0), 0)
+
+        # With no interactive traffic, background calls still get through.
+        await asyncio.sleep(0.21)
+        self.assertEqual(
+            await ratelimit._take('single.example', 10.0, 1, 1.0), 0,
+        )
+
+    async def test_rate_limited_past_the_deadline(self):
+        await ratelimit.acquire('single.example')
+        with mock.patch.object(ratelimit, 'INTERACTIVE_DEADLINE', 0.05):
+            with self.assertRaises(ratelimit.RateLimited):
+                await ratelimit.acquire('single.example')
+
+    async def test_unlisted_hosts_are_not_limited(self):
+        for _ in range(10):
+            await ratelimit.acquire('other.example')
+        self.assertEqual(self.scripts, 0)
+
+    async def test_fails_open_when_redis_is_down(self):
+        broken = mock.AsyncMock(side_effect=aioredis.ConnectionError('down'))
+        with mock.patch.object(ratelimit, '_script', return_value=broken), \
+                self.assertLogs('weather.ratelimit', 'WARNING'):
+            for _ in range(5):
+                await ratelimit.acquire('single.example')
+        self.assertEqual(broken.await_count, 1)
+        self.assertGreater(ratelimit._redis_down_until, time.monotonic())
+
+
+class MetricsEndpointTests(SimpleTestCase):
+    """/metrics needs the configured bearer token."""
+
+    @override_settings(METRICS_TOKEN='', DEBUG=True)
+    def test_closed_without_a_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        response = self.client.get(
+            '/metrics', headers={'Authorization': 'Bearer '},
+        )
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(METRICS_TOKEN='s3cret')
+    def test_bearer_token_required(self):
+        for header in ({}, {'Authorization': 'Bearer wrong'},
+                       {'Authorization': 's3cret'},
+                       {'Authorization': 'Bearer s3cret2'},
+                       {'Authorization': 'Bearer s3crét'}):
+            response = self.client.get('/metrics', headers=header)
+            self.assertEqual(response.status_code, 403, header)
+
+        response = self.client.get(
+            '/metrics', headers={'Authorization': 'Bearer s3cret'},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], metrics.CONTENT_TYPE)
+        self.assertIn(b'# TYPE', response.content)
@@ -0,0 +1,202 @@
+"""
+Upstream HTTP Client
+====================
+Async keep-alive connection pools shared by every outbound call a worker
+makes (Open-Meteo, Nominatim, Overpass).
+
+Connections belong to an event loop, so one client is kept per running
+loop. Under ASGI that is a single client per worker process; code that
+runs outside a loop (Celery tasks, management commands) goes through
+run_sync(), which gives each call a short-lived loop and closes the
+clients it opened when the call returns.
+
+Every call goes through a per-host circuit breaker. After repeated
+errors, 5xx/429 responses or slow calls, it opens and calls to that
+host fail at once with CircuitOpen (an httpx.TransportError, so callers'
+existing error handling applies) instead of tying up a worker for the
+full timeout. After a cool-down, one probe call is let through; its
+outcome closes the breaker or re-opens it.
+
+Calls to hosts with a budget also wait for a token from the shared
+rate limiter (weather/ratelimit.py) before going out.
+"""
+
+import asyncio
+import threading
+import time
+import weakref
+
+import httpx
+from asgiref.sync import async_to_sync
+
+from weather import metrics, ratelimit
+
+USER_AGENT = 'DjangoWeatherApp/1.0'
+
+TIMEOUT = httpx.Timeout(10.0, connect=3.05)
+
+LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20)
+
+# Circuit breaker: consecutive failures that open it, calls slower than
+# this (seconds) count as failures, and how long it stays open. Callers
+# that pass a timeout of their own have allowed for slower calls; theirs
+# count as slow past SLOW_CALL_FRACTION of its read timeout.
+FAILURE_THRESHOLD = 5
+SLOW_CALL_SECONDS = 5.0
+SLOW_CALL_FRACTION = 0.8
+OPEN_SECONDS = 30
+
+_clients = weakref.WeakKeyDictionary()
+
+
+def client() -> httpx.AsyncClient:
+    """Pooled client bound to the running event loop."""
+    loop = asyncio.get_running_loop()
+    c = _clients.get(loop)
+    if c is None or c.is_closed:
+        c = httpx.AsyncClient(
+            headers={'User-Agent': USER_AGENT},
+            timeout=TIMEOUT,
+            limits=LIMITS,
+        )
+        _clients[loop] = c
+    return c
+
+
+async def aclose():
+    """Close the running loop's client and rate-limiter connection."""
+    c = _clients.pop(asyncio.get_running_loop(), None)
+    try:
+        if c is not None:
+            await c.aclose()
+    finally:
+        await ratelimit.aclose()
+
+
+def run_sync(func, *args, **kwargs):
+    """
+    Call the coroutine function ``func`` from sync code and close the
+    upstream clients it opened, which would otherwise leak with the
+    loop ``async_to_sync`` creates for each call.
+    """
+    async def call():
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            await aclose()
+    return async_to_sync(call)()
+
+
+class CircuitOpen(httpx.TransportError):
+    """Calls to this host are short-circuited while it is failing."""
+
+
+class CircuitBreaker:
+    """Failure tracking for one upstream host (per process)."""
+
+    __slots__ = ('host', 'failures', 'opened_at', 'probing', 'lock')
+
+    def __init__(self, host):
+        self.host = host
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def before_call(self):
+        """Raise CircuitOpen unless a call may go out now."""
+        with self.lock:
+            if self.opened_at is None:
+                return
+            if self.probing or time.monotonic() - self.opened_at < OPEN_SECONDS:
+                raise CircuitOpen(f'Circuit open for {self.host}')
+            self.probing = True  # half-open: this call is the probe
+
+    def abandon(self):
+        """The permitted call never reached the host."""
+        with self.lock:
+            self.probing = False
+
+    def record(self, ok: bool):
+        with self.lock:
+            self.probing = False
+            if ok:
+                self.failures = 0
+                self.opened_at = None
+                return
+            self.failures += 1
+            if self.opened_at is not None or self.failures >= FAILURE_THRESHOLD:
+                self.opened_at = time.monotonic()
+
+
+def slow_call_seconds(timeout=None) -> float:
+    """How long a call with the caller's ``timeout`` may take before the
+    breaker counts it as a failure."""
+    if timeout is None:
+        return SLOW_CALL_SECONDS
+    read = httpx.Timeout(timeout).read
+    if read is None:
+        return float('inf')
+    return max(SLOW_CALL_SECONDS, read * SLOW_CALL_FRACTION)
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker(host: str) -> CircuitBreaker:
+    """The circuit breaker for ``host``."""
+    with _breakers_lock:
+        b = _breakers.get(host)
+        if b is None:
+            b = _breakers[host] = CircuitBreaker(host)
+        return b
+
+
+async def request(method, url, **kwargs) -> httpx.Response:
+    """
+    Send a request through the pooled client, the host's breaker and
+    its rate limit.
+    """
+    host = httpx.URL(url).host
+    b = breaker(host)
+    b.before_call()
+    try:
+        await ratelimit.acquire(host)
+    except BaseException:
+        b.abandon()
+        raise
+    started = time.monotonic()
+    try:
+        response = await client().request(method, url, **kwargs)
+    except asyncio.CancelledError:
+        # The client went away; that says nothing about the host.
+        b.abandon()
+        raise
+    except BaseException:
+        b.record(ok=False)
+        metrics.UPSTREAM_SECONDS.observe(
+            time.monotonic() - started, host=host, outcome='error',
+        )
+        raise
+    elapsed = time.monotonic() - started
+    b.record(ok=(
+        response.status_code < 500 and response.status_code != 429
+        and elapsed < slow_call_seconds(kwargs.get('timeout'))
+    ))
+    metrics.UPSTREAM_SECONDS.observe(
+        elapsed, host=host, outcome=f'{response.status_code // 100}xx',
+    )
+    return response
+
+
+async def get(url, **kwargs) -> httpx.Response:
+    return await request('GET', url, **kwargs)
+
+
+async def post(url, **kwargs) -> httpx.Response:
+    return await request('POST', url, **kwargs)
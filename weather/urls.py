@@ -9,4 +9,6 @@ urlpatterns = [
     path('weather/api/weather/', views.weather_data, name='weather_data'),
     path('weather/api/reverse-geocode/', views.reverse_geocode, name='reverse_geocode'),
     path('weather/api/scores/', views.activity_scores, name='activity_scores'),
+    path('weather/api/scores/bulk/', views.bulk_activity_scores, name='bulk_activity_scores'),
+    path('metrics', views.prometheus_metrics, name='metrics'),
 ]
@@ -1,15 +1,31 @@
-import requests
+import asyncio
+import hmac
+
+import httpx
+from django.conf import settings
 from django.shortcuts import render
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse
+from django.views.decorators.csrf import ensure_csrf_cookie
+from django.views.decorators.http import require_POST
 
 import json as json_mod
 
-from accounts.models import SavedLocation
-from activities.models import ActivityType, UserActivity
-from weather.scoring.engine import compute_score
-from weather.scoring.windows import find_best_windows
-
-
+from accounts.context import aget_context, get_context
+from activities.profiles import aactive_profiles, active_profiles
+from weather import forecast, gazetteer, geo, metrics, spots, upstream
+from weather.encoding import encode, negotiate
+from weather.responses import (
+    api_response, conditional, encoded_response, get_body, make_etag,
+    set_body, set_validators,
+)
+from weather.scoring.conditions import HourlyConditions
+from weather.scoring.engine import (
+    conditions_from_dicts, score_label, score_matrix, score_results,
+)
+from weather.scoring.windows import score_entries
+
+
+@ensure_csrf_cookie
 def index(request):
     """Serve the main weather dashboard (Home tab)."""
     ctx = {'active_tab': 'home'}
@@ -22,37 +38,41 @@ def index(request):
         ctx['home_lat'] = request.user.home_latitude
         ctx['home_lon'] = request.user.home_longitude
         ctx['home_name'] = request.user.home_location_name
-        primary = (
-            UserActivity.objects.filter(user=request.user, is_primary=True)
-            .select_related('activity_type')
-            .first()
-        )
+        user_ctx = get_context(request.user)
+        primary = active_profiles().by_id.get(user_ctx.primary_id)
         if primary:
             ctx['primary_activity'] = {
-                'name': primary.activity_type.name,
-                'slug': primary.activity_type.slug,
-                'icon': primary.activity_type.icon_name,
+                'name': primary.name,
+                'slug': primary.slug,
+                'icon': primary.icon_name,
             }
         # Saved locations for quick-switch bar
-        saved = list(
-            SavedLocation.objects.filter(user=request.user)
-            .values('name', 'latitude', 'longitude')[:5]
-        )
+        saved = user_ctx.saved_locations_dicts()[:5]
         ctx['saved_locations_json'] = json_mod.dumps(saved)
     return render(request, 'weather/weather.html', ctx)
 
 
-def geocode(request):
-    """Search cities by name using Open-Meteo Geocoding API."""
+async def geocode(request):
+    """
+    Search cities by name: the offline gazetteer first, the Open-Meteo
+    Geocoding API only when it has no match.
+    """
     query = request.GET.get('q', '').strip()
     if len(query) < 2:
         return JsonResponse({'results': []})
 
-    url = (
-        f'https://geocoding-api.open-meteo.com/v1/search'
-        f'?name={query}&count=6&language=en&format=json'
-    )
-    response = requests.get(url, timeout=10)
+    results = await gazetteer.asearch(query)
+    if results:
+        return JsonResponse({'results': results})
+
+    try:
+        response = await upstream.get(
+            settings.OPEN_METEO_GEOCODING_URL,
+            params={'name': query, 'count': 6, 'language': 'en',
+                    'format': 'json'},
+        )
+    except httpx.HTTPError:
+        return JsonResponse({'results': []})
 
     if response.status_code == 200:
         data = response.json()
@@ -71,8 +91,74 @@ def geocode(request):
     return JsonResponse({'results': []})
 
 
-def weather_data(request):
-    """Get current weather, hourly (next 24h), and 7-day forecast."""
+def _validators(name, lat, lon, gens, media_type, *parts) -> tuple:
+    """
+    (etag, last_modified, max_age) for a body derived from the cached
+    forecast ``gens`` ({kind: (fetched_at, utc_offset)}, see
+    forecast.get_generations) of a grid cell at the current local hour,
+    encoded as ``media_type``; ``parts`` is whatever else it depends on.
+    Bodies built from a stale forecast are only cached briefly.
+    """
+    fetched_at, utc_offset = gens['forecast']
+    etag = make_etag(
+        name, forecast.snap_to_grid(lat, lon), sorted(gens.items()),
+        forecast.local_hour(utc_offset), media_type, *parts,
+    )
+    last_modified = max(at for at, _ in gens.values())
+    max_age = forecast.seconds_until_stale(utc_offset)
+    if _is_stale(gens):
+        max_age = min(max_age, forecast.STALE_MAX_AGE)
+    return etag, last_modified, max_age
+
+
+def _is_stale(gens) -> bool:
+    """Whether any forecast in ``gens`` is a stale fallback copy."""
+    return any(forecast.is_stale(at) for at, _ in gens.values())
+
+
+async def _cached_response(request, validators, media_type, private=False):
+    """A 304 or the stored body for ``validators``, else None."""
+    not_modified = conditional(request, *validators, private=private)
+    if not_modified is not None:
+        metrics.CACHE_LOOKUPS.inc(cache='api_body', result='not_modified')
+        return not_modified
+    with metrics.phase('body'):
+        body = await get_body(validators[0])
+    metrics.CACHE_LOOKUPS.inc(
+        cache='api_body', result='miss' if body is None else 'hit',
+    )
+    if body is None:
+        return None
+    return set_validators(
+        encoded_response(body, media_type), *validators, private=private,
+    )
+
+
+def _projection(request) -> tuple:
+    """
+    Canonical (blocks, fields) from the ``blocks=`` / ``fields=`` query
+    parameters (see forecast.project); raises ValueError if a block is
+    unknown.
+    """
+    blocks = sorted({
+        b for b in request.GET.get('blocks', '').split(',') if b
+    })
+    fields = sorted({
+        f for f in request.GET.get('fields', '').split(',') if f
+    })
+    named = blocks + [f.rpartition('.')[0] for f in fields if '.' in f]
+    if any(block not in forecast.BLOCKS for block in named):
+        raise ValueError('unknown block')
+    return tuple(blocks), tuple(fields)
+
+
+async def weather_data(request):
+    """
+    Get current weather, hourly (next 24h), and 7-day forecast.
+
+    ``blocks=current,daily`` and ``fields=temperature_2m,daily.sunrise``
+    trim the response server-side; each projection is cached separately.
+    """
     lat = request.GET.get('lat')
     lon = request.GET.get('lon')
 
@@ -81,33 +167,60 @@ def weather_data(request):
             {'error': 'Latitude and longitude are required'}, status=400
         )
 
-    url = (
-        f'https://api.open-meteo.com/v1/forecast?'
-        f'latitude={lat}&longitude={lon}'
-        f'&current=temperature_2m,relative_humidity_2m,apparent_temperature,'
-        f'weather_code,wind_speed_10m,wind_direction_10m,is_day,'
-        f'surface_pressure'
-        f'&hourly=temperature_2m,weather_code,precipitation_probability,is_day,'
-        f'relative_humidity_2m,visibility,wind_speed_10m'
-        f'&daily=weather_code,temperature_2m_max,temperature_2m_min,'
-        f'precipitation_probability_max,sunrise,sunset,'
-        f'uv_index_max,wind_speed_10m_max'
-        f'&timezone=auto'
-        f'&forecast_days=7'
-        f'&forecast_hours=24'
-    )
-    response = requests.get(url, timeout=10)
+    try:
+        lat, lon = geo.parse_coordinates(lat, lon)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid coordinates'}, status=400)
 
-    if response.status_code == 200:
-        return JsonResponse(response.json())
+    try:
+        blocks, fields = _projection(request)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid blocks or fields'}, status=400)
+
+    media_type = negotiate(request)
+
+    # Warm path: validators from the forecast's generation alone, and the
+    # body as stored bytes, without loading or re-encoding the forecast.
+    gens = await forecast.get_generations(lat, lon, ('forecast',))
+    if gens:
+        validators = _validators(
+            'weather', lat, lon, gens, media_type, blocks, fields,
+        )
+        response = await _cached_response(request, validators, media_type)
+        if response is not None:
+            return response
 
-    return JsonResponse(
-        {'error': 'Failed to fetch weather data'}, status=502
-    )
+    data, fetched_at = await forecast.get_forecast_entry(lat, lon)
 
+    if not data:
+        return JsonResponse(
+            {'error': 'Failed to fetch weather data'}, status=502
+        )
 
-def reverse_geocode(request):
-    """Reverse geocode coordinates to a city name via Nominatim."""
+    gens = {'forecast': (fetched_at, data.get('utc_offset_seconds', 0))}
+    validators = _validators(
+        'weather', lat, lon, gens, media_type, blocks, fields,
+    )
+    not_modified = conditional(request, *validators)
+    if not_modified is not None:
+        return not_modified
+
+    with metrics.phase('encode'):
+        if blocks or fields:
+            data = forecast.project(data, blocks, fields)
+        payload = forecast.next_hours(data, 24)
+        if _is_stale(gens):
+            payload['stale'] = True
+        body = encode(payload, media_type)
+    await set_body(validators[0], body, validators[2])
+    return set_validators(encoded_response(body, media_type), *validators)
+
+
+async def reverse_geocode(request):
+    """
+    Reverse geocode coordinates to a city name: nearest place in the
+    offline gazetteer, Nominatim only when nothing is close enough.
+    """
     lat = request.GET.get('lat')
     lon = request.GET.get('lon')
 
@@ -116,12 +229,25 @@ def reverse_geocode(request):
             {'error': 'Latitude and longitude are required'}, status=400
         )
 
-    url = (
-        f'https://nominatim.openstreetmap.org/reverse'
-        f'?lat={lat}&lon={lon}&format=json&zoom=10&accept-language=en'
-    )
-    headers = {'User-Agent': 'DjangoWeatherApp/1.0'}
-    response = requests.get(url, headers=headers, timeout=10)
+    try:
+        lat, lon = geo.parse_coordinates(lat, lon)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid coordinates'}, status=400)
+
+    place = await gazetteer.areverse(lat, lon)
+    if place:
+        return JsonResponse({'city': place['name'], 'country': place['country']})
+
+    try:
+        response = await upstream.get(
+            settings.NOMINATIM_REVERSE_URL,
+            params={
+                'lat': lat, 'lon': lon, 'format': 'json',
+                'zoom': 10, 'accept-language': 'en',
+            },
+        )
+    except httpx.HTTPError:
+        return JsonResponse({'city': 'Unknown', 'country': ''})
 
     if response.status_code == 200:
         data = response.json()
@@ -142,91 +268,59 @@ def reverse_geocode(request):
 
 # ── Activity Scores API ──────────────────────────────────────────
 
-def _fetch_weather_for_scoring(lat, lon):
-    """Fetch weather + air quality data needed by the scoring engine."""
-    weather_url = (
-        f'https://api.open-meteo.com/v1/forecast?'
-        f'latitude={lat}&longitude={lon}'
-        f'&current=temperature_2m,relative_humidity_2m,'
-        f'wind_speed_10m,weather_code,is_day'
-        f'&hourly=temperature_2m,relative_humidity_2m,'
-        f'precipitation_probability,wind_speed_10m,visibility'
-        f'&daily=uv_index_max,sunrise,sunset,'
-        f'temperature_2m_max,temperature_2m_min,'
-        f'wind_speed_10m_max,precipitation_probability_max'
-        f'&timezone=auto&forecast_days=7&forecast_hours=24'
-    )
-    aqi_url = (
-        f'https://air-quality-api.open-meteo.com/v1/air-quality?'
-        f'latitude={lat}&longitude={lon}'
-        f'&current=european_aqi'
-        f'&hourly=european_aqi'
-        f'&forecast_hours=24'
+def _scoring_conditions(weather, aqi_data, hours=24) -> tuple:
+    """Current conditions and the next ``hours`` hours, for scoring."""
+    weather, aqi_data = weather or {}, aqi_data or {}
+    start = forecast.current_hour_index(weather)
+    return (
+        HourlyConditions.current(weather, aqi_data, start),
+        HourlyConditions.from_forecast(weather, aqi_data, start, hours),
     )
 
-    weather_resp = requests.get(weather_url, timeout=10)
-    weather = weather_resp.json() if weather_resp.status_code == 200 else {}
-
-    aqi_resp = requests.get(aqi_url, timeout=10)
-    aqi_data = aqi_resp.json() if aqi_resp.status_code == 200 else {}
-
-    return weather, aqi_data
-
-
-def _build_current_weather(weather, aqi_data):
-    """Build the dict the scoring engine expects from current data."""
-    cur = weather.get('current', {})
-    daily = weather.get('daily', {})
-
-    return {
-        'temp': cur.get('temperature_2m', 20),
-        'wind_speed': cur.get('wind_speed_10m', 0),
-        'rain_prob': (weather.get('hourly', {})
-                      .get('precipitation_probability', [0])[0]),
-        'humidity': cur.get('relative_humidity_2m', 50),
-        'uv_index': daily.get('uv_index_max', [None])[0],
-        'visibility': (weather.get('hourly', {})
-                       .get('visibility', [None])[0]),
-        'aqi': (aqi_data.get('current', {})
-                .get('european_aqi')),
-        'minutes_to_golden': None,  # Phase 3: compute from sunrise/sunset
-        'swell_height': None,       # Phase 3: marine API
-    }
 
+async def _fetch_weather_for_scoring(lat, lon, hours=24):
+    """
+    Fetch forecast + air quality and build the scoring inputs: the
+    canonical forecast, current conditions and the next ``hours`` hours.
+    """
+    weather, aqi_data = await forecast.get_forecast_and_air_quality(lat, lon)
+    return (weather or {}, *_scoring_conditions(weather, aqi_data, hours))
 
-def _build_hourly_weather(weather, aqi_data):
-    """Build a list of 24 hourly weather dicts for window analysis."""
-    hourly = weather.get('hourly', {})
-    aqi_hourly = aqi_data.get('hourly', {})
-    daily = weather.get('daily', {})
-
-    times = hourly.get('time', [])
-    count = min(len(times), 24)
-    result = []
-
-    for i in range(count):
-        time_str = times[i]
-        hour_str = time_str.split('T')[1][:5] if 'T' in time_str else f'{i:02d}:00'
-
-        aqi_vals = aqi_hourly.get('european_aqi', [])
-
-        result.append({
-            'hour': hour_str,
-            'temp': hourly.get('temperature_2m', [20])[i] if i < len(hourly.get('temperature_2m', [])) else 20,
-            'wind_speed': hourly.get('wind_speed_10m', [0])[i] if i < len(hourly.get('wind_speed_10m', [])) else 0,
-            'rain_prob': hourly.get('precipitation_probability', [0])[i] if i < len(hourly.get('precipitation_probability', [])) else 0,
-            'humidity': hourly.get('relative_humidity_2m', [50])[i] if i < len(hourly.get('relative_humidity_2m', [])) else 50,
-            'visibility': hourly.get('visibility', [None])[i] if i < len(hourly.get('visibility', [])) else None,
-            'uv_index': daily.get('uv_index_max', [None])[0],
-            'aqi': aqi_vals[i] if i < len(aqi_vals) else None,
-            'minutes_to_golden': None,
-            'swell_height': None,
-        })
 
-    return result
+async def _score_cells(cells, activities, hours=24) -> dict:
+    """
+    Score ``activities`` at each forecast grid cell (snapped (lat, lon)
+    pairs), fetching all cells concurrently. Returns {cell: entries}
+    as from score_entries(), or {cell: None} where the forecast could
+    not be fetched.
+    """
+    fetched = await asyncio.gather(
+        *(_fetch_weather_for_scoring(lat, lon, hours) for lat, lon in cells),
+        return_exceptions=True,
+    )
+    scored = {}
+    for cell, outcome in zip(cells, fetched):
+        if isinstance(outcome, BaseException) or not outcome[0]:
+            scored[cell] = None
+            continue
+        _, current_wx, hourly_wx = outcome
+        scored[cell] = score_entries(current_wx, hourly_wx, activities)
+    return scored
+
+
+async def _user_profiles(user, all_profiles, user_ctx=None):
+    """
+    The profiles to score for ``user``: their chosen activities if they
+    are logged in and have any, else every active profile.
+    """
+    if user.is_authenticated:
+        user_ctx = user_ctx or await aget_context(user)
+        if user_ctx.activity_ids:
+            return all_profiles.subset(user_ctx.activity_ids)
+    return all_profiles
 
 
-def activity_scores(request):
+async def activity_scores(request):
     """Return activity scores for a given location."""
     lat = request.GET.get('lat')
     lon = request.GET.get('lon')
@@ -237,64 +331,89 @@ def activity_scores(request):
         )
 
     try:
-        weather, aqi_data = _fetch_weather_for_scoring(lat, lon)
+        lat, lon = geo.parse_coordinates(lat, lon)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid coordinates'}, status=400)
+
+    # Window search: horizon up to the full 7-day forecast, optional
+    # minimum length and top-k list of windows per activity.
+    try:
+        horizon = min(max(int(request.GET.get('hours', 24)), 1), 168)
+        min_hours = max(int(request.GET.get('min_hours', 1)), 1)
+        top_k = min(max(int(request.GET.get('windows', 0)), 0), 10)
+    except (TypeError, ValueError):
+        return JsonResponse({'error': 'Invalid parameters'}, status=400)
+
+    with metrics.phase('user'):
+        user = await request.auser()
+        user_ctx = await aget_context(user) if user.is_authenticated else None
+        all_profiles = await aactive_profiles()
+        activities = await _user_profiles(user, all_profiles, user_ctx)
+
+    weekly = bool(request.GET.get('weekly')) and user.is_authenticated
+    primary_id = user_ctx.primary_id if weekly else None
+
+    # The body depends on both forecasts, the current hour, the query
+    # and the profiles scored (not on who asks, so users with the same
+    # activities share stored bodies); a client holding it gets a 304.
+    media_type = negotiate(request)
+    query = (horizon, min_hours, top_k, weekly, primary_id,
+             activities.fingerprint)
+
+    gens = await forecast.get_generations(lat, lon, ('forecast', 'aqi'))
+    if len(gens) == 2:
+        validators = _validators('scores', lat, lon, gens, media_type, *query)
+        response = await _cached_response(
+            request, validators, media_type, private=True,
+        )
+        if response is not None:
+            return response
+
+    try:
+        (weather, weather_at), (aqi_data, aqi_at) = (
+            await forecast.get_forecast_and_air_quality_entries(lat, lon)
+        )
     except Exception:
         return JsonResponse(
             {'error': 'Failed to fetch weather data for scoring'}, status=502
         )
 
-    current_wx = _build_current_weather(weather, aqi_data)
-    hourly_wx = _build_hourly_weather(weather, aqi_data)
-
-    # If user is logged in and has activity preferences, filter by those
-    activities = ActivityType.objects.filter(is_active=True)
-    if request.user.is_authenticated:
-        user_act_ids = list(
-            UserActivity.objects.filter(user=request.user)
-            .values_list('activity_type_id', flat=True)
+    validators = None
+    if weather:
+        gens = {'forecast': (weather_at, weather.get('utc_offset_seconds', 0))}
+        if aqi_data:
+            gens['aqi'] = (aqi_at, aqi_data.get('utc_offset_seconds', 0))
+        validators = _validators('scores', lat, lon, gens, media_type, *query)
+        not_modified = conditional(request, *validators, private=True)
+        if not_modified is not None:
+            return not_modified
+
+    weather = weather or {}
+    with metrics.phase('score'):
+        current_wx, hourly_wx = _scoring_conditions(
+            weather, aqi_data, horizon,
+        )
+        results = score_entries(
+            current_wx, hourly_wx, activities,
+            min_hours=min_hours, top_k=top_k, split_days=horizon > 24,
         )
-        if user_act_ids:
-            activities = activities.filter(id__in=user_act_ids)
-
-    results = []
-
-    for act in activities:
-        result = compute_score(current_wx, act)
-        windows = find_best_windows(hourly_wx, act, threshold=60)
-        best = windows[0] if windows else None
-
-        results.append({
-            'name': act.name,
-            'slug': act.slug,
-            'icon': act.icon_name,
-            'score': result['score'],
-            'label': result['label'],
-            'factors': result['factors'],
-            'best_window': {
-                'start': best['start'],
-                'end': best['end'],
-                'peak': best['peak'],
-            } if best else None,
-        })
 
     # Sort by score descending
     results.sort(key=lambda r: r['score'], reverse=True)
 
     response = {'scores': results}
+    if validators and _is_stale(gens):
+        response['stale'] = True
 
     # Weekly outlook for primary activity (if requested)
-    if request.GET.get('weekly') and request.user.is_authenticated:
-        primary_ua = (
-            UserActivity.objects.filter(user=request.user, is_primary=True)
-            .select_related('activity_type')
-            .first()
-        )
-        if primary_ua:
+    if weekly:
+        primary = all_profiles.by_id.get(primary_id)
+        if primary:
             daily = weather.get('daily', {})
             daily_times = daily.get('time', [])
-            weekly = []
+            days = []
             for i, day_str in enumerate(daily_times):
-                day_wx = {
+                days.append({
                     'temp': (
                         (daily.get('temperature_2m_max', [20])[i]
                          + daily.get('temperature_2m_min', [20])[i]) / 2
@@ -321,16 +440,78 @@ def activity_scores(request):
                     'aqi': None,
                     'minutes_to_golden': None,
                     'swell_height': None,
-                }
-                day_result = compute_score(day_wx, primary_ua.activity_type)
-                weekly.append({
-                    'date': day_str,
-                    'score': day_result['score'],
-                    'label': day_result['label'],
                 })
-            response['weekly'] = weekly
+            day_scores = score_matrix(
+                conditions_from_dicts(days), [primary],
+            )[:, 0].tolist()
+            response['weekly'] = [
+                {'date': day_str, 'score': score, 'label': score_label(score)}
+                for day_str, score in zip(daily_times, day_scores)
+            ]
+
+    with metrics.phase('encode'):
+        body = encode(response, media_type)
+    if not validators:
+        return encoded_response(body, media_type)
+    await set_body(validators[0], body, validators[2])
+    return set_validators(
+        encoded_response(body, media_type), *validators, private=True,
+    )
 
-    return JsonResponse(response)
+
+MAX_BULK_LOCATIONS = 10
+
+
+@require_POST
+async def bulk_activity_scores(request):
+    """
+    Activity scores for several locations in one request, e.g. home
+    plus the saved locations of the quick-switch bar.
+
+    Body: ``{"locations": [{"lat": .., "lon": ..}, ...]}``. Locations in
+    the same forecast grid cell share one fetch and one scoring pass;
+    distinct cells are fetched concurrently. Results come back in
+    request order, each with the same ``scores`` list as
+    ``/weather/api/scores/`` (None if its forecast is unavailable).
+    """
+    try:
+        locations = list(json_mod.loads(request.body)['locations'])
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'Invalid locations'}, status=400)
+
+    if len(locations) > MAX_BULK_LOCATIONS:
+        return JsonResponse(
+            {'error': f'At most {MAX_BULK_LOCATIONS} locations per request'},
+            status=400,
+        )
+
+    points = []
+    for i, loc in enumerate(locations):
+        try:
+            points.append(geo.parse_coordinates(loc['lat'], loc['lon']))
+        except (ValueError, KeyError, TypeError):
+            return JsonResponse(
+                {'error': f'Invalid coordinates at locations[{i}]'},
+                status=400,
+            )
+
+    user = await request.auser()
+    activities = await _user_profiles(user, await aactive_profiles())
+
+    cells = [forecast.snap_to_grid(lat, lon) for lat, lon in points]
+    scored = await _score_cells(list(dict.fromkeys(cells)), activities)
+
+    results = []
+    for (lat, lon), cell in zip(points, cells):
+        entries = scored[cell]
+        results.append({
+            'lat': lat,
+            'lon': lon,
+            'scores': sorted(
+                entries, key=lambda r: r['score'], reverse=True,
+            ) if entries is not None else None,
+        })
+    return api_response(request, {'results': results})
 
 
 # ── Explore ──────────────────────────────────────────────────────
@@ -340,139 +521,110 @@ def explore(request):
     return render(request, 'weather/explore.html', {'active_tab': 'explore'})
 
 
-# Category → Overpass tags mapping
-_SPOT_QUERIES = {
-    'park':   '["leisure"="park"]',
-    'trail':  '["route"="hiking"]',
-    'beach':  '["natural"="beach"]',
-    'sports': '["leisure"="sports_centre"]',
-    'pitch':  '["leisure"="pitch"]',
-    'swimming': '["leisure"="swimming_pool"]["access"!="private"]',
-    'viewpoint': '["tourism"="viewpoint"]',
-    'garden': '["leisure"="garden"]',
-    'playground': '["leisure"="playground"]',
-    'nature': '["leisure"="nature_reserve"]',
-}
-
-# Map spot categories to activity slugs for scoring
-_CATEGORY_ACTIVITIES = {
-    'park':       ['running', 'hiking', 'yoga'],
-    'trail':      ['hiking', 'trail-running', 'mountain-biking'],
-    'beach':      ['swimming', 'surfing', 'kayaking'],
-    'sports':     ['running', 'cycling', 'yoga'],
-    'pitch':      ['running'],
-    'swimming':   ['swimming'],
-    'viewpoint':  ['hiking', 'photography'],
-    'garden':     ['yoga', 'walking'],
-    'playground': ['walking'],
-    'nature':     ['hiking', 'photography', 'bird-watching'],
-}
-
-
-def nearby_spots(request):
-    """Fetch nearby outdoor spots from OpenStreetMap via Overpass API."""
+async def nearby_spots(request):
+    """
+    Nearby outdoor spots from OpenStreetMap, served from the per-tile
+    Overpass cache (see weather/spots.py).
+
+    With ``scored=1`` each spot also gets the current score and best
+    window for its activities. Spots are grouped by forecast grid cell,
+    so one forecast and one batch scoring pass serve every spot in a
+    cell. ``activity=<slug>`` keeps only spots suited to that activity,
+    best score first.
+    """
     lat = request.GET.get('lat')
     lon = request.GET.get('lon')
     radius = request.GET.get('radius', '5000')  # meters
+    categories = [
+        c for c in request.GET.get('categories', '').split(',') if c
+    ] or None
+    scored = request.GET.get('scored') == '1'
+    activity = request.GET.get('activity', '').strip()
 
     if not lat or not lon:
         return JsonResponse({'error': 'lat and lon required'}, status=400)
 
     try:
-        lat = float(lat)
-        lon = float(lon)
+        lat, lon = geo.parse_coordinates(lat, lon)
         radius = min(int(radius), 15000)  # cap at 15km
     except (TypeError, ValueError):
         return JsonResponse({'error': 'Invalid parameters'}, status=400)
 
-    # Build Overpass query for outdoor POIs
-    filters = []
-    for cat, tag in _SPOT_QUERIES.items():
-        filters.append(f'node{tag}(around:{radius},{lat},{lon});')
-        filters.append(f'way{tag}(around:{radius},{lat},{lon});')
-        filters.append(f'relation{tag}(around:{radius},{lat},{lon});')
-
-    query = f"""
-    [out:json][timeout:10];
-    (
-      {''.join(filters)}
-    );
-    out center 60;
-    """
-
     try:
-        resp = requests.post(
-            'https://overpass-api.de/api/interpreter',
-            data={'data': query},
-            timeout=12,
-        )
-        if resp.status_code != 200:
-            return JsonResponse({'error': 'Overpass API error'}, status=502)
-        data = resp.json()
+        found = await spots.search(lat, lon, radius, categories)
+    except spots.OverpassError:
+        return JsonResponse({'error': 'Overpass API error'}, status=502)
     except Exception:
         return JsonResponse({'error': 'Failed to fetch spots'}, status=502)
 
-    # Parse results
-    spots = []
-    seen = set()  # deduplicate by name
+    if scored:
+        if activity:
+            found = [s for s in found if activity in s['activities']]
+        await _attach_spot_scores(found, activity)
 
-    for el in data.get('elements', []):
-        tags = el.get('tags', {})
-        name = tags.get('name', '').strip()
-        if not name or name in seen:
-            continue
-        seen.add(name)
+    return api_response(request, {'spots': found, 'count': len(found)})
 
-        # Get coordinates (center for ways)
-        spot_lat = el.get('lat') or (el.get('center', {}).get('lat'))
-        spot_lon = el.get('lon') or (el.get('center', {}).get('lon'))
-        if not spot_lat or not spot_lon:
-            continue
 
-        # Determine category
-        category = 'park'  # default
-        if tags.get('natural') == 'beach':
-            category = 'beach'
-        elif tags.get('route') == 'hiking':
-            category = 'trail'
-        elif tags.get('leisure') == 'sports_centre':
-            category = 'sports'
-        elif tags.get('leisure') == 'pitch':
-            category = 'pitch'
-        elif tags.get('leisure') == 'swimming_pool':
-            category = 'swimming'
-        elif tags.get('tourism') == 'viewpoint':
-            category = 'viewpoint'
-        elif tags.get('leisure') == 'garden':
-            category = 'garden'
-        elif tags.get('leisure') == 'playground':
-            category = 'playground'
-        elif tags.get('leisure') == 'nature_reserve':
-            category = 'nature'
-
-        # Icon mapping
-        icons = {
-            'park': 'trees', 'trail': 'mountain', 'beach': 'umbrella',
-            'sports': 'dumbbell', 'pitch': 'goal', 'swimming': 'waves',
-            'viewpoint': 'binoculars', 'garden': 'flower-2',
-            'playground': 'baby', 'nature': 'leaf',
+async def _attach_spot_scores(found, activity=''):
+    """
+    Add 'scores' (best first) and 'score' to each spot in place; both
+    are None where the spot's forecast is unavailable. With
+    ``activity``, score only that activity and sort spots by it.
+    """
+    slugs = {activity} if activity else {
+        slug for spot in found for slug in spot['activities']
+    }
+    profiles = (await aactive_profiles()).with_slugs(slugs)
+
+    by_cell = {}
+    for spot in found:
+        cell = forecast.snap_to_grid(spot['lat'], spot['lon'])
+        by_cell.setdefault(cell, []).append(spot)
+    scored = await _score_cells(list(by_cell), profiles)
+
+    for cell, cell_spots in by_cell.items():
+        entries = scored[cell]
+        by_slug = {
+            e['slug']: {
+                'slug': e['slug'],
+                'name': e['name'],
+                'score': e['score'],
+                'label': e['label'],
+                'best_window': e['best_window'],
+            }
+            for e in entries or ()
         }
-
-        spots.append({
-            'name': name,
-            'lat': spot_lat,
-            'lon': spot_lon,
-            'category': category,
-            'icon': icons.get(category, 'map-pin'),
-            'activities': _CATEGORY_ACTIVITIES.get(category, []),
-            'tags': {
-                'surface': tags.get('surface', ''),
-                'sport': tags.get('sport', ''),
-                'access': tags.get('access', ''),
-            },
-        })
-
-        if len(spots) >= 50:
-            break
-
-    return JsonResponse({'spots': spots, 'count': len(spots)})
+        for spot in cell_spots:
+            if entries is None:
+                spot['scores'] = spot['score'] = None
+                continue
+            wanted = [activity] if activity else spot['activities']
+            spot['scores'] = sorted(
+                (by_slug[slug] for slug in wanted if slug in by_slug),
+                key=lambda e: e['score'], reverse=True,
+            )
+            spot['score'] = (
+                spot['scores'][0]['score'] if spot['scores'] else None
+            )
+
+    if activity:
+        # Unscored spots last; stable, so ties stay nearest first.
+        found.sort(key=lambda s: -1 if s['score'] is None else s['score'],
+                   reverse=True)
+
+
+# ── Metrics ──────────────────────────────────────────────────────
+
+def prometheus_metrics(request):
+    """
+    Metrics in the Prometheus text format (see weather/metrics.py).
+    Scrapers must send ``METRICS_TOKEN`` as a bearer token; without a
+    token configured, /metrics is closed.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    sent = request.headers.get('Authorization', '')
+    if not token or not hmac.compare_digest(
+        sent.encode(), f'Bearer {token}'.encode(),
+    ):
+        return HttpResponse(status=403)
+    return HttpResponse(metrics.render(), content_type=metrics.CONTENT_TYPE)
@@ -3,6 +3,13 @@ ASGI config for weatherapp project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The upstream-facing views in weather/views.py are async, so serve the
+project through ASGI to keep upstream waits off worker threads:
+
+    gunicorn weatherapp.asgi:application -k uvicorn.workers.UvicornWorker
+
+(from the project root, so gunicorn.conf.py is picked up).
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 """
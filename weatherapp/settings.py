@@ -5,6 +5,8 @@ Weather-powered activity scoring in a mobile-first application.
 
 from pathlib import Path
 
+from celery.schedules import crontab
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 SECRET_KEY = 'django-insecure-q-s1!1t_-ou%e!zy%+z4oc*u@)9w*c+x!zfo_k1ph+s(6h&n&%'
@@ -45,6 +47,7 @@ INSTALLED_APPS = [
 SITE_ID = 1
 
 MIDDLEWARE = [
+    'weather.middleware.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -91,6 +94,15 @@ DATABASES = {
     }
 }
 
+# ── Cache (Redis, shared by all workers) ──────────────────────────
+# Forecasts are cached per model grid cell; see weather/forecast.py.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('CACHE_URL', 'redis://localhost:6379/1'),
+    }
+}
+
 # ── Auth / allauth ────────────────────────────────────────────────
 AUTHENTICATION_BACKENDS = [
     'django.contrib.auth.backends.ModelBackend',
@@ -137,6 +149,49 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'UTC'
 CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
+CELERY_BEAT_SCHEDULE = {
+    # Shortly after each hourly model run lands (see weather/forecast.py).
+    # Each run only refreshes the cells of recently active users where it
+    # is 04:00-08:59 locally (see weather/tasks.py): 10 upstream calls a
+    # day per cell (5 runs x 2 APIs) counted against Open-Meteo's daily
+    # quota (10,000 calls on the free tier), instead of 48.
+    'prewarm-forecasts': {
+        'task': 'weather.tasks.prewarm_forecasts',
+        'schedule': crontab(minute=12),
+    },
+}
+
+# ── Upstream APIs ─────────────────────────────────────────────────
+# Endpoints; overridable to point at a stand-in (see the loadtest
+# management command).
+OPEN_METEO_FORECAST_URL = os.environ.get(
+    'OPEN_METEO_FORECAST_URL', 'https://api.open-meteo.com/v1/forecast')
+OPEN_METEO_AIR_QUALITY_URL = os.environ.get(
+    'OPEN_METEO_AIR_QUALITY_URL',
+    'https://air-quality-api.open-meteo.com/v1/air-quality')
+OPEN_METEO_GEOCODING_URL = os.environ.get(
+    'OPEN_METEO_GEOCODING_URL', 'https://geocoding-api.open-meteo.com/v1/search')
+NOMINATIM_REVERSE_URL = os.environ.get(
+    'NOMINATIM_REVERSE_URL', 'https://nominatim.openstreetmap.org/reverse')
+OVERPASS_URL = os.environ.get(
+    'OVERPASS_URL', 'https://overpass-api.de/api/interpreter')
+
+# Cluster-wide budgets per host: (requests per second, burst). Enforced
+# in Redis (CELERY_BROKER_URL) by weather/ratelimit.py; hosts not listed
+# are not limited.
+UPSTREAM_RATE_LIMITS = {
+    'nominatim.openstreetmap.org': (1.0, 1),   # usage policy: 1 req/s
+    'overpass-api.de': (0.5, 2),
+    # Open-Meteo's free tier allows 600 calls/min per client in total.
+    'api.open-meteo.com': (6.0, 30),
+    'air-quality-api.open-meteo.com': (3.0, 15),
+    'geocoding-api.open-meteo.com': (1.0, 5),
+}
+
+# ── Metrics ───────────────────────────────────────────────────────
+# Bearer token required to scrape /metrics. Without one, /metrics is
+# closed.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
 
 # ── Password validation ───────────────────────────────────────────
 AUTH_PASSWORD_VALIDATORS = [